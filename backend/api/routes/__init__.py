@@ -1,13 +1,15 @@
 """API route registry."""
 
 from fastapi import APIRouter
-from api.routes import courses, files, ingest, questions, questions_from_file
+from api.routes import courses, files, ingest, ingest_jobs, question_stream, questions, questions_from_file
 
 router = APIRouter(prefix="/api/v1")
 
 router.include_router(courses.router, prefix="/courses", tags=["Courses"])
 router.include_router(files.router, prefix="/courses/{course_id}/files", tags=["Files"])
 router.include_router(ingest.router, prefix="/courses/{course_id}/ingest", tags=["Ingestion"])
+router.include_router(ingest_jobs.router, prefix="/ingest", tags=["Ingestion"])
 router.include_router(questions.router, prefix="/questions", tags=["Questions"])
 router.include_router(questions_from_file.router, prefix="/questions", tags=["Questions"])
 
+router.include_router(question_stream.router, prefix="/questions", tags=["Questions"])
@@ -2,29 +2,42 @@
 
 from typing import Any
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
 
-from services.canvas import canvas_service
 from services.canvas import CanvasAPIError
+from services.http_cache import encoded_response
+from services.listing_snapshots import listing_snapshots
+from services.tenancy import current_tenant
 
 router = APIRouter()
 
 
 @router.get("", response_model=list[dict[str, Any]])
 async def list_courses(
+    request: Request,
     enrollment_state: str | None = None,
     include: list[str] | None = None,
     per_page: int | None = None,
-) -> list[dict[str, Any]]:
+) -> Response:
     """
-    List courses for the current user (Canvas).
+    List courses for the current user (Canvas; the request's X-Canvas-Token user if sent).
     Query params are forwarded to Canvas; e.g. enrollment_state=active.
+    Served from a short-lived snapshot with an ETag; If-None-Match gets 304.
     """
-    try:
-        return await canvas_service.list_courses(
+    tenant = await current_tenant()
+
+    async def load() -> bytes:
+        # Canvas's JSON is passed through untouched: no parse, validation or re-encode
+        return await tenant.canvas.list_courses_raw(
             enrollment_state=enrollment_state,
             include=include,
             per_page=per_page,
         )
+
+    key = (tenant.id, "courses", enrollment_state, tuple(include or ()), per_page)
+    try:
+        body = await listing_snapshots.get(key, load)
     except CanvasAPIError as e:
         raise HTTPException(status_code=e.status_code, detail=e.body or str(e))
+    return encoded_response(request, body, headers={"Cache-Control": listing_snapshots.cache_control})
@@ -1,10 +1,15 @@
 """Course files endpoint (Canvas-backed)."""
 
 from typing import Optional
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
 from pydantic import BaseModel
 
-from services.canvas import canvas_service, CanvasAPIError
+from services.canvas import CanvasAPIError, CanvasService
+from services.fast_json import dumps
+from services.http_cache import encoded_response
+from services.listing_snapshots import listing_snapshots
+from services.tenancy import current_tenant
 
 router = APIRouter()
 
@@ -46,6 +51,36 @@ class CourseFilesViaModulesResponse(BaseModel):
     note: str = "Files listed from course modules; works with student tokens."
 
 
+# ── Projection ────────────────────────────────────────────────────────────────
+# Listings can hold thousands of files, so the handlers project Canvas dicts
+# straight to the schema fields above and encode once, instead of building a
+# model per file. The models remain the documented response_model.
+
+def _project_file(f: dict) -> dict:
+    return {
+        "id": f["id"],
+        "display_name": f.get("display_name", f.get("filename", "")),
+        "filename": f.get("filename", ""),
+        "content_type": f.get("content-type", "application/octet-stream"),
+        "size_kb": round((f.get("size") or 0) / 1024, 2),
+        "url": f.get("url", ""),
+        "updated_at": f.get("updated_at"),
+    }
+
+
+def _project_module_file(r: dict) -> dict:
+    return {
+        "file_id": r["file_id"],
+        "module_item_id": r["module_item_id"],
+        "title": r["title"],
+        "module_id": r["module_id"],
+        "module_name": r["module_name"],
+        "position": r.get("position"),
+        "html_url": r.get("html_url", ""),
+        "url": r.get("url", ""),
+    }
+
+
 # ── Endpoint ──────────────────────────────────────────────────────────────────
 
 @router.get(
@@ -54,33 +89,24 @@ class CourseFilesViaModulesResponse(BaseModel):
     summary="List all files in a Canvas course",
     description=(
         "Returns all files the authenticated student can access "
-        "for the given course ID. Follows Canvas pagination automatically."
+        "for the given course ID. Follows Canvas pagination automatically. "
+        "Served from a short-lived snapshot with an ETag; If-None-Match gets 304."
     ),
 )
-async def list_course_files(course_id: int) -> CourseFilesResponse:
+async def list_course_files(course_id: int, request: Request) -> Response:
+    tenant = await current_tenant()
     try:
-        raw_files = await canvas_service.list_course_files(course_id)
+        body = await listing_snapshots.get(
+            (tenant.id, "files", course_id), lambda: _load_course_files(tenant.canvas, course_id)
+        )
     except CanvasAPIError as e:
         raise HTTPException(status_code=e.status_code, detail=e.body or str(e))
+    return encoded_response(request, body, headers={"Cache-Control": listing_snapshots.cache_control})
 
-    files = [
-        CanvasFile(
-            id=f["id"],
-            display_name=f.get("display_name", f.get("filename", "")),
-            filename=f.get("filename", ""),
-            content_type=f.get("content-type", "application/octet-stream"),
-            size_kb=round(f.get("size", 0) / 1024, 2),
-            url=f.get("url", ""),
-            updated_at=f.get("updated_at"),
-        )
-        for f in raw_files
-    ]
 
-    return CourseFilesResponse(
-        course_id=course_id,
-        total_files=len(files),
-        files=files,
-    )
+async def _load_course_files(canvas: CanvasService, course_id: int) -> bytes:
+    files = [_project_file(f) for f in await canvas.list_course_files(course_id)]
+    return dumps({"course_id": course_id, "total_files": len(files), "files": files})
 
 
 @router.get(
@@ -90,31 +116,30 @@ async def list_course_files(course_id: int) -> CourseFilesResponse:
     description=(
         "Returns files that appear in the course's modules. Uses the Modules API "
         "instead of the direct course files endpoint, so it works with student tokens "
-        "when GET /courses/:id/files returns 403."
+        "when GET /courses/:id/files returns 403. "
+        "Served from a short-lived snapshot with an ETag; If-None-Match gets 304."
     ),
 )
 async def list_course_files_via_modules(
     course_id: int,
-) -> CourseFilesViaModulesResponse:
+    request: Request,
+) -> Response:
+    tenant = await current_tenant()
     try:
-        raw = await canvas_service.list_course_files_via_modules(course_id)
+        body = await listing_snapshots.get(
+            (tenant.id, "files_via_modules", course_id),
+            lambda: _load_course_files_via_modules(tenant.canvas, course_id),
+        )
     except CanvasAPIError as e:
         raise HTTPException(status_code=e.status_code, detail=e.body or str(e))
-    refs = [
-        ModuleFileRef(
-            file_id=r["file_id"],
-            module_item_id=r["module_item_id"],
-            title=r["title"],
-            module_id=r["module_id"],
-            module_name=r["module_name"],
-            position=r.get("position"),
-            html_url=r.get("html_url", ""),
-            url=r.get("url", ""),
-        )
-        for r in raw
-    ]
-    return CourseFilesViaModulesResponse(
-        course_id=course_id,
-        total_files=len(refs),
-        files=refs,
-    )
+    return encoded_response(request, body, headers={"Cache-Control": listing_snapshots.cache_control})
+
+
+async def _load_course_files_via_modules(canvas: CanvasService, course_id: int) -> bytes:
+    refs = [_project_module_file(r) for r in await canvas.list_course_files_via_modules(course_id)]
+    return dumps({
+        "course_id": course_id,
+        "total_files": len(refs),
+        "files": refs,
+        "note": CourseFilesViaModulesResponse.model_fields["note"].default,
+    })
@@ -1,15 +1,39 @@
-"""Ingestion trigger and status endpoints."""
+"""
+Ingestion trigger, cancel, status and progress-stream endpoints for a single course.
 
-from fastapi import APIRouter, BackgroundTasks, HTTPException
+A job belongs to the tenant that started it: cancel, status and events answer
+404 to anyone else.
+"""
+
+from typing import AsyncIterator
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from services.ingestion import ingest_course, get_status
+from services.events import broadcaster, format_sse
+from services.ingest_scheduler import IngestAlreadyActiveError, scheduler
+from services.ingestion import ingest_topic
+from services.tenancy import current_tenant
 
 router = APIRouter()
 
+# Seconds between keep-alive comments on an idle event stream
+_HEARTBEAT_SECONDS = 15.0
+# How often to re-read the job store when the job runs on another worker
+_REMOTE_POLL_SECONDS = 2.0
+_FINAL_STATES = ("complete", "failed", "cancelled")
+
+
+async def _require_owner(course_id: int) -> None:
+    """404 unless the request's tenant submitted the course's job (or there is none)."""
+    if not scheduler.owned_by(course_id, (await current_tenant()).id):
+        raise HTTPException(status_code=404, detail=f"No ingestion for course {course_id}.")
+
 
 class IngestStartedResponse(BaseModel):
     course_id: int
     message: str
+    queue_position: int | None = None
 
 
 @router.post(
@@ -19,33 +43,109 @@ class IngestStartedResponse(BaseModel):
     summary="Trigger background ingestion for a course",
     description=(
         "Starts downloading, parsing, chunking, embedding, and indexing "
-        "all supported files (PPTX, DOCX, TXT) for the given course. "
-        "Runs in the background. Poll the /status endpoint to check progress."
+        "all supported files (PPTX, DOCX, TXT, PDF) for the given course. "
+        "Only new or changed files are re-processed; points for files removed "
+        "from the course modules are deleted. "
+        "The job is queued behind other courses if the scheduler is at capacity; "
+        "higher priority runs first. Canvas is read with the request's X-Canvas-Token "
+        "user if one is sent. Poll the /status endpoint to check progress."
     ),
 )
-async def start_ingestion(
-    course_id: int,
-    background_tasks: BackgroundTasks,
-) -> IngestStartedResponse:
-    status = get_status(course_id)
-    if status.get("status") == "running":
-        raise HTTPException(
-            status_code=409,
-            detail=f"Ingestion is already running for course {course_id}.",
-        )
-
-    background_tasks.add_task(ingest_course, course_id)
+async def start_ingestion(course_id: int, priority: int = 0) -> IngestStartedResponse:
+    tenant = await current_tenant()
+    try:
+        await scheduler.submit(course_id, priority=priority, canvas=tenant.canvas)
+    except IngestAlreadyActiveError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
+    position = scheduler.queue_position(course_id)
     return IngestStartedResponse(
         course_id=course_id,
-        message="Ingestion started. Poll /status to check progress.",
+        message="Ingestion queued. Poll /status to check progress."
+        if position
+        else "Ingestion started. Poll /status to check progress.",
+        queue_position=position,
     )
 
 
+@router.delete(
+    "",
+    summary="Cancel a queued or running ingestion",
+    description="Removes the course from the queue, or stops its running ingestion.",
+)
+async def cancel_ingestion(course_id: int) -> dict:
+    await _require_owner(course_id)
+    if not await scheduler.cancel(course_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"No queued or running ingestion for course {course_id}.",
+        )
+    return {"course_id": course_id, "status": "cancelled"}
+
+
 @router.get(
     "/status",
     summary="Get ingestion status for a course",
-    description="Returns current status, file counts, and chunk count for a course ingestion.",
+    description=(
+        "Returns current status, file counts, and chunk count for a course ingestion. "
+        "Queued jobs report their queue_position."
+    ),
 )
 async def ingestion_status(course_id: int) -> dict:
-    return get_status(course_id)
+    await _require_owner(course_id)
+    return scheduler.get_status(course_id)
+
+
+async def _event_stream(course_id: int) -> AsyncIterator[str]:
+    # Subscribe before taking the snapshot so nothing falls in between
+    with broadcaster.subscribe(ingest_topic(course_id)) as sub:
+        status = scheduler.get_status(course_id)
+        yield format_sse({"type": "snapshot", "course_id": course_id, **status})
+        if status.get("status") in _FINAL_STATES:
+            return
+        idle = 0.0
+        while True:
+            event = await sub.get(timeout=_REMOTE_POLL_SECONDS)
+            if event is not None:
+                idle = 0.0
+                yield format_sse(event)
+                if event.get("final"):
+                    return
+                continue
+            # Nothing pushed: if another worker owns the job, its progress only
+            # reaches us through the job store, so forward changes from there.
+            if not scheduler.is_local(course_id):
+                current = scheduler.get_status(course_id)
+                if current != status:
+                    status = current
+                    idle = 0.0
+                    final = status.get("status") in _FINAL_STATES
+                    yield format_sse({"type": "snapshot", "course_id": course_id, "final": final, **status})
+                    if final:
+                        return
+                    continue
+            idle += _REMOTE_POLL_SECONDS
+            if idle >= _HEARTBEAT_SECONDS:
+                idle = 0.0
+                yield ": keepalive\n\n"
+
+
+@router.get(
+    "/events",
+    summary="Stream ingestion progress (Server-Sent Events)",
+    description=(
+        "Pushes ingestion events as they happen instead of polling /status: a snapshot on "
+        "connect, then state and phase changes, per-file outcomes (file), per-file errors "
+        "(file_error), stage completion (stage_done) and a throughput snapshot (progress) "
+        "about once a second. The stream ends after the final state event. Slow clients "
+        "receive a lagged event with the number of events they missed."
+    ),
+    response_class=StreamingResponse,
+)
+async def ingestion_events(course_id: int) -> StreamingResponse:
+    await _require_owner(course_id)
+    return StreamingResponse(
+        _event_stream(course_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,83 @@
+"""Bulk ingestion endpoints: queue many courses at once and inspect the scheduler."""
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from services.canvas import CanvasAPIError
+from services.ingest_scheduler import IngestAlreadyActiveError, scheduler
+from services.tenancy import current_tenant
+
+router = APIRouter()
+
+
+class BulkIngestRequest(BaseModel):
+    course_ids: list[int] = []
+    all_active: bool = False
+    priority: int = 0
+
+
+class BulkIngestItem(BaseModel):
+    course_id: int
+    accepted: bool
+    status: str
+    queue_position: int | None = None
+
+
+class BulkIngestResponse(BaseModel):
+    accepted: int
+    items: list[BulkIngestItem]
+
+
+@router.post(
+    "",
+    response_model=BulkIngestResponse,
+    status_code=202,
+    summary="Queue ingestion for many courses",
+    description=(
+        "Queues each course in course_ids (or every active course when all_active is true) "
+        "with the given priority. Courses that are already queued or running are reported "
+        "with accepted=false."
+    ),
+)
+async def bulk_ingest(body: BulkIngestRequest) -> BulkIngestResponse:
+    tenant = await current_tenant()
+    canvas = tenant.canvas
+    course_ids = list(dict.fromkeys(body.course_ids))
+    if body.all_active:
+        try:
+            courses = await canvas.list_courses(enrollment_state="active")
+        except CanvasAPIError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.body or str(e))
+        for course in courses:
+            if course.get("id") and course["id"] not in course_ids:
+                course_ids.append(course["id"])
+    if not course_ids:
+        raise HTTPException(status_code=422, detail="Pass course_ids or set all_active=true.")
+
+    items: list[BulkIngestItem] = []
+    for course_id in course_ids:
+        try:
+            await scheduler.submit(course_id, priority=body.priority, canvas=canvas)
+            accepted = True
+        except IngestAlreadyActiveError:
+            accepted = False
+        items.append(
+            BulkIngestItem(
+                course_id=course_id,
+                accepted=accepted,
+                status=scheduler.get_status(course_id).get("status", "unknown")
+                if scheduler.owned_by(course_id, tenant.id)
+                else "unknown",
+                queue_position=scheduler.queue_position(course_id),
+            )
+        )
+    return BulkIngestResponse(accepted=sum(i.accepted for i in items), items=items)
+
+
+@router.get(
+    "",
+    summary="Scheduler overview",
+    description="Running and queued courses (with queue positions) and global limit usage.",
+)
+async def scheduler_overview() -> dict:
+    return scheduler.snapshot()
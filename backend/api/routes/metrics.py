@@ -0,0 +1,21 @@
+"""Prometheus scrape endpoint."""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from services.metrics import registry
+
+router = APIRouter()
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Prometheus metrics",
+    description=(
+        "Latency histograms and counters for API routes, Canvas endpoints, Cohere, Qdrant, "
+        "OpenAI, parsing, chunking and caches, in the Prometheus text format."
+    ),
+)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
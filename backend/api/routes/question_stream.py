@@ -0,0 +1,130 @@
+"""
+Push delivery of new questions: Server-Sent Events and a long-poll fallback.
+
+Both read services.question_feed, which publishes a question when the generated
+pool gains one or at a configured cadence, so idle clients no longer need to poll
+/questions on a timer. Pool questions only reach the tenant (Canvas user) whose
+pool produced them.
+"""
+
+import time
+from typing import Any, AsyncIterator, Optional
+
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from api.routes.questions import ServedQuestionResponse
+from services.events import broadcaster, format_sse
+from services.question_feed import matches, question_feed
+from services.tenancy import current_tenant
+
+router = APIRouter()
+
+# Seconds between keep-alive comments on an idle event stream
+_HEARTBEAT_SECONDS = 15.0
+MAX_POLL_SECONDS = 60
+
+
+class QuestionPollResponse(BaseModel):
+    cursor: int
+    questions: list[ServedQuestionResponse]
+
+
+async def _event_stream(
+    tenant_id: str, course_id: Optional[int], last_event_id: int | None
+) -> AsyncIterator[str]:
+    # Subscribe before replaying history so nothing falls in between
+    with broadcaster.subscribe(*question_feed.topics(tenant_id)) as sub:
+        if last_event_id is not None:
+            last_event_id = question_feed.resume_cursor(last_event_id)
+            backlog = question_feed.since(last_event_id, tenant_id, course_id)
+        else:
+            latest = question_feed.latest(tenant_id, course_id)
+            backlog = [latest] if latest is not None else []
+        cursor = last_event_id or 0
+        for event in backlog:
+            cursor = event["id"]
+            yield format_sse(event)
+        while True:
+            event = await sub.get(timeout=_HEARTBEAT_SECONDS)
+            if event is None:
+                yield ": keepalive\n\n"
+            elif event.get("type") == "lagged":
+                yield format_sse(event)
+            elif event["id"] > cursor and matches(event, tenant_id, course_id):
+                cursor = event["id"]
+                yield format_sse(event)
+
+
+@router.get(
+    "/stream",
+    summary="Stream new questions (Server-Sent Events)",
+    description=(
+        "Sends the latest question on connect, then a question event whenever a new one is "
+        "available: from the generated pool as it is refilled, or a static bank question after "
+        "QUESTION_STREAM_INTERVAL_SECONDS without one. Reconnect with Last-Event-ID to replay "
+        "what was missed. Idle streams get a keep-alive comment every 15 seconds; clients that "
+        "fall behind receive a lagged event."
+    ),
+    response_class=StreamingResponse,
+)
+async def stream_questions(
+    course_id: Optional[int] = Query(None, description="Only pool questions from this course (static ones always)"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+) -> StreamingResponse:
+    try:
+        resume_from = int(last_event_id) if last_event_id else None
+    except ValueError:
+        resume_from = None
+    return StreamingResponse(
+        _event_stream((await current_tenant()).id, course_id, resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get(
+    "/poll",
+    response_model=QuestionPollResponse,
+    summary="Long-poll for new questions",
+    description=(
+        "Returns questions published after the since cursor, waiting up to timeout seconds "
+        "for one if there are none yet. Pass the returned cursor as since on the next call. "
+        "Without since, the latest question is returned immediately (if any)."
+    ),
+)
+async def poll_questions(
+    since: Optional[int] = Query(None, ge=0, description="Cursor from the previous response"),
+    timeout: float = Query(25.0, ge=0, le=MAX_POLL_SECONDS),
+    course_id: Optional[int] = Query(None),
+) -> dict[str, Any]:
+    tenant_id = (await current_tenant()).id
+    if since is None:
+        latest = question_feed.latest(tenant_id, course_id)
+        events = [latest] if latest is not None else []
+        return _poll_result(events, question_feed.cursor)
+    since = question_feed.resume_cursor(since)
+    events = question_feed.since(since, tenant_id, course_id)
+    if events or timeout <= 0:
+        return _poll_result(events, since)
+    with broadcaster.subscribe(*question_feed.topics(tenant_id)) as sub:
+        # Re-check: something may have been published before we subscribed
+        events = question_feed.since(since, tenant_id, course_id)
+        give_up = time.monotonic() + timeout
+        while not events:
+            remaining = give_up - time.monotonic()
+            if remaining <= 0:
+                break
+            event = await sub.get(timeout=remaining)
+            if event is None:
+                break
+            if event.get("type") == "question" and event["id"] > since and matches(event, tenant_id, course_id):
+                events = [event]
+    return _poll_result(events, since)
+
+
+def _poll_result(events: list[dict[str, Any]], cursor: int) -> dict[str, Any]:
+    if events:
+        cursor = max(cursor, events[-1]["id"])
+    return {"cursor": cursor, "questions": [e["question"] for e in events]}
@@ -1,10 +1,20 @@
-"""Quiz question endpoints: graduate-level CV/ML (PSU CSE586, CSE584, CSE486–style)."""
+"""
+Quiz question endpoints: graduate-level CV/ML (PSU CSE586, CSE584, CSE486–style).
+
+The bank never changes at runtime, so it is encoded once at import: JSON bytes per
+question and for the full list, gzip/brotli variants and strong ETags. The routes
+send those bytes as-is and answer If-None-Match with 304.
+"""
 
 import random
 from typing import Optional
 
-from fastapi import APIRouter
-from pydantic import BaseModel
+from fastapi import APIRouter, Header, Request
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter
+
+from services.http_cache import EncodedBody, encoded_response
+from services.question_sampler import DEVICE_ID_HEADER, client_key, question_sampler
 
 router = APIRouter()
 
@@ -28,6 +38,12 @@ class QuestionResponse(BaseModel):
     mcq: Optional[MCQQuestion] = None
 
 
+class ServedQuestionResponse(QuestionResponse):
+    """A question from /questions/from-file, /questions/batch or the push feed."""
+    # Which path produced it: pool | generated | cache | static
+    served_from: str
+
+
 # ── Graduate-level questions (PSU CSE586/EE554, CSE584, CSE486–style) ────────────
 
 
@@ -539,6 +555,50 @@ def _to_response(item: dict) -> QuestionResponse:
     )
 
 
+# ── Pre-encoded bank ───────────────────────────────────────────────────────────
+
+# Clients may keep a copy but must revalidate (cheap: 304 without a body)
+_CACHE_HEADERS = {"Cache-Control": "no-cache"}
+
+_ITEM_BODIES: dict[str, EncodedBody] = {
+    item["id"]: EncodedBody.build(_to_response(item).model_dump_json().encode())
+    for item in COMPUTER_VISION_QUESTIONS
+}
+_ALL_BODY = EncodedBody.build(
+    TypeAdapter(list[QuestionResponse]).dump_json([_to_response(item) for item in COMPUTER_VISION_QUESTIONS])
+)
+
+
+def sample_questions(
+    n: int, exclude: set[str] | frozenset[str] = frozenset(), client_id: str | None = None
+) -> list[dict]:
+    """
+    n distinct bank questions, preferring ids not in exclude; only when those run out
+    are excluded ones reused, so callers always get min(n, bank size) items. With a
+    client_id, questions come from that client's shuffle bag (no repeats per cycle).
+    """
+    if client_id is not None:
+        picked: list[dict] = []
+        ids: set[str] = set()
+        bank_size = len(COMPUTER_VISION_QUESTIONS)
+        # At most two passes over the bag: skip excluded ids first, then allow them
+        for attempt in range(2 * bank_size):
+            item = COMPUTER_VISION_QUESTIONS[question_sampler.next_static_index(client_id, bank_size)]
+            if item["id"] in ids or (item["id"] in exclude and attempt < bank_size):
+                continue
+            picked.append(item)
+            ids.add(item["id"])
+            if len(picked) >= n:
+                break
+        return picked
+    fresh = [q for q in COMPUTER_VISION_QUESTIONS if q["id"] not in exclude]
+    picked = random.sample(fresh, min(n, len(fresh)))
+    if len(picked) < n:
+        seen = [q for q in COMPUTER_VISION_QUESTIONS if q["id"] in exclude]
+        picked += random.sample(seen, min(n - len(picked), len(seen)))
+    return picked
+
+
 # ── Endpoints ──────────────────────────────────────────────────────────────────
 
 
@@ -546,12 +606,23 @@ def _to_response(item: dict) -> QuestionResponse:
     "",
     response_model=QuestionResponse,
     summary="Get a random question",
-    description="Returns one random computer vision question with hint, answer, and an MCQ.",
+    description=(
+        "Returns one random computer vision question with hint, answer, and an MCQ. "
+        "With an X-Device-ID header, the device sees every question once before any repeats."
+    ),
 )
-async def get_question() -> QuestionResponse:
+async def get_question(
+    request: Request,
+    device_id: Optional[str] = Header(None, alias=DEVICE_ID_HEADER),
+) -> Response:
     """Return a single random question (hint, answer, MCQ) on computer vision."""
-    item = random.choice(COMPUTER_VISION_QUESTIONS)
-    return _to_response(item)
+    client_id = client_key(device_id)
+    if client_id is not None:
+        index = question_sampler.next_static_index(client_id, len(COMPUTER_VISION_QUESTIONS))
+        item = COMPUTER_VISION_QUESTIONS[index]
+    else:
+        item = random.choice(COMPUTER_VISION_QUESTIONS)
+    return encoded_response(request, _ITEM_BODIES[item["id"]], headers=_CACHE_HEADERS)
 
 
 @router.get(
@@ -560,6 +631,6 @@ async def get_question() -> QuestionResponse:
     summary="List all questions",
     description="Returns all computer vision questions (e.g. for debugging or practice).",
 )
-async def list_questions() -> list[QuestionResponse]:
+async def list_questions(request: Request) -> Response:
     """Return all sample questions."""
-    return [_to_response(item) for item in COMPUTER_VISION_QUESTIONS]
+    return encoded_response(request, _ALL_BODY, headers=_CACHE_HEADERS)
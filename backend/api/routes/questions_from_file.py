@@ -1,18 +1,51 @@
 """
 Question-from-file endpoint: pick a random active course, a (recent) file from it,
 and generate one question via OpenAI from the file content. Same response shape as /questions.
+
+Questions are served from the pre-generated per-course pool (services.question_pool)
+when it has one; generation only happens on the request path while the pool is cold.
+
+Generation on the request path runs under a deadline (QUESTION_DEADLINE_MS). If it is
+not done in time the endpoint answers with a cached question from another file or, failing
+that, a static bank question, while generation finishes in the background and feeds the
+pool. served_from in the response says which path answered.
+
+GET /questions/batch returns several distinct questions (pool and/or static bank) in one
+round trip, so a client can prefetch a whole interrupt's worth.
+
+Courses, files and the pool are the request's tenant's (services.tenancy): the X-Canvas-Token
+user's if one is sent, else the configured Canvas user's.
 """
 
+import asyncio
 import logging
+import random
 
-from fastapi import APIRouter, HTTPException
+from typing import Any, Literal, NoReturn, Optional
 
-from api.routes.questions import MCQQuestion, QuestionResponse
-from services.question_from_file import generate_question_from_file
+from fastapi import APIRouter, Header, HTTPException, Query
+
+from api.routes.questions import (
+    COMPUTER_VISION_QUESTIONS,
+    MCQQuestion,
+    ServedQuestionResponse,
+    sample_questions,
+)
+from config.settings import settings
+from services.deadline import Deadline, deadline_scope, is_timeout
+from services.question_from_file import (
+    generate_question_for_course,
+    generate_question_from_file,
+    take_cached_question,
+)
+from services.question_sampler import DEVICE_ID_HEADER, client_key, question_sampler
+from services.tenancy import Tenant, current_tenant
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+MAX_BATCH_SIZE = 20
+
 
 def _detail(e: Exception) -> str:
     return str(e) or "Unknown error"
@@ -20,30 +53,162 @@ def _detail(e: Exception) -> str:
 
 @router.get(
     "/from-file",
-    response_model=QuestionResponse,
+    response_model=ServedQuestionResponse,
     summary="Get a question generated from a course file",
     description=(
         "Picks a random active course, a supported file from its modules (preferring recent), "
         "extracts text, and uses OpenAI to generate one question in the same format as GET /questions. "
-        "Requires OPENAI_API_KEY and Canvas to be configured."
+        "Requires OPENAI_API_KEY and Canvas to be configured. "
+        "Served instantly from the pre-generated question pool when it is warm; otherwise answers "
+        "within QUESTION_DEADLINE_MS, falling back to a cached or static question (see served_from)."
     ),
 )
-async def get_question_from_file() -> QuestionResponse:
-    try:
-        data = await generate_question_from_file()
-    except ValueError as e:
+async def get_question_from_file(
+    course_id: Optional[int] = Query(None, description="Only questions from this course"),
+    device_id: Optional[str] = Header(None, alias=DEVICE_ID_HEADER),
+) -> ServedQuestionResponse:
+    tenant = await current_tenant()
+    if settings.question_pool_enabled:
+        client_id = client_key(device_id)
+        if client_id is not None:
+            pooled = next(iter(question_sampler.next_generated(client_id, tenant.pool, 1, course_id)), None)
+        else:
+            pooled = tenant.pool.pop(course_id)
+        if pooled is not None:
+            return _to_response(pooled, "pool")
+    if settings.question_deadline_ms <= 0:
+        try:
+            data = await _generate(tenant, course_id)
+        except Exception as e:
+            _raise_http(e)
+        return _to_response(data, "generated")
+
+    deadline = Deadline(settings.question_deadline_ms / 1000, settings.question_background_seconds)
+    with deadline_scope(deadline):
+        task = asyncio.create_task(_generate(tenant, course_id))
+    done, _ = await asyncio.wait({task}, timeout=deadline.time_to_respond())
+    if task in done and not is_timeout(task.exception()):
+        try:
+            data = task.result()
+        except Exception as e:
+            _raise_http(e)
+        return _to_response(data, "generated")
+
+    logger.warning(
+        "questions/from-file: deadline reached during %s, serving fallback", deadline.stage
+    )
+    if task.done():
+        task.exception()  # retrieved: a timed-out step, nothing left to finish
+    elif settings.question_background_seconds > 0:
+        task.add_done_callback(lambda t: _finish_in_background(tenant, t))
+    else:
+        task.cancel()
+    cached = await take_cached_question(course_id, tenant.catalog)
+    if cached is None and course_id is not None:
+        cached = await take_cached_question(catalog=tenant.catalog)
+    if cached is not None:
+        return _to_response(cached, "cache")
+    return _to_response(random.choice(COMPUTER_VISION_QUESTIONS), "static")
+
+
+async def _generate(tenant: Tenant, course_id: Optional[int]) -> dict[str, Any]:
+    if course_id is None:
+        return await generate_question_from_file(tenant.canvas, tenant.catalog)
+    course = tenant.catalog.course(course_id)
+    if course is None:
+        # Not (yet) listed for this user: generate for the request, but start no pooling
+        course = {"id": course_id, "name": "Course"}
+    elif settings.question_pool_enabled:
+        tenant.pool.add_course(course)
+    return await generate_question_for_course(course, tenant.canvas, tenant.catalog)
+
+
+def _finish_in_background(tenant: Tenant, task: asyncio.Task) -> None:
+    """Keep a question generated after its request gave up, instead of discarding it."""
+    if task.cancelled():
+        return
+    e = task.exception()
+    if e is not None:
+        logger.warning("questions/from-file: background generation failed: %s", _detail(e))
+        return
+    tenant.pool.offer(task.result())
+
+
+def _raise_http(e: Exception) -> NoReturn:
+    if isinstance(e, ValueError):
         msg = _detail(e)
         logger.warning("questions/from-file: %s", msg)
         if "No active courses" in msg or "No usable files" in msg:
             raise HTTPException(status_code=404, detail=msg)
-        if "OPENAI_API_KEY" in msg or "could not be parsed" in msg or "empty content" in msg:
+        if (
+            "OPENAI_API_KEY" in msg
+            or "could not be parsed" in msg
+            or "empty content" in msg
+            or "no valid questions" in msg
+        ):
             raise HTTPException(status_code=503, detail=msg)
         raise HTTPException(status_code=422, detail=msg)
-    except Exception as e:
-        logger.exception("questions/from-file error")
-        raise HTTPException(status_code=500, detail=_detail(e))
+    logger.error("questions/from-file error", exc_info=e)
+    raise HTTPException(status_code=500, detail=_detail(e))
+
+
+@router.get(
+    "/batch",
+    response_model=list[ServedQuestionResponse],
+    summary="Get several distinct questions at once",
+    description=(
+        "Returns n distinct questions in one round trip, skipping ids listed in exclude "
+        "(repeat the parameter or comma-separate ids). source=generated draws from the "
+        "pre-generated course question pool and tops up from the static bank if the pool runs "
+        "short; source=static uses the static bank only. Defaults to generated when course_id "
+        "is given, else static. With an X-Device-ID header, questions the device was already "
+        "served are avoided until its shuffle bag cycles."
+    ),
+)
+async def get_question_batch(
+    n: int = Query(3, ge=1, le=MAX_BATCH_SIZE, description="Number of questions"),
+    course_id: Optional[int] = Query(None, description="Only generated questions from this course"),
+    exclude: list[str] = Query([], description="Question ids the client has already seen"),
+    source: Optional[Literal["static", "generated"]] = Query(None),
+    device_id: Optional[str] = Header(None, alias=DEVICE_ID_HEADER),
+) -> list[ServedQuestionResponse]:
+    tenant = await current_tenant()
+    pool = tenant.pool
+    client_id = client_key(device_id)
+    skip = {qid.strip() for value in exclude for qid in value.split(",") if qid.strip()}
+    if source is None:
+        source = "generated" if course_id is not None else "static"
+    questions: list[ServedQuestionResponse] = []
+    if source == "generated" and settings.question_pool_enabled:
+        if course_id is not None and pool.course(course_id) is None:
+            course = tenant.catalog.course(course_id)
+            if course is not None:  # only courses Canvas listed for this user get a pool
+                pool.add_course(course)
+        if client_id is not None:
+            pooled = question_sampler.next_generated(client_id, pool, n, course_id, skip)
+        else:
+            pooled = pool.pop_many(n, course_id, skip)
+        questions = [_to_response(q, "pool") for q in pooled]
+        skip.update(q.id for q in questions)
+    if len(questions) < n:
+        static = sample_questions(n - len(questions), skip, client_id)
+        questions += [_to_response(q, "static") for q in static]
+    return questions
+
+
+@router.get(
+    "/from-file/pool",
+    summary="Question pool fill levels",
+    description="Ready/served counts, refill state and last refill latency per course of the caller's pool.",
+)
+async def get_question_pool_stats() -> dict[str, Any]:
+    tenant = await current_tenant()
+    return {"enabled": settings.question_pool_enabled, **tenant.pool.stats()}
+
+
+def _to_response(data: dict[str, Any], served_from: str) -> ServedQuestionResponse:
     mcq = data.get("mcq")
-    return QuestionResponse(
+    return ServedQuestionResponse(
         id=data["id"],
         topic=data["topic"],
         hint=data["hint"],
@@ -53,4 +218,5 @@ async def get_question_from_file() -> QuestionResponse:
             options=mcq["options"],
             correct_index=mcq["correct_index"],
         ) if mcq else None,
+        served_from=served_from,
     )
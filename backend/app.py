@@ -3,18 +3,58 @@
 # Load .env as early as possible (deploy may rely on host env vars instead)
 from config import settings  # noqa: F401 — triggers load_dotenv
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 from api.routes import router as api_router
 from api.routes import courses as courses_routes
 from api.routes import files as files_routes
+from api.routes import metrics as metrics_routes
 from api.routes import questions as questions_routes
 from api.routes import questions_from_file as questions_from_file_routes
+from api.routes import question_stream as question_stream_routes
+from services.fast_json import FastJSONResponse
+from services.ingest_scheduler import scheduler as ingest_scheduler
+from services.question_cache import question_cache
+from services.question_feed import question_feed
+from services.metrics import MetricsMiddleware
+from services.tenancy import TenantMiddleware, TenantTokenError, tenants
+from services.tracing import TracingMiddleware
+from services.warmup import warm_up
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Renew ingestion leases and resume jobs interrupted by a restart/redeploy
+    ingest_scheduler.start()
+    question_cache.start()
+    # Per Canvas user: course/file catalog so question requests don't list Canvas on the
+    # request path, and question pools kept stocked so /questions/from-file never waits on
+    # OpenAI. Users sending their own token are added on first request.
+    tenants.start()
+    # Push new questions to /questions/stream and /questions/poll listeners
+    question_feed.start(questions_routes.COMPUTER_VISION_QUESTIONS)
+    # SDKs otherwise load on first use; warming doesn't hold up start-up
+    warm_task = asyncio.create_task(asyncio.to_thread(warm_up)) if settings.warm_up_sdks else None
+    yield
+    if warm_task is not None:
+        await asyncio.gather(warm_task, return_exceptions=True)
+    await question_feed.stop()
+    # Jobs first: they download with tenants' Canvas clients, closed below
+    await ingest_scheduler.stop()
+    await tenants.stop()
+    await question_cache.stop()
+
 
 app = FastAPI(
     title="DoomScholar API",
     description="Backend for doomscrolling control app; Canvas integration.",
+    lifespan=lifespan,
+    # orjson encoding; typed routes are validated once and encoded once
+    default_response_class=FastJSONResponse,
 )
 
 # CORS — open for local hackathon dev; lock down before deployment
@@ -25,6 +65,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+# Sampled requests (TRACE_SAMPLE_RATE) get span traces and a Server-Timing header
+app.add_middleware(TracingMiddleware)
+# X-Canvas-Token / Authorization: Bearer selects the Canvas user (tenant) a request acts as
+app.add_middleware(TenantMiddleware)
+
+
+
+@app.exception_handler(TenantTokenError)
+async def tenant_token_error(request: Request, exc: TenantTokenError) -> FastJSONResponse:
+    return FastJSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+
 
 app.include_router(api_router)
 # Also serve at /courses and /courses/... so clients without /api/v1 prefix work
@@ -36,6 +88,8 @@ app.include_router(
 )
 app.include_router(questions_routes.router, prefix="/questions", tags=["Questions"])
 app.include_router(questions_from_file_routes.router, prefix="/questions", tags=["Questions"])
+app.include_router(question_stream_routes.router, prefix="/questions", tags=["Questions"])
+app.include_router(metrics_routes.router, tags=["Meta"])
 
 
 @app.get("/", tags=["Meta"])
@@ -45,6 +99,7 @@ async def root():
         "message": "DoomScholar API",
         "docs": "/docs",
         "health": "/health",
+        "metrics": "/metrics",
         "api_v1": {
             "courses": "GET /api/v1/courses",
             "course_files": "GET /api/v1/courses/{course_id}/files",
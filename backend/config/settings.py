@@ -12,6 +12,29 @@ def _str(name: str, default: str) -> str:
     return (value or "").strip()
 
 
+def _int(name: str, default: int) -> int:
+    try:
+        return int(_str(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _float(name: str, default: float) -> float:
+    try:
+        return float(_str(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _bool(name: str, default: bool) -> bool:
+    return _str(name, "1" if default else "0").lower() in ("1", "true", "yes", "on")
+
+
+def _path(name: str, default: Path) -> Path:
+    value = _str(name, "")
+    return Path(value) if value else default
+
+
 class Settings:
     """Canvas, Cohere, and Qdrant configuration."""
 
@@ -26,5 +49,112 @@ class Settings:
     qdrant_api_key: str = _str("QDRANT_API_KEY", "")
     qdrant_collection_name: str = _str("QDRANT_COLLECTION_NAME", "doomscholar")
 
+    # Ingestion pipeline: workers per stage, queue depth between stages, and the
+    # byte budget for files that have been downloaded but not yet parsed.
+    ingest_download_workers: int = _int("INGEST_DOWNLOAD_WORKERS", 4)
+    ingest_parse_workers: int = _int("INGEST_PARSE_WORKERS", 2)
+    ingest_embed_workers: int = _int("INGEST_EMBED_WORKERS", 2)
+    ingest_upsert_workers: int = _int("INGEST_UPSERT_WORKERS", 1)
+    ingest_queue_size: int = _int("INGEST_QUEUE_SIZE", 8)
+    ingest_max_buffered_bytes: int = _int("INGEST_MAX_BUFFERED_BYTES", 64 * 1024 * 1024)
+
+    # Ingestion scheduler: courses ingesting at once, and process-wide caps
+    # shared (round-robin) by all running courses.
+    ingest_max_concurrent_courses: int = _int("INGEST_MAX_CONCURRENT_COURSES", 4)
+    ingest_max_concurrent_files: int = _int("INGEST_MAX_CONCURRENT_FILES", 16)
+    ingest_max_concurrent_downloads: int = _int("INGEST_MAX_CONCURRENT_DOWNLOADS", 8)
+    ingest_max_concurrent_embed_batches: int = _int("INGEST_MAX_CONCURRENT_EMBED_BATCHES", 4)
+    # Seconds a worker's claim on a course job survives without renewal; after
+    # that another worker (or this one after a restart) resumes the job.
+    ingest_lease_ttl_seconds: int = _int("INGEST_LEASE_TTL_SECONDS", 30)
+    # Runs a job gets when each one dies mid-run (crash, OOM kill) before it is marked failed.
+    ingest_max_attempts: int = _int("INGEST_MAX_ATTEMPTS", 3)
+
+    # Estimated tokens of course material per question prompt, picked across the whole file.
+    question_context_token_budget: int = _int("QUESTION_CONTEXT_TOKEN_BUDGET", 2000)
+    # Distinct questions requested per OpenAI call; the batch becomes the file's question set.
+    question_batch_size: int = _int("QUESTION_BATCH_SIZE", 5)
+    # Ingested courses take question context from Qdrant instead of downloading a file: a seed
+    # chunk and its nearest neighbours in the course. Seeds rotate through the course's files
+    # least recently used first ("lru") or are drawn uniformly from its chunks ("random").
+    question_retrieval_enabled: bool = _bool("QUESTION_RETRIEVAL_ENABLED", True)
+    question_retrieval_neighbors: int = _int("QUESTION_RETRIEVAL_NEIGHBORS", 8)
+    question_retrieval_seed: str = _str("QUESTION_RETRIEVAL_SEED", "lru")
+
+    # Canvas listing routes (/courses, /courses/{id}/files[/via_modules]) answer from a
+    # server-side snapshot this fresh, and serve it stale while refreshing for this long.
+    listing_snapshot_ttl_seconds: int = _int("LISTING_SNAPSHOT_TTL_SECONDS", 30)
+    listing_stale_while_revalidate_seconds: int = _int("LISTING_STALE_WHILE_REVALIDATE_SECONDS", 120)
+
+    # Background-refreshed catalog of active courses and their files; file picks
+    # prefer recent files, with weights halving every half-life.
+    course_catalog_refresh_seconds: int = _int("COURSE_CATALOG_REFRESH_SECONDS", 300)
+    course_catalog_recency_half_life_days: int = _int("COURSE_CATALOG_RECENCY_HALF_LIFE_DAYS", 30)
+
+    # Generated question sets: in-memory LRU bounded by entries and bytes, written
+    # through to SQLite so restarts and other workers start warm.
+    question_cache_max_entries: int = _int("QUESTION_CACHE_MAX_ENTRIES", 2048)
+    question_cache_max_bytes: int = _int("QUESTION_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+    question_cache_ttl_seconds: int = _int("QUESTION_CACHE_TTL_SECONDS", 24 * 60 * 60)
+    question_cache_sweep_seconds: int = _int("QUESTION_CACHE_SWEEP_SECONDS", 300)
+
+    # /questions/from-file answers within this budget, falling back to a cached question
+    # from another file or the static bank; 0 disables the deadline. Generation that
+    # missed it may keep running this many seconds to fill the caches (0 = cancel it).
+    question_deadline_ms: int = _int("QUESTION_DEADLINE_MS", 2500)
+    question_background_seconds: int = _int("QUESTION_BACKGROUND_SECONDS", 120)
+
+    # Pre-generated question pool for /questions/from-file: background workers
+    # refill a course back up to the high watermark once it drops below the low one.
+    question_pool_enabled: bool = _bool("QUESTION_POOL_ENABLED", True)
+    question_pool_low_watermark: int = _int("QUESTION_POOL_LOW_WATERMARK", 3)
+    question_pool_high_watermark: int = _int("QUESTION_POOL_HIGH_WATERMARK", 10)
+    question_pool_workers: int = _int("QUESTION_POOL_WORKERS", 2)
+    question_pool_course_refresh_seconds: int = _int("QUESTION_POOL_COURSE_REFRESH_SECONDS", 600)
+
+    # Question push feed (/questions/stream, /questions/poll): a static question goes out
+    # after this many quiet seconds (0 = pool questions only); pool questions at most
+    # once per min gap.
+    question_stream_interval_seconds: int = _int("QUESTION_STREAM_INTERVAL_SECONDS", 60)
+    question_stream_min_gap_seconds: int = _int("QUESTION_STREAM_MIN_GAP_SECONDS", 15)
+
+    # Per-device non-repeating question sampling (X-Device-ID header); optionally
+    # persisted so devices keep their place across restarts and workers.
+    question_sampler_max_clients: int = _int("QUESTION_SAMPLER_MAX_CLIENTS", 10000)
+    question_sampler_persist: bool = _bool("QUESTION_SAMPLER_PERSIST", False)
+
+    # OpenAI/Cohere/Qdrant SDKs and document parsers load on first use; set this to
+    # import them and build the clients in the background right after start-up instead.
+    warm_up_sdks: bool = _bool("WARM_UP_SDKS", False)
+
+    # Span tracing: fraction of requests/ingestion runs traced (0 = off). Traced requests get
+    # a Server-Timing header; spans go to a JSON-lines file and/or an OTLP/HTTP JSON endpoint.
+    trace_sample_rate: float = _float("TRACE_SAMPLE_RATE", 0.0)
+    trace_export_path: str = _str("TRACE_EXPORT_PATH", "")
+    trace_otlp_url: str = _str("TRACE_OTLP_URL", "")
+
+    # Multi-tenancy: requests may carry their own Canvas token (X-Canvas-Token or
+    # Authorization: Bearer); each such user gets a Canvas client, course catalog and
+    # question pool. At most TENANT_MAX_ACTIVE users are kept (least recently seen are
+    # dropped, as are users idle this long), each with this many concurrent Canvas calls.
+    tenant_max_active: int = _int("TENANT_MAX_ACTIVE", 256)
+    tenant_idle_seconds: int = _int("TENANT_IDLE_SECONDS", 30 * 60)
+    tenant_max_canvas_connections: int = _int("TENANT_MAX_CANVAS_CONNECTIONS", 8)
+    # Courses one token-carrying user may have ingesting at once (0 = no cap); further ones wait.
+    tenant_max_running_ingests: int = _int("TENANT_MAX_RUNNING_INGESTS", 2)
+    # OpenAI question generations at once, shared round-robin across users.
+    question_generation_max_concurrent: int = _int("QUESTION_GENERATION_MAX_CONCURRENT", 8)
+
+    # Content-addressed caches shared by all users: parsed sections per file content hash
+    # and Cohere vectors per chunk text, each bounded by approximate bytes (0 = off).
+    parse_cache_max_bytes: int = _int("PARSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    embedding_cache_max_bytes: int = _int("EMBEDDING_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+    # Local state (ingestion manifests etc.). Mount a volume here in production.
+    data_dir: Path = _path("DATA_DIR", _backend_dir / ".data")
+    ingest_db_path: Path = _path("INGEST_DB_PATH", data_dir / "ingest.sqlite3")
+    question_cache_db_path: Path = _path("QUESTION_CACHE_DB_PATH", data_dir / "questions.sqlite3")
+    question_sampler_db_path: Path = _path("QUESTION_SAMPLER_DB_PATH", data_dir / "clients.sqlite3")
+
 
 settings = Settings()
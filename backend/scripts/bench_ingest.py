@@ -0,0 +1,278 @@
+"""
+Microbenchmarks for the ingestion CPU path: parse_file per document type,
+chunk_sections, and building Qdrant upsert batches from a ChunkBatch and its
+vector matrix (qdrant_client.build_batches).
+
+Synthetic PPTX, DOCX, PDF and TXT fixtures are generated locally from a fixed
+seed (--scale multiplies their size). Each case reports throughput (best of
+--repeat runs) and peak traced memory (tracemalloc, measured in a separate run
+so it does not skew the timing).
+
+Results are compared against a JSON baseline; the run exits 1 if a case's
+throughput drops, or its peak memory grows, by more than --threshold. Timings
+are machine-specific: refresh the baseline with --update-baseline on the
+machine that runs the comparison.
+
+    cd backend && python scripts/bench_ingest.py
+    python scripts/bench_ingest.py --update-baseline
+    python scripts/bench_ingest.py --scale 4 --repeat 3 --output results.json
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bench-ingest-"))
+
+from services.chunker import chunk_sections  # noqa: E402
+from services.cohere_client import EMBED_DIMENSION  # noqa: E402
+from services.parser import Section, parse_file  # noqa: E402
+from services.qdrant_client import build_batches  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).with_name("bench_ingest_baseline.json")
+
+_WORDS = (
+    "gradient descent convolution kernel stride padding feature map activation "
+    "backpropagation loss function softmax entropy regularization dropout batch "
+    "normalization optimizer momentum learning rate epoch validation overfitting "
+    "transformer attention embedding token sequence encoder decoder residual layer"
+).split()
+
+
+# ── Synthetic fixtures ────────────────────────────────────────────────────────
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _count(base: int, scale: float) -> int:
+    return max(1, int(base * scale))
+
+
+def make_txt(scale: float, seed: int = 1) -> bytes:
+    rng = random.Random(seed)
+    paragraphs = [" ".join(_sentence(rng, 14) for _ in range(6)) for _ in range(_count(400, scale))]
+    return "\n\n".join(paragraphs).encode()
+
+
+def make_docx(scale: float, seed: int = 2) -> bytes:
+    from docx import Document
+
+    rng = random.Random(seed)
+    doc = Document()
+    for i in range(_count(600, scale)):
+        if i % 25 == 0:
+            doc.add_heading(_sentence(rng, 4), level=2)
+        doc.add_paragraph(" ".join(_sentence(rng, 12) for _ in range(4)))
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def make_pptx(scale: float, seed: int = 3) -> bytes:
+    from pptx import Presentation
+
+    rng = random.Random(seed)
+    prs = Presentation()
+    layout = prs.slide_layouts[1]  # title and content
+    for _ in range(_count(80, scale)):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = _sentence(rng, 5)
+        body = slide.placeholders[1].text_frame
+        body.text = _sentence(rng, 12)
+        for _ in range(5):
+            body.add_paragraph().text = _sentence(rng, 12)
+    out = io.BytesIO()
+    prs.save(out)
+    return out.getvalue()
+
+
+def make_pdf(scale: float, seed: int = 4) -> bytes:
+    """A plain PDF with Helvetica text pages, written directly (no PDF library needed)."""
+    rng = random.Random(seed)
+    pages = _count(40, scale)
+    objects: list[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # page tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for _ in range(pages):
+        lines = [_sentence(rng, 11).replace("(", "").replace(")", "") for _ in range(45)]
+        text = "".join(f"({line}) Tj T* " for line in lines)
+        stream = f"BT /F1 10 Tf 12 TL 40 780 Td {text}ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), pages
+    )
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+FIXTURES: dict[str, Callable[..., bytes]] = {
+    "pptx": make_pptx,
+    "docx": make_docx,
+    "pdf": make_pdf,
+    "txt": make_txt,
+}
+
+
+# ── Measurement ───────────────────────────────────────────────────────────────
+
+def measure(fn: Callable[[], Any], units: float, repeat: int, min_seconds: float = 0.2) -> dict[str, float]:
+    """
+    Best-of-repeat throughput (units/s) and peak traced memory of one more run.
+    Fast cases are looped so each timed run lasts at least min_seconds; the
+    garbage collector is paused while timing, as timeit does.
+    """
+    start = time.perf_counter()
+    fn()
+    loops = max(1, int(min_seconds / max(time.perf_counter() - start, 1e-9)))
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            best = min(best, (time.perf_counter() - start) / loops)
+        finally:
+            gc.enable()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": round(best, 6),
+        "throughput": round(units / best, 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run_suite(scale: int, repeat: int) -> dict[str, dict[str, Any]]:
+    results: dict[str, dict[str, Any]] = {}
+    all_sections: list[Section] = []
+    for file_type, make in FIXTURES.items():
+        data = make(scale)
+        meta = {"filename": f"fixture.{file_type}"}
+        sections = parse_file(io.BytesIO(data), meta)
+        all_sections.extend(sections)
+        results[f"parse_{file_type}"] = {
+            **measure(lambda: parse_file(io.BytesIO(data), meta), len(data) / 1e6, repeat),
+            "unit": "MB/s",
+            "input_kb": round(len(data) / 1024, 1),
+            "sections": len(sections),
+        }
+
+    chunks = chunk_sections(all_sections)
+    results["chunk_sections"] = {
+        **measure(lambda: chunk_sections(all_sections), len(chunks), repeat),
+        "unit": "chunks/s",
+        "sections": len(all_sections),
+        "chunks": len(chunks),
+    }
+
+    vectors = np.random.default_rng(5).random((len(chunks), EMBED_DIMENSION), dtype=np.float32)
+
+    def build() -> int:
+        # Consumed one batch at a time, as qdrant_client.upsert_chunks does
+        return sum(len(batch.ids) for batch in build_batches(1, 1, "fixture", chunks, vectors))
+
+    results["build_batches"] = {
+        **measure(build, len(chunks), repeat),
+        "unit": "points/s",
+        "points": len(chunks),
+    }
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if current["throughput"] < base["throughput"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {current['throughput']:.1f} {current['unit']} "
+                f"vs baseline {base['throughput']:.1f} ({current['throughput'] / base['throughput'] - 1:+.0%})"
+            )
+        if current["peak_kb"] > base["peak_kb"] * (1 + threshold):
+            regressions.append(
+                f"{name}: peak memory {current['peak_kb']:.0f} KB "
+                f"vs baseline {base['peak_kb']:.0f} KB ({current['peak_kb'] / base['peak_kb'] - 1:+.0%})"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=1, help="fixture size multiplier")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case (best is kept)")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.3, help="allowed regression, e.g. 0.3 = 30%%")
+    parser.add_argument("--update-baseline", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--output", type=Path, help="also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = run_suite(max(1, args.scale), max(1, args.repeat))
+    print(f"{'case':<16}{'throughput':>20}{'best ms':>10}{'peak KB':>10}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['throughput']:>11.1f} {r['unit']:<8}{r['seconds'] * 1000:>10.2f}{r['peak_kb']:>10.0f}")
+
+    document = {"scale": args.scale, "python": sys.version.split()[0], "results": results}
+    if args.output:
+        args.output.write_text(json.dumps(document, indent=2) + "\n")
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(document, indent=2) + "\n")
+        print(f"\nbaseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"\nno baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("scale") != args.scale:
+        print(f"\nbaseline was recorded at scale {baseline.get('scale')}; not comparing")
+        return 0
+    regressions = compare(results, baseline["results"], args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"\nno regressions beyond {args.threshold:.0%} against {args.baseline.name}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
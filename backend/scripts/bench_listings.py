@@ -0,0 +1,188 @@
+"""
+Requests/s of the Canvas listing routes on large listings, against a fake Canvas.
+
+For GET /courses and GET /courses/{id}/files it compares:
+
+- legacy: the previous handlers (parse Canvas JSON, validate through
+  response_model / build one Pydantic model per file, encode again);
+- cold:   the current handlers with the listing snapshot disabled, so every
+  request runs passthrough/projection, encoding, ETag and gzip;
+- warm:   the current handlers answering from the listing snapshot.
+
+Canvas itself is replaced by in-memory data, so the numbers are the server's
+own CPU cost per request.
+
+    cd backend && python scripts/bench_listings.py --files 5000 --seconds 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bench-listings-"))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from api.routes import courses as courses_routes  # noqa: E402
+from api.routes import files as files_routes  # noqa: E402
+from api.routes.files import CanvasFile, CourseFilesResponse  # noqa: E402
+from services.canvas import canvas_service  # noqa: E402
+from services.fast_json import FastJSONResponse  # noqa: E402
+from services.listing_snapshots import listing_snapshots  # noqa: E402
+
+COURSE_ID = 1
+
+
+def fake_courses(n: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "id": i,
+            "name": f"Course {i}: Introduction to Something Long Enough",
+            "course_code": f"CRS {i:04d}",
+            "workflow_state": "available",
+            "account_id": 1,
+            "start_at": "2026-08-24T04:00:00Z",
+            "end_at": None,
+            "enrollments": [{"type": "student", "role": "StudentEnrollment", "enrollment_state": "active"}],
+            "calendar": {"ics": f"https://canvas.example.edu/feeds/calendars/course_{i}.ics"},
+            "time_zone": "America/New_York",
+            "blueprint": False,
+            "term": {"id": 7, "name": "Fall 2026"},
+        }
+        for i in range(n)
+    ]
+
+
+def fake_files(n: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "id": i,
+            "uuid": f"{i:032x}",
+            "folder_id": 10,
+            "display_name": f"Lecture {i} - Slides.pptx",
+            "filename": f"lecture_{i}_slides.pptx",
+            "content-type": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+            "url": f"https://canvas.example.edu/files/{i}/download?download_frd=1&verifier=abc{i}",
+            "size": 1_048_576 + i,
+            "created_at": "2026-09-01T12:00:00Z",
+            "updated_at": "2026-09-02T12:00:00Z",
+            "locked": False,
+            "hidden": False,
+            "thumbnail_url": None,
+            "mime_class": "ppt",
+        }
+        for i in range(n)
+    ]
+
+
+def legacy_app() -> FastAPI:
+    """The handlers as they were before passthrough/projection and snapshots."""
+    app = FastAPI()
+
+    @app.get("/courses", response_model=list[dict[str, Any]])
+    async def list_courses() -> list[dict[str, Any]]:
+        return await canvas_service.list_courses()
+
+    @app.get("/courses/{course_id}/files", response_model=CourseFilesResponse)
+    async def list_course_files(course_id: int) -> CourseFilesResponse:
+        raw_files = await canvas_service.list_course_files(course_id)
+        files = [
+            CanvasFile(
+                id=f["id"],
+                display_name=f.get("display_name", f.get("filename", "")),
+                filename=f.get("filename", ""),
+                content_type=f.get("content-type", "application/octet-stream"),
+                size_kb=round(f.get("size", 0) / 1024, 2),
+                url=f.get("url", ""),
+                updated_at=f.get("updated_at"),
+            )
+            for f in raw_files
+        ]
+        return CourseFilesResponse(course_id=course_id, total_files=len(files), files=files)
+
+    return app
+
+
+def current_app() -> FastAPI:
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.include_router(courses_routes.router, prefix="/courses")
+    app.include_router(files_routes.router, prefix="/courses/{course_id}/files")
+    return app
+
+
+async def run(app: FastAPI, path: str, seconds: float, concurrency: int) -> dict[str, float]:
+    latencies: list[float] = []
+    size = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        (await client.get(path)).raise_for_status()  # warm-up
+        stop_at = time.perf_counter() + seconds
+
+        async def worker() -> None:
+            nonlocal size
+            while time.perf_counter() < stop_at:
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                size = len(response.content)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "kb": size / 1024,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=500, help="courses in the fake listing")
+    parser.add_argument("--files", type=int, default=5000, help="files in the fake course")
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration per measurement")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    courses_body = json.dumps(fake_courses(args.courses)).encode()
+    files = fake_files(args.files)
+
+    async def list_courses_raw(**_: Any) -> bytes:
+        return courses_body
+
+    async def list_courses(**_: Any) -> list[dict[str, Any]]:
+        return json.loads(courses_body)  # what httpx's response.json() did
+
+    async def list_course_files(course_id: int, **_: Any) -> list[dict[str, Any]]:
+        return files
+
+    canvas_service.list_courses_raw = list_courses_raw
+    canvas_service.list_courses = list_courses
+    canvas_service.list_course_files = list_course_files
+
+    routes = [("/courses", f"courses ({args.courses})"), (f"/courses/{COURSE_ID}/files", f"files ({args.files})")]
+    legacy, current = legacy_app(), current_app()
+    ttl, stale = listing_snapshots.ttl_seconds, listing_snapshots.stale_seconds
+    print(f"{'route':<18}{'mode':<8}{'req/s':>10}{'p50 ms':>10}{'body KB':>10}")
+    for path, label in routes:
+        results = {"legacy": await run(legacy, path, args.seconds, args.concurrency)}
+        listing_snapshots.ttl_seconds = listing_snapshots.stale_seconds = 0
+        results["cold"] = await run(current, path, args.seconds, args.concurrency)
+        listing_snapshots.ttl_seconds, listing_snapshots.stale_seconds = max(ttl, 60), stale
+        results["warm"] = await run(current, path, args.seconds, args.concurrency)
+        for mode, r in results.items():
+            print(f"{label:<18}{mode:<8}{r['rps']:>10.1f}{r['p50_ms']:>10.2f}{r['kb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,309 @@
+"""
+Local stand-ins for Canvas, OpenAI and Cohere, served by one FastAPI app, for
+load tests (scripts/loadtest.py) and offline development.
+
+Canvas:  GET /api/v1/courses, /api/v1/courses/:id/modules (include[]=items,
+         Link-header pagination; modules with many items omit them, as Canvas
+         does), /api/v1/courses/:id/modules/:id/items, /api/v1/courses/:id/files,
+         /api/v1/files/:id, and /files/:id/download (302 to the bytes).
+         Responses carry X-Request-Cost / X-Rate-Limit-Remaining from a leaky
+         bucket; when it overflows requests get Canvas's 403 "Rate Limit Exceeded".
+OpenAI:  POST /v1/chat/completions, returning as many multiple-choice questions
+         as the prompt asks for.
+Cohere:  POST /v1/embed, returning deterministic unit vectors.
+
+Each synthetic file is a PPTX, DOCX, PDF or TXT document generated from its id
+(scripts/bench_ingest.py fixtures), so every file has distinct content.
+
+Point the backend at it with
+    CANVAS_BASE_URL=http://127.0.0.1:8900 OPENAI_BASE_URL=http://127.0.0.1:8900/v1
+    CO_API_URL=http://127.0.0.1:8900 QDRANT_URL=:memory:
+
+    cd backend && python scripts/fake_upstreams.py --port 8900 --courses 3 --files-per-course 40
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import RedirectResponse, Response
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_ingest import FIXTURES  # noqa: E402
+
+EMBED_DIMENSION = 1024
+_FILE_TYPES = ("pptx", "docx", "pdf", "txt")
+_CONTENT_TYPES = {
+    "pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "pdf": "application/pdf",
+    "txt": "text/plain",
+}
+# Canvas leaves module items out of the modules listing past roughly this many
+_INLINE_ITEMS_LIMIT = 25
+
+
+class Config:
+    def __init__(self, args: argparse.Namespace):
+        self.courses = args.courses
+        self.files_per_course = args.files_per_course
+        self.modules_per_course = max(1, args.modules_per_course)
+        self.doc_scale = args.doc_scale
+        self.canvas_latency = args.canvas_latency_ms / 1000
+        self.openai_latency = args.openai_latency_ms / 1000
+        self.cohere_latency = args.cohere_latency_ms / 1000
+        self.rate_limit = args.rate_limit
+        self.error_rate = args.error_rate
+
+
+class LeakyBucket:
+    """Canvas-style throttle: each request adds its cost, the bucket drains at `rate` per second."""
+
+    CAPACITY = 700.0
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.level = 0.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def charge(self, cost: float) -> tuple[bool, float]:
+        with self._lock:
+            now = time.monotonic()
+            self.level = max(0.0, self.level - (now - self.updated) * self.rate)
+            self.updated = now
+            if self.level + cost > self.CAPACITY:
+                return False, self.CAPACITY - self.level
+            self.level += cost
+            return True, self.CAPACITY - self.level
+
+
+def _jitter(seconds: float) -> float:
+    return seconds * random.uniform(0.5, 1.5) if seconds > 0 else 0.0
+
+
+def create_app(config: Config) -> FastAPI:
+    app = FastAPI(title="Fake Canvas / OpenAI / Cohere")
+    bucket = LeakyBucket(config.rate_limit) if config.rate_limit > 0 else None
+
+    def file_ids(course_id: int) -> list[int]:
+        return [course_id * 100_000 + j for j in range(1, config.files_per_course + 1)]
+
+    def file_type(file_id: int) -> str:
+        return _FILE_TYPES[file_id % len(_FILE_TYPES)]
+
+    def file_meta(request: Request, file_id: int) -> dict[str, Any]:
+        kind = file_type(file_id)
+        base = str(request.base_url).rstrip("/")
+        return {
+            "id": file_id,
+            "display_name": f"Lecture {file_id % 100_000}.{kind}",
+            "filename": f"lecture_{file_id}.{kind}",
+            "content-type": _CONTENT_TYPES[kind],
+            "size": len(document(file_id)),
+            "url": f"{base}/files/{file_id}/download?download_frd=1",
+            "updated_at": f"2026-09-{1 + file_id % 28:02d}T12:00:00Z",
+            "created_at": "2026-08-20T12:00:00Z",
+        }
+
+    @lru_cache(maxsize=4096)
+    def document(file_id: int) -> bytes:
+        return FIXTURES[file_type(file_id)](config.doc_scale, seed=file_id)
+
+    def modules(course_id: int) -> list[dict[str, Any]]:
+        ids = file_ids(course_id)
+        per_module = -(-len(ids) // config.modules_per_course)
+        out = []
+        for m in range(config.modules_per_course):
+            chunk = ids[m * per_module : (m + 1) * per_module]
+            items = [
+                {"id": fid + 50_000, "title": f"Lecture {fid % 100_000}", "type": "File",
+                 "content_id": fid, "position": p, "html_url": "", "url": ""}
+                for p, fid in enumerate(chunk, start=1)
+            ]
+            items.append({"id": course_id * 1000 + m, "title": "Discussion", "type": "Discussion", "position": 0})
+            out.append({"id": course_id * 100 + m, "name": f"Week {m + 1}", "items": items})
+        return out
+
+    def paginate(request: Request, rows: list[Any]) -> Response:
+        per_page = max(1, min(int(request.query_params.get("per_page", 10)), 100))
+        page = max(1, int(request.query_params.get("page", 1)))
+        body = rows[(page - 1) * per_page : page * per_page]
+        headers = {}
+        if page * per_page < len(rows):
+            params = dict(request.query_params)
+            params.update(page=str(page + 1), per_page=str(per_page))
+            query = "&".join(f"{k}={v}" for k, v in params.items())
+            headers["Link"] = f'<{str(request.url).split("?")[0]}?{query}>; rel="next"'
+        return Response(json.dumps(body), media_type="application/json", headers=headers)
+
+    @app.middleware("http")
+    async def canvas_behaviour(request: Request, call_next):
+        path = request.url.path
+        if not (path.startswith("/api/v1/") or path.startswith("/files/")):
+            return await call_next(request)
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return Response('{"errors":[{"message":"Invalid access token."}]}', status_code=401)
+        await asyncio.sleep(_jitter(config.canvas_latency))
+        cost = 1.0 + random.random() * 2
+        remaining = LeakyBucket.CAPACITY
+        if bucket is not None:
+            allowed, remaining = bucket.charge(cost)
+            if not allowed:
+                return Response("403 Forbidden (Rate Limit Exceeded)", status_code=403,
+                                headers={"X-Rate-Limit-Remaining": "0.0", "X-Request-Cost": f"{cost:.3f}"})
+        if config.error_rate and random.random() < config.error_rate:
+            return Response('{"errors":[{"message":"Internal error"}]}', status_code=500)
+        response = await call_next(request)
+        response.headers["X-Request-Cost"] = f"{cost:.3f}"
+        response.headers["X-Rate-Limit-Remaining"] = f"{remaining:.3f}"
+        return response
+
+    # ── Canvas ────────────────────────────────────────────────────────────────
+
+    @app.get("/api/v1/courses")
+    async def courses(request: Request) -> Response:
+        rows = [
+            {"id": c, "name": f"Synthetic Course {c}", "course_code": f"SYN {c:03d}",
+             "workflow_state": "available", "enrollments": [{"type": "student", "enrollment_state": "active"}]}
+            for c in range(1, config.courses + 1)
+        ]
+        return paginate(request, rows)
+
+    def check_course(course_id: int) -> None:
+        if not 1 <= course_id <= config.courses:
+            raise HTTPException(404, "The specified resource does not exist.")
+
+    @app.get("/api/v1/courses/{course_id}/modules")
+    async def course_modules(request: Request, course_id: int) -> Response:
+        check_course(course_id)
+        include_items = "items" in request.query_params.getlist("include[]")
+        rows = []
+        for module in modules(course_id):
+            row = {"id": module["id"], "name": module["name"]}
+            if include_items and len(module["items"]) <= _INLINE_ITEMS_LIMIT:
+                row["items"] = module["items"]
+            rows.append(row)
+        return paginate(request, rows)
+
+    @app.get("/api/v1/courses/{course_id}/modules/{module_id}/items")
+    async def module_items(request: Request, course_id: int, module_id: int) -> Response:
+        check_course(course_id)
+        for module in modules(course_id):
+            if module["id"] == module_id:
+                return paginate(request, module["items"])
+        raise HTTPException(404, "The specified resource does not exist.")
+
+    @app.get("/api/v1/courses/{course_id}/files")
+    async def course_files(request: Request, course_id: int) -> Response:
+        check_course(course_id)
+        return paginate(request, [file_meta(request, fid) for fid in file_ids(course_id)])
+
+    @app.get("/api/v1/files/{file_id}")
+    async def file_metadata(request: Request, file_id: int) -> dict[str, Any]:
+        if not 1 <= file_id // 100_000 <= config.courses:
+            raise HTTPException(404, "The specified resource does not exist.")
+        return file_meta(request, file_id)
+
+    @app.get("/files/{file_id}/download")
+    async def download(file_id: int) -> RedirectResponse:
+        return RedirectResponse(f"/files/{file_id}/blob", status_code=302)
+
+    @app.get("/files/{file_id}/blob")
+    async def blob(file_id: int) -> Response:
+        data = await asyncio.to_thread(document, file_id)
+        return Response(data, media_type=_CONTENT_TYPES[file_type(file_id)])
+
+    # ── OpenAI ────────────────────────────────────────────────────────────────
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request) -> dict[str, Any]:
+        body = await request.json()
+        prompt = body["messages"][-1]["content"]
+        await asyncio.sleep(_jitter(config.openai_latency))
+        match = re.search(r"Generate exactly (\d+)", prompt)
+        count = int(match.group(1)) if match else 1
+        words = re.findall(r"[A-Za-z]{6,}", prompt[-4000:]) or ["material"]
+        rng = random.Random(hashlib.sha256(prompt.encode()).digest())
+        questions = []
+        for i in range(count):
+            topic = " ".join(rng.sample(words, min(2, len(words)))).title()
+            options = [f"{w} ({i}.{k})" for k, w in enumerate(rng.sample(words * 4, 4))]
+            questions.append({
+                "topic": topic,
+                "hint": f"Think about {rng.choice(words)}.",
+                "answer": f"The answer follows from {rng.choice(words)}.",
+                "mcq": {"question": f"Q{i}: which term relates to {rng.choice(words)}?",
+                        "options": options, "correct_index": rng.randrange(4)},
+            })
+        content = json.dumps({"questions": questions})
+        prompt_tokens = len(prompt) // 4
+        return {
+            "id": f"chatcmpl-{rng.getrandbits(48):x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                      "total_tokens": prompt_tokens + len(content) // 4},
+        }
+
+    # ── Cohere ────────────────────────────────────────────────────────────────
+
+    @app.post("/v1/embed")
+    async def embed(request: Request) -> Response:
+        body = await request.json()
+        texts = body.get("texts") or []
+        await asyncio.sleep(_jitter(config.cohere_latency))
+        seeds = [int.from_bytes(hashlib.blake2b(t.encode(), digest_size=8).digest(), "little") for t in texts]
+        vectors = np.stack([np.random.default_rng(s).standard_normal(EMBED_DIMENSION) for s in seeds]) if seeds \
+            else np.zeros((0, EMBED_DIMENSION))
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        payload = {
+            "id": f"embed-{len(texts)}",
+            "response_type": "embeddings_floats",
+            "embeddings": np.round(vectors, 5).tolist(),
+            "texts": texts,
+            "meta": {"api_version": {"version": "1"}, "billed_units": {"input_tokens": sum(len(t) // 4 for t in texts)}},
+        }
+        return Response(json.dumps(payload), media_type="application/json")
+
+    return app
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--courses", type=int, default=3)
+    parser.add_argument("--files-per-course", type=int, default=40)
+    parser.add_argument("--modules-per-course", type=int, default=4)
+    parser.add_argument("--doc-scale", type=float, default=0.1, help="document size, as bench_ingest --scale")
+    parser.add_argument("--canvas-latency-ms", type=float, default=60, help="mean; each call is 0.5-1.5x")
+    parser.add_argument("--openai-latency-ms", type=float, default=1500)
+    parser.add_argument("--cohere-latency-ms", type=float, default=150)
+    parser.add_argument("--rate-limit", type=float, default=0, help="Canvas bucket drain per second (0 = off)")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of Canvas calls failing with 500")
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    import uvicorn
+
+    args = parse_args()
+    uvicorn.run(create_app(Config(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Import-time benchmark: what `import app` costs, per package.
+
+Runs `python -X importtime -c "import app"` in fresh interpreters (best of
+--runs), then prints the total, the packages with the highest self time, and the
+slowest modules by cumulative time. Exits 1 if the import pulls in one of the
+lazily loaded SDKs (services.warmup.HEAVY_MODULES) or exceeds --budget-ms, so a
+regression in cold-start cost shows up in CI.
+
+    cd backend && python scripts/import_time.py
+    python scripts/import_time.py --budget-ms 1500 --first-request
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.warmup import HEAVY_MODULES  # noqa: E402
+
+# Time from interpreter start until the first GET /questions is answered (lifespan included)
+_FIRST_REQUEST = """
+import time
+start = time.perf_counter()
+import app
+from fastapi.testclient import TestClient
+with TestClient(app.app) as client:
+    client.get("/questions").raise_for_status()
+    print(time.perf_counter() - start)
+"""
+
+
+def _env(data_dir: str) -> dict[str, str]:
+    # Keep benchmark runs away from the real state and from background work
+    return {
+        **os.environ,
+        "DATA_DIR": data_dir,
+        "QUESTION_POOL_ENABLED": "0",
+        "QUESTION_STREAM_INTERVAL_SECONDS": "0",
+        "WARM_UP_SDKS": "0",
+    }
+
+
+def measure_imports(module: str, env: dict[str, str]) -> dict[str, tuple[int, int, int]]:
+    """{module: (self_us, cumulative_us, depth)} from one -X importtime run."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings: dict[str, tuple[int, int, int]] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        timings[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return timings
+
+
+def measure_first_request(env: dict[str, str]) -> float:
+    proc = subprocess.run(
+        [sys.executable, "-c", _FIRST_REQUEST],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app", help="module to import (default: app)")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters; the fastest total is reported")
+    parser.add_argument("--top", type=int, default=15, help="rows per table")
+    parser.add_argument("--budget-ms", type=float, default=0, help="fail if the import takes longer (0 = off)")
+    parser.add_argument("--first-request", action="store_true", help="also time start-up to the first GET /questions")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = _env(data_dir)
+        runs = [measure_imports(args.module, env) for _ in range(max(1, args.runs))]
+        timings = min(runs, key=lambda t: t.get(args.module, (0, 0, 0))[1])
+        first_request = measure_first_request(env) if args.first_request else None
+
+    total_ms = timings.get(args.module, (0, 0, 0))[1] / 1000
+    by_package: dict[str, int] = defaultdict(int)
+    for name, (self_us, _, _) in timings.items():
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"import {args.module}: {total_ms:.1f} ms, {len(timings)} modules (best of {len(runs)})")
+    if first_request is not None:
+        print(f"first GET /questions after {first_request * 1000:.1f} ms")
+    print(f"\n{'package':<32}{'self ms':>10}")
+    for name, self_us in sorted(by_package.items(), key=lambda kv: -kv[1])[: args.top]:
+        print(f"{name:<32}{self_us / 1000:>10.1f}")
+    print(f"\n{'module':<48}{'cumulative ms':>14}")
+    shallow = [(n, c) for n, (_, c, depth) in timings.items() if 0 < depth <= 2]
+    for name, cumulative_us in sorted(shallow, key=lambda kv: -kv[1])[: args.top]:
+        print(f"{name:<48}{cumulative_us / 1000:>14.1f}")
+
+    failed = False
+    eager = [name for name in HEAVY_MODULES if name in timings]
+    if eager:
+        print(f"\nFAIL: imported eagerly (should load on first use): {', '.join(eager)}")
+        failed = True
+    if args.budget_ms and total_ms > args.budget_ms:
+        print(f"\nFAIL: {total_ms:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
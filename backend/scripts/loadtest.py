@@ -0,0 +1,262 @@
+"""
+End-to-end load test against local stand-ins: no real Canvas, OpenAI, Cohere
+or Qdrant involved.
+
+Starts scripts/fake_upstreams.py (Canvas, OpenAI and Cohere) and the API under
+uvicorn as subprocesses. The API is pointed at the fakes and at an in-memory
+Qdrant (QDRANT_URL=:memory:) with its state in a temporary DATA_DIR. Then:
+
+1. route load: for each route, --concurrency closed-loop clients for
+   --duration seconds; reports p50/p95/p99 latency, throughput and error rate
+   (status >= 500 or a transport error; 4xx counts too, except 404/409 which
+   some routes return by design);
+2. ingestion (unless --skip-ingest): POSTs ingestion for every synthetic
+   course at once and polls status to completion; reports per-course duration
+   percentiles, files/s, chunks/s and the failed-file rate.
+
+With --ingest-first the ingestion runs before the route load, so question
+routes generate from the indexed chunks (retrieval mode) instead of files.
+
+    cd backend && python scripts/loadtest.py --duration 15 --concurrency 16
+    python scripts/loadtest.py --routes from-file,batch --openai-latency-ms 3000
+    python scripts/loadtest.py --courses 5 --files-per-course 120 --rate-limit 50 --skip-routes
+    python scripts/loadtest.py --ingest-first --routes from-file-course --warmup 0
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+# name -> path template ({course_id} is filled per request)
+ROUTES = {
+    "questions": "/questions",
+    "batch": "/questions/batch?n=5",
+    "from-file": "/questions/from-file",
+    "from-file-course": "/questions/from-file?course_id={course_id}",
+    "courses": "/api/v1/courses",
+    "files": "/api/v1/courses/{course_id}/files",
+    "files-via-modules": "/api/v1/courses/{course_id}/files/via_modules",
+}
+DEFAULT_ROUTES = "questions,batch,from-file,courses,files-via-modules"
+_EXPECTED_4XX = (404, 409)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _summary(latencies: list[float], errors: int, elapsed: float) -> dict[str, float]:
+    latencies = sorted(latencies)
+    total = len(latencies)
+    return {
+        "requests": total,
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "error_rate": errors / total if total else 0.0,
+    }
+
+
+async def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {proc.returncode}")
+            try:
+                if (await client.get(url, timeout=2.0)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+async def load_route(
+    client: httpx.AsyncClient, template: str, courses: int, duration: float, concurrency: int
+) -> dict[str, float]:
+    latencies: list[float] = []
+    errors = 0
+    stop_at = time.monotonic() + duration
+
+    async def worker(n: int) -> None:
+        nonlocal errors
+        i = n
+        headers = {"X-Device-ID": f"loadtest-{n}"}
+        while time.monotonic() < stop_at:
+            path = template.format(course_id=1 + i % courses)
+            i += concurrency
+            start = time.perf_counter()
+            try:
+                response = await client.get(path, headers=headers)
+                failed = response.status_code >= 400 and response.status_code not in _EXPECTED_4XX
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return _summary(latencies, errors, time.monotonic() - started)
+
+
+async def run_ingestion(client: httpx.AsyncClient, courses: int, timeout: float) -> dict[str, Any]:
+    started = time.monotonic()
+    for course_id in range(1, courses + 1):
+        (await client.post(f"/api/v1/courses/{course_id}/ingest")).raise_for_status()
+    durations: list[float] = []
+    statuses: dict[int, dict[str, Any]] = {}
+    pending = set(range(1, courses + 1))
+    while pending and time.monotonic() - started < timeout:
+        await asyncio.sleep(0.5)
+        for course_id in list(pending):
+            status = (await client.get(f"/api/v1/courses/{course_id}/ingest/status")).json()
+            if status.get("status") in ("complete", "failed", "cancelled"):
+                pending.discard(course_id)
+                statuses[course_id] = status
+                durations.append(time.monotonic() - started)
+    elapsed = time.monotonic() - started
+    files = sum(s.get("files_processed", 0) + s.get("files_failed", 0) + s.get("files_skipped", 0) for s in statuses.values())
+    failed = sum(s.get("files_failed", 0) for s in statuses.values())
+    chunks = sum(s.get("chunks_indexed", 0) for s in statuses.values())
+    durations.sort()
+    return {
+        "courses": courses,
+        "completed": sum(s.get("status") == "complete" for s in statuses.values()),
+        "timed_out": len(pending),
+        "elapsed_s": elapsed,
+        "course_p50_s": _percentile(durations, 0.50),
+        "course_p95_s": _percentile(durations, 0.95),
+        "course_p99_s": _percentile(durations, 0.99),
+        "files_per_s": files / elapsed if elapsed else 0.0,
+        "chunks_per_s": chunks / elapsed if elapsed else 0.0,
+        "file_error_rate": failed / files if files else 0.0,
+        "errors": [s.get("error") for s in statuses.values() if s.get("error")],
+    }
+
+
+async def report_ingestion(client: httpx.AsyncClient, args: argparse.Namespace) -> None:
+    r = await run_ingestion(client, args.courses, args.ingest_timeout)
+    print(
+        f"\ningestion: {r['completed']}/{r['courses']} courses complete in {r['elapsed_s']:.1f}s "
+        f"(timed out: {r['timed_out']})\n"
+        f"  per course p50/p95/p99: {r['course_p50_s']:.1f}/{r['course_p95_s']:.1f}/{r['course_p99_s']:.1f}s\n"
+        f"  {r['files_per_s']:.2f} files/s, {r['chunks_per_s']:.1f} chunks/s, "
+        f"file error rate {r['file_error_rate']:.1%}"
+    )
+    for error in r["errors"]:
+        print(f"  course error: {error}")
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    fake_port, api_port = _free_port(), _free_port()
+    fake_url, api_url = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{api_port}"
+    data_dir = tempfile.mkdtemp(prefix="loadtest-")
+    fake_cmd = [
+        sys.executable, str(SCRIPTS_DIR / "fake_upstreams.py"), "--port", str(fake_port),
+        "--courses", str(args.courses), "--files-per-course", str(args.files_per_course),
+        "--doc-scale", str(args.doc_scale),
+        "--canvas-latency-ms", str(args.canvas_latency_ms),
+        "--openai-latency-ms", str(args.openai_latency_ms),
+        "--cohere-latency-ms", str(args.cohere_latency_ms),
+        "--rate-limit", str(args.rate_limit), "--error-rate", str(args.error_rate),
+    ]
+    api_env = {
+        **os.environ,
+        "CANVAS_BASE_URL": fake_url,
+        "CANVAS_ACCESS_TOKEN": "loadtest",
+        "OPENAI_API_KEY": "loadtest",
+        "OPENAI_BASE_URL": f"{fake_url}/v1",
+        "COHERE_API_KEY": "loadtest",
+        "CO_API_URL": fake_url,
+        "QDRANT_URL": ":memory:",
+        "DATA_DIR": data_dir,
+    }
+    api_cmd = [
+        sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(api_port),
+        "--log-level", "warning", "--workers", str(args.workers),
+    ]
+    procs = [
+        subprocess.Popen(fake_cmd, cwd=BACKEND_DIR),
+        subprocess.Popen(api_cmd, cwd=BACKEND_DIR, env=api_env),
+    ]
+    try:
+        await _wait_ready(f"{fake_url}/docs", procs[0])
+        await _wait_ready(f"{api_url}/health", procs[1])
+        limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(base_url=api_url, timeout=60.0, limits=limits) as client:
+            if args.ingest_first and not args.skip_ingest:
+                await report_ingestion(client, args)
+            if not args.skip_routes:
+                if args.warmup:
+                    await asyncio.sleep(args.warmup)  # let the catalog and question pool fill
+                print(f"{'route':<20}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+                for name in [r.strip() for r in args.routes.split(",") if r.strip()]:
+                    r = await load_route(client, ROUTES[name], args.courses, args.duration, args.concurrency)
+                    print(
+                        f"{name:<20}{r['requests']:>9}{r['rps']:>9.1f}{r['p50_ms']:>9.1f}"
+                        f"{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['error_rate']:>8.1%}"
+                    )
+            if not args.ingest_first and not args.skip_ingest:
+                await report_ingestion(client, args)
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", default=DEFAULT_ROUTES, help=f"comma-separated of: {', '.join(ROUTES)}")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds to wait before route load")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the API")
+    parser.add_argument("--courses", type=int, default=3)
+    parser.add_argument("--files-per-course", type=int, default=40)
+    parser.add_argument("--doc-scale", type=float, default=0.1)
+    parser.add_argument("--canvas-latency-ms", type=float, default=60)
+    parser.add_argument("--openai-latency-ms", type=float, default=1500)
+    parser.add_argument("--cohere-latency-ms", type=float, default=150)
+    parser.add_argument("--rate-limit", type=float, default=0, help="fake Canvas bucket drain per second (0 = off)")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of fake Canvas calls failing")
+    parser.add_argument("--ingest-timeout", type=float, default=600)
+    parser.add_argument("--skip-routes", action="store_true")
+    parser.add_argument("--skip-ingest", action="store_true")
+    parser.add_argument("--ingest-first", action="store_true", help="ingest before the route load")
+    args = parser.parse_args()
+    unknown = [r for r in args.routes.split(",") if r.strip() and r.strip() not in ROUTES]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)}")
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,21 @@
-"""Canvas LMS API client."""
+"""
+Canvas LMS API client.
+
+One CanvasService per Canvas user (see services.tenancy): each keeps a pooled
+httpx client, reused across calls, and caps that user's concurrent Canvas
+requests at max_connections so one user cannot hold every connection.
+"""
+import asyncio
 import io
+import time
 from typing import Any
 import httpx
 from config import settings
+from services.deadline import check as check_deadline
+from services.deadline import step_timeout
+from services.fast_json import loads
+from services.metrics import CANVAS_REQUEST_SECONDS
+from services.tracing import span
 
 
 class CanvasAPIError(Exception):
@@ -14,8 +27,29 @@ class CanvasAPIError(Exception):
         super().__init__(f"Canvas API error: {status_code} - {self.body[:200]}")
 
 
+async def timed_get(client: httpx.AsyncClient, endpoint: str, url: str, **kwargs: Any) -> httpx.Response:
+    """
+    client.get() that records latency and status code under the given endpoint
+    label. Under a request deadline the call is refused once the budget is
+    spent and its timeout is capped by what is left.
+    """
+    check_deadline(f"canvas:{endpoint}")
+    timeout = step_timeout()
+    if timeout is not None:
+        kwargs.setdefault("timeout", min(timeout, client.timeout.read or timeout))
+    start = time.perf_counter()
+    status = "error"
+    try:
+        with span(f"canvas:{endpoint}"):
+            response = await client.get(url, **kwargs)
+        status = str(response.status_code)
+        return response
+    finally:
+        CANVAS_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, status=status)
+
+
 class CanvasService:
-    """Calls Canvas REST API with the configured access token."""
+    """Calls Canvas REST API with one user's access token (the configured one by default)."""
 
     def __init__(
         self,
@@ -23,14 +57,56 @@ class CanvasService:
         base_url: str | None = None,
         access_token: str | None = None,
         timeout: float = 30.0,
+        tenant_id: str = "default",
+        max_connections: int | None = None,
     ):
         self.base_url = (base_url or settings.canvas_base_url).rstrip("/")
         self.access_token = access_token or settings.canvas_access_token
         self.timeout = timeout
+        self.tenant_id = tenant_id
+        self.max_connections = max(1, max_connections or settings.tenant_max_canvas_connections)
+        self._client: httpx.AsyncClient | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
 
     def _headers(self) -> dict[str, str]:
         return {"Authorization": f"Bearer {self.access_token}"}
 
+    def _http(self) -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        """The pooled client and call slots, rebuilt if used from a new event loop."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            )
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=limits)
+            self._slots = asyncio.Semaphore(self.max_connections)
+            self._loop = loop
+        return self._client, self._slots
+
+    async def get(self, endpoint: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Authenticated timed_get on the pooled client, within this user's connection cap."""
+        client, slots = self._http()
+        async with slots:
+            return await timed_get(client, endpoint, url, headers=self._headers(), **kwargs)
+
+    async def aclose(self) -> None:
+        """Close pooled connections; the next call opens a new pool."""
+        client, loop = self._client, self._loop
+        self._client = self._slots = self._loop = None
+        if client is not None and loop is asyncio.get_running_loop():
+            await client.aclose()
+
+    async def get_self(self) -> dict[str, Any]:
+        """The token's user (GET /api/v1/users/self); a cheap check that the token works."""
+        response = await self.get("users_self", f"{self.base_url}/api/v1/users/self")
+        if response.status_code == 401:
+            raise CanvasAPIError(401, "Canvas access token invalid or expired")
+        if response.status_code != 200:
+            raise CanvasAPIError(response.status_code, response.text)
+        return loads(response.content)
+
     async def list_courses(
         self,
         *,
@@ -39,6 +115,18 @@ class CanvasService:
         per_page: int | None = None,
     ) -> list[dict[str, Any]]:
         """Fetch courses for the authenticated user."""
+        return loads(
+            await self.list_courses_raw(enrollment_state=enrollment_state, include=include, per_page=per_page)
+        )
+
+    async def list_courses_raw(
+        self,
+        *,
+        enrollment_state: str | None = None,
+        include: list[str] | None = None,
+        per_page: int | None = None,
+    ) -> bytes:
+        """Like list_courses, but Canvas's JSON body as-is, for passthrough routes."""
         url = f"{self.base_url}/api/v1/courses"
         params: dict[str, Any] = {}
         if enrollment_state:
@@ -48,19 +136,14 @@ class CanvasService:
         if per_page is not None:
             params["per_page"] = per_page
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.get(
-                url,
-                headers=self._headers(),
-                params=params,
-            )
+        response = await self.get("courses", url, params=params)
 
         if response.status_code == 401:
             raise CanvasAPIError(401, "Canvas access token invalid or expired")
         if response.status_code != 200:
             raise CanvasAPIError(response.status_code, response.text)
 
-        return response.json()
+        return response.content
 
     async def list_course_files(
         self,
@@ -76,40 +159,39 @@ class CanvasService:
         params: dict[str, Any] = {"per_page": per_page}
         all_files: list[dict[str, Any]] = []
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            while url:
-                response = await client.get(url, headers=self._headers(), params=params)
-
-                if response.status_code == 401:
-                    raise CanvasAPIError(401, "Canvas access token invalid or expired.")
-                if response.status_code == 403:
-                    # Canvas often returns JSON with "message"; surface it for debugging
-                    try:
-                        body = response.json()
-                        msg = body.get("message", body.get("errors", response.text))
-                    except Exception:
-                        msg = response.text
-                    raise CanvasAPIError(
-                        403,
-                        f"Access denied to course files (course_id={course_id}). "
-                        f"Canvas says: {msg}. "
-                        "Often the token's user role (e.g. Student) lacks 'read_course_content'; "
-                        "try a token from a Teacher/Designer account or check institutional permissions.",
-                    )
-                if response.status_code == 404:
-                    raise CanvasAPIError(404, f"Course {course_id} not found.")
-                if response.status_code != 200:
-                    raise CanvasAPIError(response.status_code, response.text)
-
-                all_files.extend(response.json())
-
-                # Follow Canvas Link header pagination
-                url = None
-                params = {}
-                for part in response.headers.get("link", "").split(","):
-                    if 'rel="next"' in part:
-                        url = part.split(";")[0].strip().strip("<>")
-                        break
+        while url:
+            response = await self.get("course_files", url, params=params)
+
+            if response.status_code == 401:
+                raise CanvasAPIError(401, "Canvas access token invalid or expired.")
+            if response.status_code == 403:
+                # Canvas often returns JSON with "message"; surface it for debugging
+                try:
+                    body = response.json()
+                    msg = body.get("message", body.get("errors", response.text))
+                except Exception:
+                    msg = response.text
+                raise CanvasAPIError(
+                    403,
+                    f"Access denied to course files (course_id={course_id}). "
+                    f"Canvas says: {msg}. "
+                    "Often the token's user role (e.g. Student) lacks 'read_course_content'; "
+                    "try a token from a Teacher/Designer account or check institutional permissions.",
+                )
+            if response.status_code == 404:
+                raise CanvasAPIError(404, f"Course {course_id} not found.")
+            if response.status_code != 200:
+                raise CanvasAPIError(response.status_code, response.text)
+
+            all_files.extend(loads(response.content))
+
+            # Follow Canvas Link header pagination
+            url = None
+            params = {}
+            for part in response.headers.get("link", "").split(","):
+                if 'rel="next"' in part:
+                    url = part.split(";")[0].strip().strip("<>")
+                    break
 
         return all_files
     
@@ -128,11 +210,7 @@ class CanvasService:
         if download_url.startswith("/"):
             download_url = f"{self.base_url.rstrip('/')}{download_url}"
 
-        async with httpx.AsyncClient(
-            timeout=self.timeout,
-            follow_redirects=True,
-        ) as client:
-            response = await client.get(download_url, headers=self._headers())
+        response = await self.get("file_download", download_url, follow_redirects=True)
 
         if response.status_code == 401:
             raise CanvasAPIError(401, "Canvas access token invalid or expired.")
@@ -160,92 +238,86 @@ class CanvasService:
         Returns one dict per File module item: file_id, title, module_id, module_name, etc.
         """
         base = self.base_url
-        headers = self._headers()
         result: list[dict[str, Any]] = []
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            # Request items inline to avoid one request per module (much faster)
-            modules_url = f"{base}/api/v1/courses/{course_id}/modules"
-            params: dict[str, Any] = {"per_page": per_page, "include[]": "items"}
-            while modules_url:
-                mod_resp = await client.get(
-                    modules_url, headers=headers, params=params
+        # Request items inline to avoid one request per module (much faster)
+        modules_url = f"{base}/api/v1/courses/{course_id}/modules"
+        params: dict[str, Any] = {"per_page": per_page, "include[]": "items"}
+        while modules_url:
+            mod_resp = await self.get("modules", modules_url, params=params)
+            if mod_resp.status_code == 401:
+                raise CanvasAPIError(
+                    401, "Canvas access token invalid or expired"
                 )
-                if mod_resp.status_code == 401:
-                    raise CanvasAPIError(
-                        401, "Canvas access token invalid or expired"
-                    )
-                if mod_resp.status_code == 403:
-                    try:
-                        body = mod_resp.json()
-                        msg = body.get("message", body.get("errors", mod_resp.text))
-                    except Exception:
-                        msg = mod_resp.text
-                    raise CanvasAPIError(
-                        403,
-                        f"Access denied to course modules (course_id={course_id}). Canvas: {msg}",
-                    )
-                if mod_resp.status_code == 404:
-                    raise CanvasAPIError(404, f"Course {course_id} not found.")
-                if mod_resp.status_code != 200:
-                    raise CanvasAPIError(mod_resp.status_code, mod_resp.text)
-
-                modules = mod_resp.json()
-                for mod in modules:
-                    mod_id = mod.get("id")
-                    mod_name = mod.get("name", "")
-                    items = mod.get("items")
-                    if not items:
-                        # Canvas omitted items (e.g. too many); fetch this module's items
-                        items_url = f"{base}/api/v1/courses/{course_id}/modules/{mod_id}/items"
-                        item_params: dict[str, Any] = {"per_page": per_page}
-                        while items_url:
-                            item_resp = await client.get(
-                                items_url, headers=headers, params=item_params
-                            )
-                            if item_resp.status_code != 200:
+            if mod_resp.status_code == 403:
+                try:
+                    body = mod_resp.json()
+                    msg = body.get("message", body.get("errors", mod_resp.text))
+                except Exception:
+                    msg = mod_resp.text
+                raise CanvasAPIError(
+                    403,
+                    f"Access denied to course modules (course_id={course_id}). Canvas: {msg}",
+                )
+            if mod_resp.status_code == 404:
+                raise CanvasAPIError(404, f"Course {course_id} not found.")
+            if mod_resp.status_code != 200:
+                raise CanvasAPIError(mod_resp.status_code, mod_resp.text)
+
+            modules = loads(mod_resp.content)
+            for mod in modules:
+                mod_id = mod.get("id")
+                mod_name = mod.get("name", "")
+                items = mod.get("items")
+                if not items:
+                    # Canvas omitted items (e.g. too many); fetch this module's items
+                    items_url = f"{base}/api/v1/courses/{course_id}/modules/{mod_id}/items"
+                    item_params: dict[str, Any] = {"per_page": per_page}
+                    while items_url:
+                        item_resp = await self.get("module_items", items_url, params=item_params)
+                        if item_resp.status_code != 200:
+                            break
+                        items = loads(item_resp.content)
+                        for it in items:
+                            if it.get("type") != "File":
+                                continue
+                            result.append({
+                                "file_id": it.get("content_id"),
+                                "module_item_id": it.get("id"),
+                                "title": it.get("title", ""),
+                                "module_id": mod_id,
+                                "module_name": mod_name,
+                                "position": it.get("position"),
+                                "html_url": it.get("html_url", ""),
+                                "url": it.get("url", ""),
+                            })
+                        items_url = None
+                        item_params = {}
+                        for part in item_resp.headers.get("link", "").split(","):
+                            if 'rel="next"' in part:
+                                items_url = part.split(";")[0].strip().strip("<>")
                                 break
-                            items = item_resp.json()
-                            for it in items:
-                                if it.get("type") != "File":
-                                    continue
-                                result.append({
-                                    "file_id": it.get("content_id"),
-                                    "module_item_id": it.get("id"),
-                                    "title": it.get("title", ""),
-                                    "module_id": mod_id,
-                                    "module_name": mod_name,
-                                    "position": it.get("position"),
-                                    "html_url": it.get("html_url", ""),
-                                    "url": it.get("url", ""),
-                                })
-                            items_url = None
-                            item_params = {}
-                            for part in item_resp.headers.get("link", "").split(","):
-                                if 'rel="next"' in part:
-                                    items_url = part.split(";")[0].strip().strip("<>")
-                                    break
+                    continue
+                for it in items:
+                    if it.get("type") != "File":
                         continue
-                    for it in items:
-                        if it.get("type") != "File":
-                            continue
-                        result.append({
-                            "file_id": it.get("content_id"),
-                            "module_item_id": it.get("id"),
-                            "title": it.get("title", ""),
-                            "module_id": mod_id,
-                            "module_name": mod_name,
-                            "position": it.get("position"),
-                            "html_url": it.get("html_url", ""),
-                            "url": it.get("url", ""),
-                        })
-
-                modules_url = None
-                params = {}
-                for part in mod_resp.headers.get("link", "").split(","):
-                    if 'rel="next"' in part:
-                        modules_url = part.split(";")[0].strip().strip("<>")
-                        break
+                    result.append({
+                        "file_id": it.get("content_id"),
+                        "module_item_id": it.get("id"),
+                        "title": it.get("title", ""),
+                        "module_id": mod_id,
+                        "module_name": mod_name,
+                        "position": it.get("position"),
+                        "html_url": it.get("html_url", ""),
+                        "url": it.get("url", ""),
+                    })
+
+            modules_url = None
+            params = {}
+            for part in mod_resp.headers.get("link", "").split(","):
+                if 'rel="next"' in part:
+                    modules_url = part.split(";")[0].strip().strip("<>")
+                    break
 
         return result
 
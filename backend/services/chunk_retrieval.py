@@ -0,0 +1,120 @@
+"""
+Question context from chunks already indexed in Qdrant.
+
+Once a course has been ingested, a question prompt needs no Canvas download or
+parse on the request path: its context is a seed chunk plus that chunk's
+QUESTION_RETRIEVAL_NEIGHBORS nearest neighbours within the same course, i.e.
+a Qdrant retrieve for the seed and, concurrently, a course-filtered search
+for the points nearest to it, by id.
+
+The ingest manifest (services.ingest_manifest) says which files of a course
+are indexed and how many chunks each has, and point ids derive from (course,
+file, chunk index), so a seed is fetched by id without scanning the course.
+Seeds follow QUESTION_RETRIEVAL_SEED:
+
+- "lru": a random chunk of the course's least recently used file (its topic;
+  never-used files first, ties at random), so consecutive questions walk the
+  course instead of returning to one document;
+- "random": a uniformly random indexed chunk of the course.
+
+Neighbours may come from any file of the course, so a question stays on one
+topic even when the material is spread over slides, notes and readings.
+"""
+
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from typing import Any
+
+from config.settings import settings
+from services import qdrant_client
+from services.context_builder import estimate_tokens
+from services.ingest_manifest import ManifestEntry, manifest
+from services.parser import Section
+
+# Courses whose file usage is remembered for "lru" seeding
+_MAX_TRACKED_COURSES = 4096
+
+
+class TopicRotation:
+    """When each course's files last seeded a question; in memory, per process."""
+
+    def __init__(self, max_courses: int):
+        self.max_courses = max(1, max_courses)
+        self._used: OrderedDict[int, dict[int, float]] = OrderedDict()
+
+    def pick(self, course_id: int, files: list[ManifestEntry]) -> ManifestEntry:
+        """The least recently used of files (ties at random), marked as used now."""
+        used = self._used.get(course_id)
+        if used is None:
+            used = self._used[course_id] = {}
+            while len(self._used) > self.max_courses:
+                self._used.popitem(last=False)
+        else:
+            self._used.move_to_end(course_id)
+        if len(used) > len(files):
+            # Files dropped from the index since they were used
+            for file_id in used.keys() - {f.file_id for f in files}:
+                del used[file_id]
+        oldest = min(used.get(f.file_id, 0.0) for f in files)
+        entry = random.choice([f for f in files if used.get(f.file_id, 0.0) == oldest])
+        used[entry.file_id] = time.monotonic()
+        return entry
+
+
+topics = TopicRotation(_MAX_TRACKED_COURSES)
+
+
+def indexed_course_ids() -> set[int]:
+    """Courses with points in Qdrant, from the ingest manifest."""
+    return manifest.indexed_course_ids()
+
+
+def indexed_files(course_id: int) -> list[ManifestEntry]:
+    """Files of the course that have points in Qdrant, from the ingest manifest."""
+    return [entry for entry in manifest.load(course_id).values() if entry.point_count > 0]
+
+
+def pick_seed(course_id: int, files: list[ManifestEntry]) -> tuple[ManifestEntry, int]:
+    """(file, chunk index) of the next seed chunk among the course's indexed files."""
+    if settings.question_retrieval_seed == "random":
+        entry = random.choices(files, weights=[f.point_count for f in files])[0]
+    else:
+        entry = topics.pick(course_id, files)
+    return entry, random.randrange(entry.point_count)
+
+
+async def neighborhood(
+    course_id: int, file_id: int, chunk_index: int, neighbors: int, token_budget: int
+) -> list[Section]:
+    """
+    The seed chunk and its nearest neighbours in the course as Sections, most
+    similar first until token_budget is spent, then in document order (the
+    seed's file first). [] if the seed is not in the index.
+    """
+    seed, hits = await asyncio.gather(
+        qdrant_client.get_chunk(course_id, file_id, chunk_index),
+        qdrant_client.nearest_chunks(course_id, file_id, chunk_index, max(1, neighbors)),
+        return_exceptions=True,
+    )
+    if seed is None:
+        return []  # the search failed too, for want of the seed
+    for result in (seed, hits):
+        if isinstance(result, BaseException):
+            raise result
+    chosen = [seed]
+    remaining = token_budget - estimate_tokens(seed.get("chunk_text") or "")
+    for payload in hits:
+        cost = estimate_tokens(payload.get("chunk_text") or "")
+        if cost <= remaining:
+            chosen.append(payload)
+            remaining -= cost
+    chosen.sort(key=lambda p: (p.get("file_id") != file_id, p.get("file_id") or 0, p.get("chunk_index") or 0))
+    return [_to_section(p) for p in chosen if p.get("chunk_text")]
+
+
+def _to_section(payload: dict[str, Any]) -> Section:
+    location = payload.get("source_location") or ""
+    filename = payload.get("filename")
+    return Section(payload["chunk_text"], f"{filename}, {location}" if filename else location)
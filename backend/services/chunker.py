@@ -1,45 +1,59 @@
-"""Text chunker: splits parsed sections into fixed-size overlapping chunks."""
+"""
+Text chunker: splits parsed sections into fixed-size overlapping chunks.
+
+A file's chunks come back as one ChunkBatch of parallel columns instead of a
+dict per chunk: chunk i is (texts[i], locations[i]) and its chunk_index is i.
+Locations are the sections' own strings, shared rather than copied, and the
+batch is what the embed and upsert stages carry until qdrant_client turns it
+into points.
+"""
+
+from dataclasses import dataclass, field
+
+from services.metrics import CHUNKS_PER_FILE
+from services.parser import Section
+
+
+@dataclass(slots=True)
+class ChunkBatch:
+    texts: list[str] = field(default_factory=list)
+    locations: list[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.texts)
 
 
 def chunk_sections(
-    sections: list[dict],
+    sections: list[Section],
     chunk_size: int = 800,
     overlap: int = 150,
-) -> list[dict]:
+) -> ChunkBatch:
     """
-    Takes a list of {"text": str, "source_location": str} sections
-    and returns a flat list of chunks:
-      {"chunk_text": str, "source_location": str, "chunk_index": int}
+    Split sections into a ChunkBatch.
 
     Sections shorter than chunk_size are kept as-is.
     Longer sections are split with a sliding window.
     """
-    chunks = []
-    chunk_index = 0
+    batch = ChunkBatch()
+    texts, locations = batch.texts, batch.locations
+    step = chunk_size - overlap
 
     for section in sections:
-        text = section["text"]
-        source = section["source_location"]
+        text = section.text
+        source = section.source_location
 
         if len(text) <= chunk_size:
-            chunks.append({
-                "chunk_text": text,
-                "source_location": source,
-                "chunk_index": chunk_index,
-            })
-            chunk_index += 1
+            texts.append(text)
+            locations.append(source)
         else:
             start = 0
             while start < len(text):
                 end = min(start + chunk_size, len(text))
-                chunks.append({
-                    "chunk_text": text[start:end],
-                    "source_location": source,
-                    "chunk_index": chunk_index,
-                })
-                chunk_index += 1
+                texts.append(text[start:end])
+                locations.append(source)
                 if end == len(text):
                     break
-                start += chunk_size - overlap
+                start += step
 
-    return chunks
+    CHUNKS_PER_FILE.observe(len(batch))
+    return batch
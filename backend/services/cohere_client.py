@@ -1,31 +1,84 @@
-"""Cohere embedding client."""
+"""
+Cohere embedding client. The SDK is imported and the client built on first use.
+
+Vectors are cached by chunk text in the content-addressed cache shared by all
+users (services.content_cache), so text already embedded for any course, e.g.
+a file copied between courses, is not sent to Cohere again.
+
+Vectors are returned as a float32 matrix, a quarter of the size of the JSON
+floats Cohere sends (a list of 1024 Python floats is ~32 KiB; a float32 row is
+4 KiB); they stay in that form until qdrant_client sends them.
+"""
+
+import hashlib
+import time
+from typing import TYPE_CHECKING
 
-import cohere
 from config.settings import settings
+from services.content_cache import embeddings
+from services.metrics import COHERE_EMBED_BATCH_SIZE, COHERE_EMBED_SECONDS
+from services.tracing import span
+
+if TYPE_CHECKING:
+    import cohere
+    import numpy as np
 
 # embed-english-v3.0 produces 1024-dimensional float vectors
 EMBED_MODEL = "embed-english-v3.0"
 EMBED_DIMENSION = 1024
-_BATCH_SIZE = 96  # Cohere embed endpoint max texts per request
+EMBED_BATCH_SIZE = 96  # Cohere embed endpoint max texts per request
+
+_client: "cohere.AsyncClient | None" = None
 
-_client = cohere.AsyncClient(api_key=settings.cohere_api_key)
 
+def get_client() -> "cohere.AsyncClient":
+    global _client
+    if _client is None:
+        import cohere
 
-async def embed_texts(texts: list[str]) -> list[list[float]]:
+        _client = cohere.AsyncClient(api_key=settings.cohere_api_key)
+    return _client
+
+
+async def embed_texts(texts: list[str]) -> "np.ndarray":
     """
     Embed a list of texts using Cohere embed-english-v3.0.
-    Automatically batches into groups of 96.
-    Returns a list of 1024-dimensional float vectors.
+    Cached and repeated texts are not sent; the rest go in batches of 96.
+    Returns a (len(texts), 1024) float32 matrix, one row per text.
     """
-    all_embeddings: list[list[float]] = []
-
-    for i in range(0, len(texts), _BATCH_SIZE):
-        batch = texts[i : i + _BATCH_SIZE]
-        response = await _client.embed(
-            texts=batch,
-            model=EMBED_MODEL,
-            input_type="search_document",
-        )
-        all_embeddings.extend(response.embeddings)
-
-    return all_embeddings
+    import numpy as np
+
+    keys = [hashlib.sha256(text.encode()).digest() for text in texts]
+    found: dict[bytes, np.ndarray] = {}
+    missing: dict[bytes, str] = {}
+    for key, text in zip(keys, texts):
+        if key in found or key in missing:
+            continue
+        cached = embeddings.get(key)
+        if cached is not None:
+            found[key] = cached
+        else:
+            missing[key] = text
+
+    pending = list(missing.items())
+    for i in range(0, len(pending), EMBED_BATCH_SIZE):
+        batch = pending[i : i + EMBED_BATCH_SIZE]
+        start = time.perf_counter()
+        with span("cohere:embed", texts=len(batch)):
+            response = await get_client().embed(
+                texts=[text for _, text in batch],
+                model=EMBED_MODEL,
+                input_type="search_document",
+            )
+        COHERE_EMBED_SECONDS.observe(time.perf_counter() - start)
+        COHERE_EMBED_BATCH_SIZE.observe(len(batch))
+        vectors = np.asarray(response.embeddings, dtype=np.float32)
+        for (key, _), vector in zip(batch, vectors):
+            # A copy, so a cached row does not keep the whole batch alive
+            found[key] = row = vector.copy()
+            embeddings.put(key, row, row.nbytes + 112)
+
+    out = np.empty((len(keys), EMBED_DIMENSION), dtype=np.float32)
+    for i, key in enumerate(keys):
+        out[i] = found[key]
+    return out
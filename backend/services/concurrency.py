@@ -0,0 +1,96 @@
+"""
+Process-wide concurrency limits for ingestion and question generation.
+
+FairLimiter is a counting semaphore that hands free slots to waiting keys in
+round-robin order (higher priority first). Keys are tenants (Canvas users), so
+one user ingesting several large courses, or whose question pools are all
+refilling, cannot starve the others of downloads, embedding calls or OpenAI
+generations. release() is synchronous so cleanup paths can call it from
+cancelled tasks.
+"""
+
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Hashable
+
+from config.settings import settings
+
+
+class FairLimiter:
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.in_use = 0
+        # key -> (priority, waiters); OrderedDict order is the round-robin rotation
+        self._waiters: OrderedDict[Hashable, tuple[int, deque[asyncio.Future]]] = OrderedDict()
+
+    async def acquire(self, key: Hashable, priority: int = 0) -> None:
+        if self.in_use < self.capacity and not self._waiters:
+            self.in_use += 1
+            return
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        _, queue = self._waiters.setdefault(key, (priority, deque()))
+        queue.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just as we were cancelled; hand it on
+                self.release()
+            else:
+                queue.remove(future)
+                if not queue:
+                    self._waiters.pop(key, None)
+            raise
+
+    def release(self) -> None:
+        self.in_use -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self.in_use < self.capacity and self._waiters:
+            top = max(priority for priority, _ in self._waiters.values())
+            key = next(k for k, (priority, _) in self._waiters.items() if priority == top)
+            priority, queue = self._waiters.pop(key)
+            future = queue.popleft()
+            if queue:
+                # Re-queue at the back: next grant goes to a different key
+                self._waiters[key] = (priority, queue)
+            self.in_use += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable, priority: int = 0) -> AsyncIterator[None]:
+        await self.acquire(key, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "waiting": sum(len(queue) for _, queue in self._waiters.values()),
+        }
+
+
+class IngestLimits:
+    """Global caps shared by every running ingestion in this process."""
+
+    def __init__(self) -> None:
+        self.files = FairLimiter("files", settings.ingest_max_concurrent_files)
+        self.downloads = FairLimiter("downloads", settings.ingest_max_concurrent_downloads)
+        self.embed_batches = FairLimiter("embed_batches", settings.ingest_max_concurrent_embed_batches)
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        return {lim.name: lim.snapshot() for lim in (self.files, self.downloads, self.embed_batches)}
+
+
+ingest_limits = IngestLimits()
+
+
+# OpenAI question generations in flight, across the request path (priority 1)
+# and background pool refills (priority 0) of every tenant
+generation_slots = FairLimiter("generations", settings.question_generation_max_concurrent)
@@ -0,0 +1,61 @@
+"""
+Content-addressed caches shared by every tenant (Canvas user).
+
+Keys come from bytes, never from who asked: a file's SHA-256 for parsed
+sections, a chunk's text for its embedding. Students in the same course, or in
+copies of one course, reuse each other's parsing and Cohere calls without any
+of their Canvas data (listings, metadata, download URLs) being shared.
+
+- parsed_sections: "{content hash}:{file type}" -> sections from parse_file;
+- embeddings: SHA-256 of a chunk's text -> its vector, a float32 NumPy row.
+
+Both are in-memory LRUs bounded by approximate bytes (PARSE_CACHE_MAX_BYTES,
+EMBEDDING_CACHE_MAX_BYTES; 0 disables). Parsing runs in worker threads, so
+access is locked.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from config.settings import settings
+from services.metrics import record_cache
+
+
+class ContentCache:
+    def __init__(self, name: str, max_bytes: int):
+        self.name = name
+        self.max_bytes = max(0, max_bytes)
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        if not self.max_bytes:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        record_cache(self.name, entry is not None)
+        return entry[0] if entry is not None else None
+
+    def put(self, key: Hashable, value: Any, nbytes: int) -> None:
+        if not self.max_bytes or nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def stats(self) -> dict[str, Any]:
+        return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+parsed_sections = ContentCache("parse", settings.parse_cache_max_bytes)
+embeddings = ContentCache("embedding", settings.embedding_cache_max_bytes)
@@ -0,0 +1,155 @@
+"""
+Token-budgeted context selection for question prompts.
+
+Instead of sending a file's first N characters, pick a representative subset
+of its sections that fits QUESTION_CONTEXT_TOKEN_BUDGET:
+
+- every section is scored by TF-IDF term density (idf-weighted informative
+  terms per token), so boilerplate and title-only slides rank low;
+- sections are then chosen greedily by MMR (maximal marginal relevance):
+  relevance minus similarity to what is already chosen, so the picks spread
+  across the document instead of clustering on one topic;
+- relevance gets random jitter, so repeated prompts for the same file see
+  different (but still representative) subsets.
+
+Everything is plain NumPy on a sparse sections x terms matrix, and similarity
+is only computed against the sections actually chosen, so selecting from a
+100-page PDF takes milliseconds and memory linear in its length. Tokens are estimated at ~4 characters each.
+"""
+
+import re
+from collections import Counter
+from typing import TYPE_CHECKING
+
+from services.parser import Section
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Rough chars-per-token for English prose; good enough for budgeting
+CHARS_PER_TOKEN = 4
+# Weight of relevance vs. diversity in MMR (1.0 = relevance only)
+MMR_LAMBDA = 0.7
+# Relevance is multiplied by uniform(1 - JITTER, 1) so picks vary between calls
+JITTER = 0.5
+# Oversized sections are split into pieces of at most budget / this many tokens
+PIECES_PER_BUDGET = 4
+
+_TOKEN_RE = re.compile(r"[a-z][a-z0-9]+")
+_STOPWORDS = frozenset(
+    "the and for are but not you all any can had her was one our out has him his how its may new now "
+    "see two who did get let say she too use that with have this will your from they been were which "
+    "their there what when where than then them these those into more some such only also other each "
+    "very would could should about after before over under between through while because being".split()
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _split_oversized(sections: list[Section], max_chars: int) -> list[Section]:
+    pieces = []
+    for section in sections:
+        text = section.text.strip()
+        if not text:
+            continue
+        location = section.source_location
+        if len(text) <= max_chars:
+            pieces.append(section if text is section.text else Section(text, location))
+            continue
+        count = -(-len(text) // max_chars)
+        for i in range(count):
+            pieces.append(Section(
+                text[i * max_chars:(i + 1) * max_chars],
+                f"{location} (part {i + 1}/{count})",
+            ))
+    return pieces
+
+
+def _tfidf(texts: list[str]) -> "tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]":
+    """
+    Sparse L2-normalized TF-IDF rows as (row, term, weight) arrays sorted by
+    row, plus the term density of every text.
+    """
+    import numpy as np
+
+    vocab: dict[str, int] = {}
+    rows, cols, counts = [], [], []
+    lengths = np.empty(len(texts), dtype=np.float32)
+    for i, text in enumerate(texts):
+        lengths[i] = estimate_tokens(text)
+        for term, count in Counter(t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS).items():
+            rows.append(i)
+            cols.append(vocab.setdefault(term, len(vocab)))
+            counts.append(count)
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    df = np.bincount(cols, minlength=len(vocab)).astype(np.float32)
+    idf = np.log((1.0 + len(texts)) / (1.0 + df)) + 1.0
+    weighted = np.asarray(counts, dtype=np.float32) * idf[cols]
+    density = np.bincount(rows, weighted, minlength=len(texts)) / lengths
+    norms = np.sqrt(np.bincount(rows, weighted * weighted, minlength=len(texts)))
+    return rows, cols, weighted / np.maximum(norms[rows], 1e-12), density
+
+
+def build_context(
+    sections: list[Section],
+    token_budget: int,
+    rng: "np.random.Generator | None" = None,
+) -> tuple[str, list[str]]:
+    """
+    Prompt context from parsed Sections within
+    token_budget. Returns (context text in document order, source_location of
+    every section used).
+    """
+    import numpy as np
+
+    budget = max(1, token_budget)
+    pieces = _split_oversized(sections, max(200, budget * CHARS_PER_TOKEN // PIECES_PER_BUDGET))
+    if not pieces:
+        return "", []
+    costs = np.array([estimate_tokens(p.text) for p in pieces])
+    if costs.sum() <= budget:
+        chosen = list(range(len(pieces)))
+    else:
+        chosen = _select(pieces, costs, budget, rng or np.random.default_rng())
+    text = "\n\n".join(f"[{pieces[i].source_location}]\n{pieces[i].text}" for i in chosen)
+    return text, [pieces[i].source_location for i in chosen]
+
+
+def _select(pieces: list[Section], costs: "np.ndarray", budget: int, rng: "np.random.Generator") -> list[int]:
+    import numpy as np
+
+    rows, cols, weights, density = _tfidf([p.text for p in pieces])
+    relevance = density / max(float(density.max()), 1e-12)
+    relevance = relevance * rng.uniform(1.0 - JITTER, 1.0, size=len(pieces))
+    # Row and column slices of the sparse matrix; only chosen pieces get a similarity row
+    row_starts = np.searchsorted(rows, np.arange(len(pieces) + 1))
+    by_term = np.argsort(cols, kind="stable")
+    col_starts = np.searchsorted(cols[by_term], np.arange(int(cols.max(initial=-1)) + 2))
+
+    def similarity(i: int) -> "np.ndarray":
+        terms = cols[row_starts[i]:row_starts[i + 1]]
+        starts, ends = col_starts[terms], col_starts[terms + 1]
+        lengths = ends - starts
+        postings = by_term[np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)]
+        products = np.repeat(weights[row_starts[i]:row_starts[i + 1]], lengths) * weights[postings]
+        return np.bincount(rows[postings], products, minlength=len(pieces)).astype(np.float32)
+
+    # Highest similarity of each candidate to anything chosen so far
+    max_sim = np.zeros(len(pieces), dtype=np.float32)
+    available = costs <= budget
+    remaining = budget
+    chosen: list[int] = []
+    while available.any():
+        scores = MMR_LAMBDA * relevance - (1.0 - MMR_LAMBDA) * max_sim
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        chosen.append(best)
+        remaining -= int(costs[best])
+        available[best] = False
+        available &= costs <= remaining
+        if available.any():
+            np.maximum(max_sim, similarity(best), out=max_sim)
+    return sorted(chosen)
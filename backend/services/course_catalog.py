@@ -0,0 +1,274 @@
+"""
+In-memory catalog of one Canvas user's active courses and their supported
+files, refreshed in the background, so picking "a random course and a recent file" for
+/questions/from-file needs no Canvas calls.
+
+Selection is O(1): a course is chosen uniformly among those with files, then a
+file from that course's Walker alias table. File weights decay with age
+(half-life COURSE_CATALOG_RECENCY_HALF_LIFE_DAYS), so recent material is
+preferred while older files still come up.
+
+A refresh lists each course's modules plus, where the token may, its files
+(one paginated call each). Module files missing from the files listing (student
+tokens get 403 there) take a GET /files/:id, but only when first seen or once
+their metadata is older than _META_MAX_AGE_SECONDS.
+
+Each tenant (services.tenancy) has its own catalog, listed with its own token;
+course_catalog below is the configured CANVAS_ACCESS_TOKEN user's.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Sequence
+
+from config.settings import settings
+from services.canvas import CanvasAPIError, CanvasService, canvas_service
+from services.canvas_file_client import CanvasFileClientError, get_file_metadata
+from services.parser import is_supported
+
+logger = logging.getLogger(__name__)
+
+# Parallel GET /files/:id calls while refreshing one course
+_META_CONCURRENCY = 8
+# Module items do not say when a file changed: refetch its metadata this often
+_META_MAX_AGE_SECONDS = 3600
+# Floor so even very old files keep some chance of being picked
+_MIN_WEIGHT = 0.05
+
+
+class AliasTable:
+    """Walker's alias method: O(n) build, O(1) weighted sampling."""
+
+    __slots__ = ("items", "_prob", "_alias")
+
+    def __init__(self, items: Sequence[Any], weights: Sequence[float]):
+        n = len(items)
+        if n == 0:
+            raise ValueError("AliasTable needs at least one item")
+        total = float(sum(weights))
+        if total <= 0:
+            weights, total = [1.0] * n, float(n)
+        scaled = [w * n / total for w in weights]
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] += scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        self.items = list(items)
+        self._prob = prob
+        self._alias = alias
+
+    def sample(self) -> Any:
+        i = random.randrange(len(self.items))
+        return self.items[i] if random.random() < self._prob[i] else self.items[self._alias[i]]
+
+
+def _age_days(meta: dict[str, Any], now: float) -> float | None:
+    value = meta.get("updated_at") or meta.get("created_at")
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return max(0.0, (now - ts.timestamp()) / 86400)
+
+
+def recency_weight(meta: dict[str, Any], half_life_days: float, now: float | None = None) -> float:
+    age = _age_days(meta, time.time() if now is None else now)
+    if age is None:
+        return _MIN_WEIGHT
+    return max(_MIN_WEIGHT, 0.5 ** (age / max(half_life_days, 1e-6)))
+
+
+class CourseCatalog:
+    def __init__(self, canvas: CanvasService, refresh_seconds: int, half_life_days: float):
+        self.canvas = canvas
+        self.refresh_seconds = max(30, refresh_seconds)
+        self.half_life_days = half_life_days
+        self._courses: dict[int, dict[str, Any]] = {}
+        self._files: dict[int, list[dict[str, Any]]] = {}
+        self._tables: dict[int, AliasTable] = {}
+        self._course_ids: list[int] = []  # courses with at least one file
+        # Per course: file id -> (fetched at, metadata from GET /files/:id)
+        self._metas: dict[int, dict[int, tuple[float, dict[str, Any]]]] = {}
+        self._refreshed_at: float | None = None
+        self._task: asyncio.Task | None = None
+
+    # ── Lifecycle (called from the app lifespan) ──────────────────────────────
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # ── Lookups (no I/O) ──────────────────────────────────────────────────────
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._course_ids)
+
+    def courses(self) -> list[dict[str, Any]]:
+        return list(self._courses.values())
+
+    def course_ids(self) -> list[int]:
+        """Courses with at least one supported file."""
+        return list(self._course_ids)
+
+    def course(self, course_id: int) -> dict[str, Any] | None:
+        """The course (id, name) if it is one of this user's active courses."""
+        return self._courses.get(course_id)
+
+    def has_course(self, course_id: int) -> bool:
+        """True if course_id is one of this user's active courses, as last listed from Canvas."""
+        return course_id in self._courses
+
+    def files(self, course_id: int) -> list[dict[str, Any]]:
+        return list(self._files.get(course_id, ()))
+
+    def pick(self) -> tuple[dict[str, Any], dict[str, Any]] | None:
+        """(course, file metadata) for a random course and a recency-weighted file, or None if cold."""
+        if not self._course_ids:
+            return None
+        course_id = random.choice(self._course_ids)
+        return self._courses[course_id], self._tables[course_id].sample()
+
+    def pick_file(self, course_id: int) -> dict[str, Any] | None:
+        table = self._tables.get(course_id)
+        return table.sample() if table is not None else None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "courses": len(self._courses),
+            "courses_with_files": len(self._course_ids),
+            "files": sum(len(files) for files in self._files.values()),
+            "refreshed_at": self._refreshed_at,
+        }
+
+    # ── Refresh ───────────────────────────────────────────────────────────────
+
+    async def refresh(self) -> None:
+        courses = await self.canvas.list_courses(enrollment_state="active")
+        courses = [c for c in courses if c.get("id")]
+        results = await asyncio.gather(
+            *(self._list_files(c) for c in courses), return_exceptions=True
+        )
+        for course, files in zip(courses, results):
+            if isinstance(files, BaseException):
+                logger.warning("catalog refresh for course %s failed: %s", course["id"], files)
+                # Keep what we had for this course rather than dropping it
+                files = self._files.get(course["id"], [])
+            self.set_course_files(course, files)
+        active = {c["id"] for c in courses}
+        for course_id in list(self._courses):
+            if course_id not in active:
+                self._remove(course_id)
+        self._refreshed_at = time.time()
+
+    def set_course_files(self, course: dict[str, Any], files: list[dict[str, Any]]) -> None:
+        """Replace a course's files and rebuild its alias table."""
+        course_id = course["id"]
+        self._courses[course_id] = {"id": course_id, "name": course.get("name", "Course")}
+        self._files[course_id] = files
+        if files:
+            now = time.time()
+            self._tables[course_id] = AliasTable(
+                files, [recency_weight(f, self.half_life_days, now) for f in files]
+            )
+        else:
+            self._tables.pop(course_id, None)
+        self._course_ids = list(self._tables)
+
+    def _remove(self, course_id: int) -> None:
+        self._courses.pop(course_id, None)
+        self._files.pop(course_id, None)
+        self._tables.pop(course_id, None)
+        self._metas.pop(course_id, None)
+        self._course_ids = list(self._tables)
+
+    async def _list_files(self, course: dict[str, Any]) -> list[dict[str, Any]]:
+        """Supported files in modules (with metadata), falling back to the direct files listing."""
+        course_id = course["id"]
+        course_name = course.get("name", "Course")
+        module_files, listed = await asyncio.gather(
+            self.canvas.list_course_files_via_modules(course_id), self._list_course_files(course_id)
+        )
+        if module_files:
+            cached = self._metas.get(course_id, {})
+            fresh: dict[int, tuple[float, dict[str, Any]]] = {}
+            now = time.time()
+            sem = asyncio.Semaphore(_META_CONCURRENCY)
+
+            async def _fetch_meta(ref: dict) -> dict[str, Any] | None:
+                file_id = ref.get("file_id")
+                if not file_id:
+                    return None
+                meta = listed.get(file_id)
+                if meta is None:
+                    fetched_at, meta = cached.get(file_id, (0.0, None))
+                    if meta is None or now - fetched_at > _META_MAX_AGE_SECONDS:
+                        async with sem:
+                            try:
+                                meta = await get_file_metadata(file_id, self.canvas)
+                            except CanvasFileClientError:
+                                return None
+                        fetched_at = now
+                    fresh[file_id] = (fetched_at, meta)
+                meta["_module_title"] = ref.get("title", "")
+                return meta
+
+            refs: dict[int, dict] = {}
+            for ref in module_files:
+                refs.setdefault(ref.get("file_id"), ref)  # a file can sit in several modules
+            metas = [m for m in await asyncio.gather(*(_fetch_meta(r) for r in refs.values())) if m]
+            self._metas[course_id] = fresh  # files gone from the modules are forgotten
+        else:
+            metas = list(listed.values())
+        files = []
+        seen: set[int] = set()
+        for meta in metas:
+            if not is_supported(meta) or meta.get("id") in seen:
+                continue
+            seen.add(meta.get("id"))
+            meta["_course_id"] = course_id
+            meta["_course_name"] = course_name
+            files.append(meta)
+        return files
+
+    async def _list_course_files(self, course_id: int) -> dict[int, dict[str, Any]]:
+        """The course's files by id in one paginated listing; {} where the token may not (students)."""
+        try:
+            files = await self.canvas.list_course_files(course_id)
+        except CanvasAPIError:
+            return {}
+        return {f["id"]: f for f in files if f.get("id")}
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("course catalog refresh failed: %s", e)
+            await asyncio.sleep(self.refresh_seconds)
+
+
+course_catalog = CourseCatalog(
+    canvas_service,
+    settings.course_catalog_refresh_seconds,
+    settings.course_catalog_recency_half_life_days,
+)
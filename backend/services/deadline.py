@@ -0,0 +1,97 @@
+"""
+Per-request latency deadlines, propagated through a context variable.
+
+A Deadline has two instants:
+- respond_by: when the endpoint must answer, with a fallback if the real
+  work is not done yet;
+- give_up_by: when the work itself is abandoned. With background completion
+  this is later than respond_by, so the work can still finish and fill the
+  caches after the client already has its answer.
+
+Code on the request path (Canvas calls, parsing, the OpenAI call) calls
+check(stage) before each step and step_timeout() for network timeouts, so
+nothing outlives give_up_by. The stage reached is kept for logging. Tasks
+created inside deadline_scope() inherit the deadline (asyncio copies the
+context); code running without one is unaffected.
+"""
+
+import asyncio
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+import httpx
+
+# Never hand a network call less than this, or it fails before connecting
+_MIN_STEP_TIMEOUT = 0.05
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before this step could start."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        super().__init__(f"Deadline exceeded before {stage}")
+
+
+class Deadline:
+    def __init__(self, respond_in: float, background: float = 0.0):
+        now = time.monotonic()
+        self.respond_by = now + max(0.0, respond_in)
+        self.give_up_by = self.respond_by + max(0.0, background)
+        self.stage = "start"
+
+    def time_to_respond(self) -> float:
+        return max(0.0, self.respond_by - time.monotonic())
+
+    def remaining(self) -> float:
+        return max(0.0, self.give_up_by - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.give_up_by
+
+
+_current: ContextVar[Deadline | None] = ContextVar("deadline", default=None)
+
+
+def current() -> Deadline | None:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline) -> Iterator[Deadline]:
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def check(stage: str) -> None:
+    """Record that stage is starting; raise DeadlineExceeded if the budget is spent."""
+    deadline = _current.get()
+    if deadline is None:
+        return
+    deadline.stage = stage
+    if deadline.expired:
+        raise DeadlineExceeded(stage)
+
+
+def is_timeout(exc: BaseException | None) -> bool:
+    """True for a step given up on: the deadline, or a network call hitting its step_timeout()."""
+    if isinstance(exc, (DeadlineExceeded, asyncio.TimeoutError, httpx.TimeoutException)):
+        return True
+    openai = sys.modules.get("openai")  # only loaded once the SDK has been used
+    return openai is not None and isinstance(exc, openai.APITimeoutError)
+
+
+def step_timeout(default: float | None = None) -> float | None:
+    """Timeout for the next network call: default, capped by the current deadline."""
+    deadline = _current.get()
+    if deadline is None:
+        return default
+    remaining = max(_MIN_STEP_TIMEOUT, deadline.remaining())
+    return remaining if default is None else min(default, remaining)
@@ -0,0 +1,95 @@
+"""
+In-process event fan-out for push endpoints (Server-Sent Events).
+
+Publishers call broadcaster.publish(topic, event) synchronously; it never
+blocks. Each subscriber has its own bounded buffer: when a slow client falls
+behind, its oldest events are dropped and it is told how many it missed, so a
+stalled connection can never hold up the publisher (e.g. the ingest pipeline).
+
+Event ids (SSE cursors) start from the process start time in microseconds, so
+a restarted process numbers its events above anything clients kept from the
+one before it.
+"""
+
+import asyncio
+import itertools
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+# Per-subscriber buffer; beyond this the oldest events are dropped
+DEFAULT_BUFFER_SIZE = 256
+
+
+class Subscription:
+    def __init__(self, topics: tuple[str, ...], buffer_size: int):
+        self.topics = topics
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=max(1, buffer_size))
+        self.dropped = 0
+
+    def _offer(self, event: dict[str, Any]) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float | None = None) -> dict[str, Any] | None:
+        """Next event, a "lagged" notice if events were dropped, or None on timeout."""
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return {"type": "lagged", "dropped": dropped}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broadcaster:
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._subscribers: dict[str, set[Subscription]] = defaultdict(set)
+        self._ids = itertools.count(int(time.time() * 1_000_000))
+
+    def publish(self, topic: str, event: dict[str, Any]) -> int:
+        """Deliver event to every subscriber of topic; returns the event id."""
+        event_id = next(self._ids)
+        subscribers = self._subscribers.get(topic)
+        if subscribers:
+            event = {**event, "id": event_id}
+            for sub in subscribers:
+                sub._offer(event)
+        return event_id
+
+    def subscriber_count(self, topic: str) -> int:
+        return len(self._subscribers.get(topic, ()))
+
+    @contextmanager
+    def subscribe(self, *topics: str, buffer_size: int | None = None) -> Iterator[Subscription]:
+        """One subscription receiving the events of every given topic, in publish order."""
+        sub = Subscription(topics, buffer_size or self.buffer_size)
+        for topic in topics:
+            self._subscribers[topic].add(sub)
+        try:
+            yield sub
+        finally:
+            for topic in topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(sub)
+                    if not subscribers:
+                        del self._subscribers[topic]
+
+
+def format_sse(event: dict[str, Any]) -> str:
+    """Encode an event dict as one SSE message (event type taken from event["type"])."""
+    lines = []
+    if "id" in event:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event.get('type', 'message')}")
+    lines.append(f"data: {json.dumps(event, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,38 @@
+"""
+JSON encode/decode via orjson, with a stdlib fallback when it is not installed.
+
+FastJSONResponse is the app's default response class: handler results (after
+FastAPI's response-model serialization, for typed routes) are encoded by orjson.
+Routes that already hold JSON bytes (Canvas passthrough, pre-encoded bodies)
+return a Response directly and skip both steps.
+"""
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+
+def dumps(data: Any) -> bytes:
+    """Compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def loads(data: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content  # already-encoded JSON
+        return dumps(content)
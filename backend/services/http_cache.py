@@ -0,0 +1,114 @@
+"""
+Pre-encoded response bodies with strong ETags and compressed variants.
+
+For payloads that rarely change (the static question bank, snapshots of Canvas
+listings) encode once, gzip/brotli once, and let each request pick a variant
+by Accept-Encoding; a matching If-None-Match gets an empty 304. brotli is
+optional: without the package only gzip and identity are offered.
+"""
+
+import gzip
+import hashlib
+from dataclasses import dataclass
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 512
+# Above this, compress at a faster level: large listings are re-encoded every snapshot TTL
+LARGE_BODY_BYTES = 64 * 1024
+
+
+@dataclass(frozen=True, slots=True)
+class EncodedBody:
+    identity: bytes
+    etag: str  # quoted strong validator of the identity bytes
+    gzip: bytes | None = None
+    br: bytes | None = None
+
+    @classmethod
+    def build(cls, data: bytes) -> "EncodedBody":
+        etag = '"%s"' % hashlib.sha256(data).hexdigest()[:32]
+        if len(data) < MIN_COMPRESS_BYTES:
+            return cls(data, etag)
+        large = len(data) > LARGE_BODY_BYTES
+        gz = gzip.compress(data, compresslevel=6 if large else 9, mtime=0)
+        br = brotli.compress(data, quality=5 if large else 11) if brotli is not None else None
+        return cls(data, etag, gz if len(gz) < len(data) else None, br if br and len(br) < len(data) else None)
+
+    def variant(self, encoding: str | None) -> tuple[bytes, str]:
+        """(body, ETag) for a content coding; each coding gets its own strong ETag."""
+        if encoding == "br" and self.br is not None:
+            return self.br, self.etag[:-1] + '-br"'
+        if encoding == "gzip" and self.gzip is not None:
+            return self.gzip, self.etag[:-1] + '-gzip"'
+        return self.identity, self.etag
+
+    @property
+    def encodings(self) -> list[str]:
+        return [name for name, body in (("br", self.br), ("gzip", self.gzip)) if body is not None]
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    # ETags of compressed variants validate the same underlying bytes
+    for suffix in ('-br"', '-gzip"'):
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)] + '"'
+    return tag
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison as RFC 9110 prescribes for If-None-Match; '*' matches anything."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = _opaque(etag)
+    return any(_opaque(tag) == target for tag in if_none_match.split(","))
+
+
+def choose_encoding(accept_encoding: str | None, available: list[str]) -> str | None:
+    """Preferred of available (br before gzip) that the client accepts with q > 0."""
+    if not accept_encoding or not available:
+        return None
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in available:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def encoded_response(
+    request: Request,
+    body: EncodedBody,
+    media_type: str = "application/json",
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """200 with the best variant for the client, or 304 if its cached copy is current."""
+    encoding = choose_encoding(request.headers.get("accept-encoding"), body.encodings)
+    content, etag = body.variant(encoding)
+    out = {"ETag": etag, "Vary": "Accept-Encoding", **(headers or {})}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=out)
+    if encoding is not None:
+        out["Content-Encoding"] = encoding
+    return Response(content=content, media_type=media_type, headers=out)
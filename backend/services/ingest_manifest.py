@@ -0,0 +1,95 @@
+"""
+Per-course file manifest for incremental re-ingestion.
+
+For every file that has been indexed we remember what Canvas reported
+(updated_at, size), the SHA-256 of the downloaded bytes and how many Qdrant
+points the file produced. The next run compares against it and only
+re-processes new or changed files. Stored in SQLite (INGEST_DB_PATH) so it
+survives restarts.
+"""
+
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from config.settings import settings
+from services.sqlite_store import SQLiteStore
+
+# indexed_course_ids() is re-read after this long, to see other workers' ingestions
+_INDEXED_MAX_AGE_SECONDS = 60.0
+
+
+@dataclass
+class ManifestEntry:
+    file_id: int
+    updated_at: str
+    size: int
+    content_hash: str
+    point_count: int
+
+    def matches(self, meta: dict) -> bool:
+        """True if Canvas metadata says the file has not changed since it was indexed."""
+        return (
+            bool(self.updated_at)
+            and self.updated_at == (meta.get("updated_at") or "")
+            and self.size == int(meta.get("size") or 0)
+        )
+
+
+class IngestManifest(SQLiteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS file_manifest (
+        course_id    INTEGER NOT NULL,
+        file_id      INTEGER NOT NULL,
+        updated_at   TEXT    NOT NULL,
+        size         INTEGER NOT NULL,
+        content_hash TEXT    NOT NULL,
+        point_count  INTEGER NOT NULL,
+        PRIMARY KEY (course_id, file_id)
+    );
+    """
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._indexed: tuple[float, set[int]] | None = None  # (read at, course ids)
+
+    def load(self, course_id: int) -> dict[int, ManifestEntry]:
+        rows = self._conn().execute(
+            "SELECT file_id, updated_at, size, content_hash, point_count "
+            "FROM file_manifest WHERE course_id = ?",
+            (course_id,),
+        ).fetchall()
+        return {row["file_id"]: ManifestEntry(**dict(row)) for row in rows}
+
+    def indexed_course_ids(self) -> set[int]:
+        """Courses with at least one file that has points in Qdrant (cached; see forget_indexed)."""
+        now = time.monotonic()
+        if self._indexed is not None and now - self._indexed[0] < _INDEXED_MAX_AGE_SECONDS:
+            return self._indexed[1]
+        rows = self._conn().execute(
+            "SELECT DISTINCT course_id FROM file_manifest WHERE point_count > 0"
+        ).fetchall()
+        course_ids = {row["course_id"] for row in rows}
+        self._indexed = (now, course_ids)
+        return course_ids
+
+    def forget_indexed(self) -> None:
+        """Drop the cached indexed_course_ids(); called when an ingestion ends."""
+        self._indexed = None
+
+    def put(self, course_id: int, entry: ManifestEntry) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO file_manifest "
+            "(course_id, file_id, updated_at, size, content_hash, point_count) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (course_id, entry.file_id, entry.updated_at, entry.size, entry.content_hash, entry.point_count),
+        )
+
+    def remove(self, course_id: int, file_ids: list[int]) -> None:
+        self._conn().executemany(
+            "DELETE FROM file_manifest WHERE course_id = ? AND file_id = ?",
+            [(course_id, file_id) for file_id in file_ids],
+        )
+
+
+manifest = IngestManifest(settings.ingest_db_path)
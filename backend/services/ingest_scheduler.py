@@ -0,0 +1,362 @@
+"""
+Ingestion scheduler: runs course ingestions from a priority queue.
+
+At most INGEST_MAX_CONCURRENT_COURSES courses ingest at once; the rest wait
+in order of priority (higher first), then submission time. Running courses
+share the global file/download/embedding caps in services.concurrency, which
+grant slots round-robin across tenants. A tenant (Canvas user with its own
+token) runs at most TENANT_MAX_RUNNING_INGESTS courses at once; its further
+courses wait while other tenants' jobs go ahead. The configured user's jobs
+are only bound by the global cap. Jobs use the submitting tenant's Canvas token.
+Queued and running jobs can be cancelled.
+
+Every queued or running job holds a lease in services.job_store, renewed by a
+heartbeat while this process is alive. The lease is what makes the 409
+"already running" check hold across uvicorn workers, and an expired lease is
+how a job abandoned by a crashed or redeployed worker gets adopted and
+resumed from its checkpoints. Tokens are never persisted, so a resumed job
+runs with the configured CANVAS_ACCESS_TOKEN. A job whose worker died mid-run
+INGEST_MAX_ATTEMPTS times in a row (say a file that gets the process OOM
+killed) is marked failed instead of being resumed again.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from config.settings import settings
+from services.canvas import CanvasService, canvas_service
+from services.concurrency import ingest_limits
+from services.ingestion import get_status as get_ingestion_status
+from services.events import broadcaster
+from services.ingestion import ingest_course, ingest_topic
+from services.job_store import job_store
+
+logger = logging.getLogger(__name__)
+
+
+class IngestAlreadyActiveError(Exception):
+    """The course already has a queued or running ingestion."""
+
+
+@dataclass
+class IngestJob:
+    course_id: int
+    priority: int
+    seq: int
+    submitted_at: float
+    resume: bool = False
+    canvas: CanvasService = canvas_service
+    tenant_id: str = ""  # who asked for it; a resumed job keeps its original tenant
+    state: str = "queued"  # queued | running | done | cancelled
+    task: asyncio.Task | None = None
+
+
+class IngestScheduler:
+    def __init__(
+        self, max_running_courses: int, lease_ttl: float, max_running_per_tenant: int = 0, max_attempts: int = 3
+    ):
+        self.max_running_courses = max(1, max_running_courses)
+        self.max_running_per_tenant = max(0, max_running_per_tenant)
+        self.lease_ttl = max(1.0, lease_ttl)
+        self.max_attempts = max(1, max_attempts)
+        self._jobs: dict[int, IngestJob] = {}
+        self._queue: list[tuple[int, int, int]] = []  # (-priority, seq, course_id)
+        self._seq = itertools.count()
+        self._heartbeat: asyncio.Task | None = None
+        self._stopping = False
+
+    # ── Lifecycle (called from the app lifespan) ──────────────────────────────
+
+    def start(self) -> None:
+        """Start renewing leases and adopting orphaned jobs (including our own after a restart)."""
+        self._stopping = False
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self) -> None:
+        """Stop running jobs and hand everything back so another worker can resume it."""
+        self._stopping = True
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        running = [j.task for j in self._jobs.values() if j.state == "running" and j.task]
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        queued = [j for j in self._jobs.values() if j.state == "queued"]
+        for job in queued:
+            job.state = "done"
+        for job in queued:
+            await self._set_job_status(job.course_id, "interrupted")
+            await job_store.write(job_store.release_lease, job.course_id)
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    async def submit(
+        self,
+        course_id: int,
+        priority: int = 0,
+        resume: bool = False,
+        canvas: CanvasService | None = None,
+    ) -> IngestJob:
+        previous = self._jobs.get(course_id)
+        if previous is not None and previous.state in ("queued", "running"):
+            raise IngestAlreadyActiveError(f"Ingestion is already {previous.state} for course {course_id}.")
+        canvas = canvas or canvas_service
+        job = IngestJob(
+            course_id, priority, next(self._seq), time.time(), resume=resume, canvas=canvas, tenant_id=canvas.tenant_id
+        )
+        self._jobs[course_id] = job  # holds the course against a second submit while the lease is taken
+        acquired = False
+        try:
+            owner = await job_store.write(self._begin, course_id, priority, resume, job.tenant_id)
+            acquired = owner is not None
+        finally:
+            if not acquired and self._jobs.get(course_id) is job:
+                if previous is None:
+                    del self._jobs[course_id]
+                else:
+                    self._jobs[course_id] = previous
+        if not acquired:
+            raise IngestAlreadyActiveError(
+                f"Ingestion is already running for course {course_id} on another worker."
+            )
+        job.tenant_id = owner
+        if job.state != "queued":
+            return job  # cancelled while the lease was being taken
+        heapq.heappush(self._queue, (-priority, job.seq, course_id))
+        self._dispatch()
+        if job.state == "queued":
+            broadcaster.publish(
+                ingest_topic(course_id),
+                {
+                    "type": "state",
+                    "course_id": course_id,
+                    "status": "queued",
+                    "queue_position": self.queue_position(course_id),
+                },
+            )
+        return job
+
+    async def cancel(self, course_id: int) -> bool:
+        """Cancel a queued or running ingestion, here or on another worker."""
+        job = self._jobs.get(course_id)
+        if job is None or job.state not in ("queued", "running"):
+            return await job_store.write(job_store.request_cancel, course_id)
+        running = job.state == "running" and job.task is not None
+        job.state = "cancelled"
+        if running:
+            job.task.cancel()  # _run records the cancel and releases the lease
+            return True
+        broadcaster.publish(
+            ingest_topic(course_id),
+            {"type": "state", "course_id": course_id, "status": "cancelled", "final": True},
+        )
+        await job_store.write(self._end_cancelled, course_id)
+        return True
+
+    def owned_by(self, course_id: int, tenant_id: str) -> bool:
+        """
+        True if tenant_id may see or cancel the course's job: it submitted the
+        current or last job, or there is none. Jobs recorded before tenants
+        were tracked belong to the default tenant.
+        """
+        job = self._jobs.get(course_id)
+        if job is not None and job.state in ("queued", "running"):
+            owner = job.tenant_id
+        else:
+            status = get_ingestion_status(course_id)
+            if status.get("status") == "not_started":
+                return True
+            owner = status.get("tenant") or canvas_service.tenant_id
+        return owner == tenant_id
+
+    def is_local(self, course_id: int) -> bool:
+        """True if this process is queueing or running the course's job."""
+        job = self._jobs.get(course_id)
+        return job is not None and job.state in ("queued", "running")
+
+    def queue_position(self, course_id: int) -> int | None:
+        """1-based position among queued jobs, or None if the course is not queued."""
+        job = self._jobs.get(course_id)
+        if job is None or job.state != "queued":
+            return None
+        key = (-job.priority, job.seq)
+        return 1 + sum(
+            1
+            for prio, seq, cid in self._queue
+            if (prio, seq) < key and self._jobs[cid].state == "queued" and self._jobs[cid].seq == seq
+        )
+
+    def get_status(self, course_id: int) -> dict[str, Any]:
+        job = self._jobs.get(course_id)
+        if job is not None and job.state == "queued":
+            return {
+                "status": "queued",
+                "priority": job.priority,
+                "queue_position": self.queue_position(course_id),
+            }
+        return get_ingestion_status(course_id)
+
+    def snapshot(self) -> dict[str, Any]:
+        queued = sorted(
+            (j for j in self._jobs.values() if j.state == "queued"),
+            key=lambda j: (-j.priority, j.seq),
+        )
+        return {
+            "worker": job_store.owner,
+            "max_running_courses": self.max_running_courses,
+            "running": [j.course_id for j in self._jobs.values() if j.state == "running"],
+            "queued": [
+                {"course_id": j.course_id, "priority": j.priority, "queue_position": i}
+                for i, j in enumerate(queued, start=1)
+            ],
+            "limits": ingest_limits.snapshot(),
+        }
+
+    # ── Dispatch ──────────────────────────────────────────────────────────────
+
+    def has_active_jobs(self, tenant_id: str) -> bool:
+        """True while a queued or running job uses this tenant's Canvas client."""
+        return any(
+            j.state in ("queued", "running") and j.canvas.tenant_id == tenant_id for j in self._jobs.values()
+        )
+
+    def _active_course_ids(self) -> list[int]:
+        return [j.course_id for j in self._jobs.values() if j.state in ("queued", "running")]
+
+    def _running_count(self) -> int:
+        return sum(1 for j in self._jobs.values() if j.state == "running")
+
+    def _tenant_at_quota(self, canvas: CanvasService) -> bool:
+        if not self.max_running_per_tenant or canvas is canvas_service:
+            return False
+        running = sum(
+            1 for j in self._jobs.values() if j.state == "running" and j.canvas.tenant_id == canvas.tenant_id
+        )
+        return running >= self.max_running_per_tenant
+
+    def _dispatch(self) -> None:
+        deferred: list[tuple[int, int, int]] = []
+        while self._queue and self._running_count() < self.max_running_courses:
+            entry = heapq.heappop(self._queue)
+            _, seq, course_id = entry
+            job = self._jobs.get(course_id)
+            if job is None or job.seq != seq or job.state != "queued":
+                continue  # cancelled or superseded entry
+            if self._tenant_at_quota(job.canvas):
+                deferred.append(entry)  # stays queued until one of the tenant's jobs ends
+                continue
+            job.state = "running"
+            job.task = asyncio.create_task(self._run(job))
+        for entry in deferred:
+            heapq.heappush(self._queue, entry)
+
+    async def _run(self, job: IngestJob) -> None:
+        try:
+            try:
+                await ingest_course(job.course_id, priority=job.priority, resume=job.resume, canvas=job.canvas)
+            except asyncio.CancelledError:
+                # Shutdown leaves the job resumable; anything else was a user cancel
+                await self._set_job_status(job.course_id, "interrupted" if self._stopping else "cancelled")
+            finally:
+                await job_store.write(job_store.release_lease, job.course_id)
+        except Exception:
+            # The lease then lapses on its own; the queue must move on regardless
+            logger.exception("recording the end of the ingestion of course %s failed", job.course_id)
+        finally:
+            if job.state == "running":
+                job.state = "done"
+            if not self._stopping:
+                self._dispatch()
+
+    async def _set_job_status(self, course_id: int, state: str) -> None:
+        await job_store.write(self._write_job_status, course_id, state)
+
+    # ── Store updates (run on job_store's writer thread) ──────────────────────
+
+    def _begin(self, course_id: int, priority: int, resume: bool, tenant_id: str) -> str | None:
+        """
+        Take the course's lease and record the job as queued; returns the job's
+        tenant, or None if another worker holds the lease.
+        """
+        if not job_store.acquire_lease(course_id, self.lease_ttl):
+            return None
+        if resume:
+            status = job_store.load_status(course_id) or {}
+            if status.get("status") == "running":
+                # The last run died without handing the job back
+                status["attempts"] = status.get("attempts", 1) + 1
+        else:
+            status = {"attempts": 1}
+            job_store.clear_checkpoints(course_id)
+        # A resumed job runs with the default Canvas token but stays its tenant's
+        status.setdefault("tenant", tenant_id)
+        status.update({"status": "queued", "priority": priority})
+        job_store.save_status(course_id, status, priority=priority)
+        return status["tenant"]
+
+    def _end_cancelled(self, course_id: int) -> None:
+        self._write_job_status(course_id, "cancelled")
+        job_store.release_lease(course_id)
+
+    def _write_job_status(self, course_id: int, state: str) -> None:
+        status = job_store.load_status(course_id) or {}
+        status["status"] = state
+        job_store.save_status(course_id, status)
+
+    def _give_up(self, course_id: int, attempts: int) -> dict[str, Any] | None:
+        """Mark a job whose runs keep dying failed; None if another worker has it."""
+        if not job_store.acquire_lease(course_id, self.lease_ttl):
+            return None
+        status = job_store.load_status(course_id) or {}
+        status["status"] = "failed"
+        status["error"] = f"Gave up after {attempts} attempts that ended without finishing."
+        job_store.save_status(course_id, status)
+        job_store.release_lease(course_id)
+        return status
+
+    async def _adopt(self, course_id: int, priority: int) -> None:
+        """Resume an orphaned job, or fail it if its runs keep dying."""
+        status = job_store.load_status(course_id) or {}
+        attempts = status.get("attempts", 1)
+        if status.get("status") != "running" or attempts < self.max_attempts:
+            await self.submit(course_id, priority=priority, resume=True)
+            logger.info("Resuming interrupted ingestion for course %s", course_id)
+            return
+        status = await job_store.write(self._give_up, course_id, attempts)
+        if status is None:
+            return  # another worker got to it first
+        logger.warning("Not resuming ingestion for course %s: %s", course_id, status["error"])
+        broadcaster.publish(
+            ingest_topic(course_id),
+            {"type": "state", "course_id": course_id, "status": "failed", "final": True},
+        )
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            try:
+                await job_store.write(job_store.renew_leases, self._active_course_ids(), self.lease_ttl)
+                for course_id in job_store.cancel_requested(self._active_course_ids()):
+                    await self.cancel(course_id)
+                for course_id, priority in job_store.orphaned_jobs():
+                    try:
+                        await self._adopt(course_id, priority)
+                    except IngestAlreadyActiveError:
+                        pass
+            except Exception:
+                logger.exception("ingest scheduler heartbeat failed")
+            await asyncio.sleep(self.lease_ttl / 3)
+
+
+scheduler = IngestScheduler(
+    settings.ingest_max_concurrent_courses,
+    settings.ingest_lease_ttl_seconds,
+    settings.tenant_max_running_ingests,
+    settings.ingest_max_attempts,
+)
@@ -1,92 +1,531 @@
-"""Ingestion pipeline: Canvas files → parse → chunk → embed → Qdrant."""
+"""
+Ingestion pipeline: Canvas files → parse → chunk → embed → Qdrant.
 
-from services.canvas import canvas_service, CanvasAPIError
-from services.parser import is_supported, parse_file
-from services.chunker import chunk_sections
-from services.cohere_client import embed_texts
+Files flow through concurrent stages (download, parse + chunk, embed, upsert)
+joined by bounded queues; only files that are new or changed since the last run
+(services.ingest_manifest) are processed. Status and per-file checkpoints are
+kept in services.job_store so an interrupted run can resume, and progress is
+published on ingest_topic(course_id).
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from config.settings import settings
+from services.canvas import canvas_service, CanvasAPIError, CanvasService
+from services.canvas_file_client import get_file_metadata
+from services.parser import is_supported, parse_file_cached
+from services.chunker import ChunkBatch, chunk_sections
+from services.cohere_client import EMBED_BATCH_SIZE, EMBED_DIMENSION, embed_texts
+from services.concurrency import ingest_limits
+from services.events import broadcaster
+from services.ingest_manifest import ManifestEntry, manifest
+from services.job_store import job_store
 from services import qdrant_client
+from services.tracing import span, trace_scope
+
+if TYPE_CHECKING:
+    import numpy as np
 
-# In-memory status store (fine for a single-process hackathon server)
+# Live status of the jobs this process is running; flushed to job_store
 _status_store: dict[int, dict] = {}
 
+# Minimum seconds between status flushes to the job store while running
+_STATUS_FLUSH_INTERVAL = 1.0
+
+# Keep only the most recent per-file errors in the status payload
+_MAX_FILE_ERRORS = 50
+
+# End-of-stream marker passed down the queues
+_DONE = object()
+
 
 def get_status(course_id: int) -> dict:
-    return _status_store.get(course_id, {"status": "not_started"})
+    status = _status_store.get(course_id) or job_store.load_status(course_id)
+    return status or {"status": "not_started"}
+
+
+def ingest_topic(course_id: int) -> str:
+    return f"ingest:{course_id}"
+
+
+def _emit(course_id: int, event_type: str, **data: Any) -> None:
+    broadcaster.publish(ingest_topic(course_id), {"type": event_type, "course_id": course_id, **data})
+
+
+def _progress(status: dict) -> dict[str, Any]:
+    """Counters and per-stage throughput, without the (long) error list."""
+    return {k: v for k, v in status.items() if k != "file_errors"}
+
+
+def _count(status: dict, outcome: str) -> None:
+    """Bump the counters for a file's final outcome (added/updated/unchanged/skipped)."""
+    if outcome == "skipped":
+        status["files_skipped"] += 1
+        return
+    status[f"files_{outcome}"] += 1
+    if outcome in ("added", "updated"):
+        status["files_processed"] += 1
+
+
+class _ByteBudget:
+    """
+    Async counting budget for downloaded-but-unparsed bytes, granted FIFO.
+    acquire() blocks until enough of the budget is free; a single file larger
+    than the whole budget takes all of it instead of waiting forever.
+    release() is synchronous so cancelled pipelines can clean up.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._available = self.capacity
+        self._waiters: deque[tuple[int, asyncio.Future]] = deque()
+
+    async def acquire(self, nbytes: int) -> int:
+        nbytes = min(max(nbytes, 1), self.capacity)
+        if not self._waiters and self._available >= nbytes:
+            self._available -= nbytes
+            return nbytes
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        entry = (nbytes, future)
+        self._waiters.append(entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(nbytes)
+            else:
+                self._waiters.remove(entry)
+                self._wake()
+            raise
+        return nbytes
+
+    def release(self, nbytes: int) -> None:
+        self._available += nbytes
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._available >= self._waiters[0][0]:
+            nbytes, future = self._waiters.popleft()
+            self._available -= nbytes
+            future.set_result(None)
+
+
+_byte_budget: _ByteBudget | None = None
+
+
+def _get_byte_budget() -> _ByteBudget:
+    """Shared across all running ingestions so the budget is global."""
+    global _byte_budget
+    if _byte_budget is None:
+        _byte_budget = _ByteBudget(settings.ingest_max_buffered_bytes)
+    return _byte_budget
+
+
+@dataclass(eq=False)
+class _FileWork:
+    """One file moving through the pipeline; stages fill in their fields."""
+
+    file_id: int
+    title: str = ""
+    meta: dict[str, Any] = field(default_factory=dict)
+    buffer: Any = None
+    reserved_bytes: int = 0
+    holds_file_slot: bool = False
+    content_hash: str = ""
+    change: str = "added"  # "added" or "updated"
+    chunks: ChunkBatch = field(default_factory=ChunkBatch)
+    vectors: "np.ndarray | None" = None  # float32, one row per chunk
+
+    @property
+    def filename(self) -> str:
+        return self.meta.get("display_name") or self.meta.get("filename") or self.title
+
+
+@dataclass
+class _Stage:
+    name: str
+    workers: int
+    handler: Callable[[_FileWork], Awaitable[_FileWork | None]]
+    processed: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+
+    def snapshot(self, elapsed: float) -> dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "files_per_second": round(self.processed / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+
 
+class _CourseRun:
+    """Pipeline state and stage handlers for a single course ingestion."""
 
-async def ingest_course(course_id: int) -> None:
+    def __init__(
+        self,
+        course_id: int,
+        status: dict,
+        known: dict[int, ManifestEntry],
+        listed_meta: dict[int, dict],
+        priority: int = 0,
+        canvas: CanvasService = canvas_service,
+    ):
+        self.course_id = course_id
+        self.priority = priority
+        self.canvas = canvas
+        # Global slots are shared round-robin between tenants, not courses
+        self.fair_key = canvas.tenant_id
+        self.status = status
+        self.known = known
+        self.listed_meta = listed_meta
+        self.budget = _get_byte_budget()
+        self.last_flush = 0.0
+        self.inflight: set[_FileWork] = set()
+        self.started = time.monotonic()
+        self.stages = [
+            _Stage("download", settings.ingest_download_workers, self._download),
+            _Stage("parse", settings.ingest_parse_workers, self._parse),
+            _Stage("embed", settings.ingest_embed_workers, self._embed),
+            _Stage("upsert", settings.ingest_upsert_workers, self._upsert),
+        ]
+        for stage in self.stages:
+            stage.workers = max(1, stage.workers)
+
+    # ── Stage handlers: return the work item to pass on, or None to stop here ──
+
+    async def _download(self, work: _FileWork) -> _FileWork | None:
+        await ingest_limits.files.acquire(self.fair_key, self.priority)
+        work.holds_file_slot = True
+        self.inflight.add(work)
+        listed = self.listed_meta.get(work.file_id)
+        if listed:
+            work.meta = listed
+        else:
+            async with ingest_limits.downloads.slot(self.fair_key, self.priority):
+                work.meta = await get_file_metadata(work.file_id, self.canvas)
+        if not is_supported(work.meta):
+            await self._record(work, "skipped")
+            return None
+        previous = self.known.get(work.file_id)
+        if previous is not None and previous.matches(work.meta):
+            await self._record(work, "unchanged", previous.point_count)
+            return None
+        work.reserved_bytes = await self.budget.acquire(int(work.meta.get("size") or 0))
+        async with ingest_limits.downloads.slot(self.fair_key, self.priority):
+            work.buffer = await self.canvas.download_file(work.meta)
+        work.content_hash = await asyncio.to_thread(_sha256, work.buffer)
+        if previous is not None and previous.content_hash == work.content_hash:
+            # Touched in Canvas but the bytes are identical: refresh the manifest only
+            work.buffer = None
+            self._release_bytes(work)
+            await manifest.write(manifest.put, self.course_id, self._entry(work, previous.point_count))
+            await self._record(work, "unchanged", previous.point_count)
+            return None
+        work.change = "updated" if previous is not None else "added"
+        return work
+
+    async def _parse(self, work: _FileWork) -> _FileWork | None:
+        try:
+            # python-pptx / pypdf are CPU-bound; keep them off the event loop
+            sections = await asyncio.to_thread(parse_file_cached, work.buffer, work.meta, work.content_hash)
+            with span("chunk"):
+                work.chunks = chunk_sections(sections) if sections else ChunkBatch()
+        finally:
+            work.buffer = None
+            self._release_bytes(work)
+        if not work.chunks:
+            if work.change == "updated":
+                await qdrant_client.delete_file_points(self.course_id, [work.file_id])
+            await self._finish(work, 0)
+            return None
+        return work
+
+    async def _embed(self, work: _FileWork) -> _FileWork | None:
+        import numpy as np
+
+        texts = work.chunks.texts
+        work.vectors = np.empty((len(texts), EMBED_DIMENSION), dtype=np.float32)
+        for i in range(0, len(texts), EMBED_BATCH_SIZE):
+            async with ingest_limits.embed_batches.slot(self.fair_key, self.priority):
+                work.vectors[i : i + EMBED_BATCH_SIZE] = await embed_texts(texts[i : i + EMBED_BATCH_SIZE])
+        return work
+
+    async def _upsert(self, work: _FileWork) -> _FileWork | None:
+        if work.change == "updated":
+            # The new version may have fewer chunks; drop the old points first
+            await qdrant_client.delete_file_points(self.course_id, [work.file_id])
+        await qdrant_client.upsert_chunks(self.course_id, work.file_id, work.filename, work.chunks, work.vectors)
+        point_count = len(work.chunks)
+        self.status["chunks_indexed"] += point_count
+        await self._finish(work, point_count)
+        return None
+
+    # ── Plumbing ──────────────────────────────────────────────────────────────
+
+    def _entry(self, work: _FileWork, point_count: int) -> ManifestEntry:
+        return ManifestEntry(
+            file_id=work.file_id,
+            updated_at=work.meta.get("updated_at") or "",
+            size=int(work.meta.get("size") or 0),
+            content_hash=work.content_hash,
+            point_count=point_count,
+        )
+
+    async def _finish(self, work: _FileWork, point_count: int) -> None:
+        await manifest.write(manifest.put, self.course_id, self._entry(work, point_count))
+        await self._record(work, work.change, point_count)
+
+    async def _record(self, work: _FileWork, outcome: str, point_count: int = 0) -> None:
+        """Count the file's outcome and checkpoint it so a resumed run skips it."""
+        _count(self.status, outcome)
+        _emit(
+            self.course_id,
+            "file",
+            file_id=work.file_id,
+            filename=work.filename,
+            outcome=outcome,
+            chunks=point_count,
+        )
+        await job_store.write(job_store.checkpoint, self.course_id, work.file_id, outcome, point_count)
+
+    def _release_bytes(self, work: _FileWork) -> None:
+        if work.reserved_bytes:
+            self.budget.release(work.reserved_bytes)
+            work.reserved_bytes = 0
+
+    def _leave(self, work: _FileWork) -> None:
+        """The file is done with the pipeline (finished, skipped or failed)."""
+        self._release_bytes(work)
+        if work.holds_file_slot:
+            ingest_limits.files.release()
+            work.holds_file_slot = False
+        self.inflight.discard(work)
+
+    def _fail(self, stage: _Stage, work: _FileWork, exc: Exception) -> None:
+        stage.failed += 1
+        self.status["files_failed"] += 1
+        if isinstance(exc, CanvasAPIError):
+            message = f"Canvas error {exc.status_code}: {exc.body}"
+        else:
+            message = str(exc) or type(exc).__name__
+        error = {
+            "file_id": work.file_id,
+            "filename": work.filename,
+            "stage": stage.name,
+            "error": message,
+        }
+        errors = self.status["file_errors"]
+        errors.append(error)
+        del errors[:-_MAX_FILE_ERRORS]
+        _emit(self.course_id, "file_error", **error)
+
+    def _update_stats(self) -> None:
+        elapsed = time.monotonic() - self.started
+        self.status["elapsed_seconds"] = round(elapsed, 3)
+        self.status["stages"] = {s.name: s.snapshot(elapsed) for s in self.stages}
+
+    async def _publish_stats(self) -> None:
+        self._update_stats()
+        now = time.monotonic()
+        if now - self.last_flush >= _STATUS_FLUSH_INTERVAL:
+            self.last_flush = now
+            _emit(self.course_id, "progress", **_progress(self.status))
+            await job_store.flush_status(self.course_id, self.status)
+
+    async def _worker(self, stage: _Stage, inbox: asyncio.Queue, outbox: asyncio.Queue | None) -> None:
+        while True:
+            work = await inbox.get()
+            if work is _DONE:
+                return
+            t0 = time.monotonic()
+            try:
+                with span(f"ingest:{stage.name}", file_id=work.file_id):
+                    result = await stage.handler(work)
+            except Exception as e:
+                self._fail(stage, work, e)
+                result = None
+            else:
+                stage.processed += 1
+            stage.busy_seconds += time.monotonic() - t0
+            await self._publish_stats()
+            if result is None or outbox is None:
+                self._leave(work)
+            else:
+                await outbox.put(result)
+
+    async def _run_stage(self, index: int, inbox: asyncio.Queue, outbox: asyncio.Queue | None) -> None:
+        stage = self.stages[index]
+        await asyncio.gather(*(self._worker(stage, inbox, outbox) for _ in range(stage.workers)))
+        _emit(self.course_id, "stage_done", stage=stage.name, **stage.snapshot(time.monotonic() - self.started))
+        # Every worker of this stage has drained; tell the next stage to finish too
+        if outbox is not None:
+            for _ in range(self.stages[index + 1].workers):
+                await outbox.put(_DONE)
+
+    async def run(self, files: list[tuple[int, str]]) -> None:
+        # The feed holds only file ids, so it can be unbounded; the queues between
+        # stages are bounded so a fast stage cannot run far ahead of a slow one.
+        feed: asyncio.Queue = asyncio.Queue()
+        for file_id, title in files:
+            feed.put_nowait(_FileWork(file_id=file_id, title=title))
+        for _ in range(self.stages[0].workers):
+            feed.put_nowait(_DONE)
+        queues: list[asyncio.Queue] = [feed] + [
+            asyncio.Queue(maxsize=max(1, settings.ingest_queue_size))
+            for _ in self.stages[1:]
+        ]
+        tasks = [
+            asyncio.create_task(
+                self._run_stage(i, queues[i], queues[i + 1] if i + 1 < len(queues) else None)
+            )
+            for i in range(len(self.stages))
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # On cancellation, hand back budget and slots held by files mid-pipeline
+            for work in list(self.inflight):
+                self._leave(work)
+            self._update_stats()  # the caller saves the final status
+
+
+def _sha256(buffer) -> str:
+    return hashlib.sha256(buffer.getbuffer()).hexdigest()
+
+
+async def _list_file_metadata(course_id: int, canvas: CanvasService) -> dict[int, dict]:
     """
-    Full ingestion pipeline for one course.
-    Designed to run as a FastAPI BackgroundTask.
+    Full file objects (updated_at, size, url) in one paginated listing, so
+    unchanged files need no per-file metadata call. Student tokens usually get
+    403 here; the download stage then falls back to GET /files/:id per file.
     """
-    _status_store[course_id] = {
+    try:
+        files = await canvas.list_course_files(course_id)
+    except CanvasAPIError:
+        return {}
+    return {f["id"]: f for f in files if f.get("id")}
+
+
+def _set_phase(course_id: int, status: dict, phase: str) -> None:
+    status["phase"] = phase
+    _emit(course_id, "phase", phase=phase)
+
+
+async def ingest_course(
+    course_id: int,
+    priority: int = 0,
+    resume: bool = False,
+    canvas: CanvasService = canvas_service,
+) -> None:
+    """
+    Full ingestion pipeline for one course, with canvas's token.
+    Normally started by services.ingest_scheduler; priority only affects how
+    global download/embedding slots are shared with other running courses.
+    With resume=True, files checkpointed by the interrupted previous run are
+    not looked at again and their counts carry over.
+    A sampled run is traced (services.tracing) with one span per file per stage.
+    """
+    with trace_scope("ingest", course_id=course_id, resume=resume):
+        await _ingest_course(course_id, priority, resume, canvas)
+
+
+async def _ingest_course(course_id: int, priority: int, resume: bool, canvas: CanvasService) -> None:
+    status: dict[str, Any] = {
         "status": "running",
         "files_total": 0,
         "files_processed": 0,
         "files_skipped": 0,
+        "files_failed": 0,
+        "files_added": 0,
+        "files_updated": 0,
+        "files_unchanged": 0,
+        "files_removed": 0,
         "chunks_indexed": 0,
+        "file_errors": [],
+        "stages": {},
+        "elapsed_seconds": 0.0,
         "error": None,
+        "resumed_files": 0,
     }
+    previous = job_store.load_status(course_id) or {}
+    status["attempts"] = previous.get("attempts", 1)
+    status["tenant"] = previous.get("tenant", canvas.tenant_id)
+    if resume:
+        checkpoints = job_store.load_checkpoints(course_id)
+        for outcome, point_count in checkpoints.values():
+            _count(status, outcome)
+            if outcome in ("added", "updated"):
+                status["chunks_indexed"] += point_count
+        status["files_removed"] = previous.get("files_removed", 0)
+        status["resumed_files"] = len(checkpoints)
+    else:
+        checkpoints = {}
+        await job_store.write(job_store.clear_checkpoints, course_id)
+    _status_store[course_id] = status
+    await job_store.flush_status(course_id, status)
+    _emit(course_id, "state", status="running", resumed_files=status["resumed_files"])
 
     try:
         await qdrant_client.ensure_collection()
 
-        # 1. Fetch full file list from Canvas
-        raw_files = await canvas_service.list_course_files_via_modules(course_id)
-
-        # 2. Filter to supported types only (PPTX, DOCX, TXT)
-        supported_files = [f for f in raw_files if is_supported(f)]
-        skipped = len(raw_files) - len(supported_files)
-
-        _status_store[course_id]["files_total"] = len(supported_files)
-        _status_store[course_id]["files_skipped"] = skipped
-
-        for file_obj in supported_files:
-            file_id = file_obj["id"]
-            filename = file_obj.get("display_name", file_obj.get("filename", ""))
-
-            # 3. Download file into memory stream (no disk writes)
-            buffer = await canvas_service.download_file(file_obj)
-
-            # 4. Parse into sections
-            sections = parse_file(buffer, file_obj)
-            if not sections:
-                _status_store[course_id]["files_processed"] += 1
-                continue
-
-            # 5. Chunk sections
-            chunks = chunk_sections(sections)
-            if not chunks:
-                _status_store[course_id]["files_processed"] += 1
-                continue
-
-            # 6. Embed all chunks via Cohere
-            texts = [c["chunk_text"] for c in chunks]
-            vectors = await embed_texts(texts)
-
-            # 7. Build Qdrant point payloads and upsert
-            points = [
-                {
-                    "vector": vectors[i],
-                    "course_id": course_id,
-                    "file_id": file_id,
-                    "filename": filename,
-                    "chunk_index": chunks[i]["chunk_index"],
-                    "chunk_text": chunks[i]["chunk_text"],
-                    "source_location": chunks[i]["source_location"],
-                }
-                for i in range(len(chunks))
-            ]
-            await qdrant_client.upsert_chunks(points)
-
-            _status_store[course_id]["chunks_indexed"] += len(chunks)
-            _status_store[course_id]["files_processed"] += 1
-
-        _status_store[course_id]["status"] = "complete"
+        _set_phase(course_id, status, "listing")
+        # 1. List files that appear in modules (works with student tokens).
+        #    The same file can sit in several modules; ingest it once.
+        refs, listed_meta = await asyncio.gather(
+            canvas.list_course_files_via_modules(course_id),
+            _list_file_metadata(course_id, canvas),
+        )
+        seen: set[int] = set()
+        files: list[tuple[int, str]] = []
+        for ref in refs:
+            file_id = ref.get("file_id")
+            if file_id and file_id not in seen:
+                seen.add(file_id)
+                files.append((file_id, ref.get("title", "")))
+        status["files_total"] = len(files)
+        files = [f for f in files if f[0] not in checkpoints]
+
+        _set_phase(course_id, status, "pruning")
+        # 2. Drop points for files that are no longer in any module
+        known = manifest.load(course_id)
+        if not known and not checkpoints:
+            # Nothing recorded for this course: any points it has predate the
+            # manifest (random ids, so upserts would not replace them); start clean
+            await qdrant_client.delete_course_points(course_id)
+        removed = [file_id for file_id in known if file_id not in seen]
+        if removed:
+            await qdrant_client.delete_file_points(course_id, removed)
+            await manifest.write(manifest.remove, course_id, removed)
+        status["files_removed"] += len(removed)
+
+        # 3. Metadata + download → parse + chunk → embed → upsert, concurrently.
+        #    Unchanged files stop after the metadata check; unsupported types
+        #    (anything but PPTX, DOCX, TXT, PDF) are counted as skipped.
+        _set_phase(course_id, status, "processing")
+        await _CourseRun(course_id, status, known, listed_meta, priority, canvas).run(files)
+
+        status["status"] = "complete"
 
+    except asyncio.CancelledError:
+        status["status"] = "cancelled"
+        raise
     except CanvasAPIError as e:
-        _status_store[course_id]["status"] = "failed"
-        _status_store[course_id]["error"] = f"Canvas error {e.status_code}: {e.body}"
+        status["status"] = "failed"
+        status["error"] = f"Canvas error {e.status_code}: {e.body}"
     except Exception as e:
-        _status_store[course_id]["status"] = "failed"
-        _status_store[course_id]["error"] = str(e)
+        status["status"] = "failed"
+        status["error"] = str(e)
+    finally:
+        await job_store.flush_status(course_id, status)
+        manifest.forget_indexed()
+        _status_store.pop(course_id, None)
+        _emit(course_id, "state", final=True, **_progress(status))
@@ -0,0 +1,179 @@
+"""
+Durable ingestion job store (SQLite, same file as the manifest).
+
+Holds, per course:
+  - the latest job status payload (what GET /status returns),
+  - per-file checkpoints for the current job, so an interrupted run resumes
+    after the last completed file instead of starting over,
+  - a lease naming the process that owns the job. Leases expire unless the
+    owner renews them, which is how other uvicorn workers (or the same host
+    after a restart) detect an abandoned job and adopt it,
+  - a cancel flag, so a cancel request reaching any worker stops the job
+    wherever it runs.
+"""
+
+import json
+import os
+import socket
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+from config.settings import settings
+from services.sqlite_store import SQLiteStore
+
+# Job states that still need work; a job in one of these with no live lease is orphaned
+ACTIVE_STATES = ("queued", "running", "interrupted")
+
+
+class JobStore(SQLiteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS ingest_jobs (
+        course_id        INTEGER PRIMARY KEY,
+        status           TEXT    NOT NULL,
+        priority         INTEGER NOT NULL DEFAULT 0,
+        payload          TEXT    NOT NULL,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        updated_at       REAL    NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS ingest_leases (
+        course_id  INTEGER PRIMARY KEY,
+        owner      TEXT    NOT NULL,
+        expires_at REAL    NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+        course_id   INTEGER NOT NULL,
+        file_id     INTEGER NOT NULL,
+        outcome     TEXT    NOT NULL,
+        point_count INTEGER NOT NULL,
+        PRIMARY KEY (course_id, file_id)
+    );
+    """
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        # Unique per process, readable in the leases table when debugging
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    # ── Leases ────────────────────────────────────────────────────────────────
+
+    def acquire_lease(self, course_id: int, ttl: float) -> bool:
+        """Take the course's lease if it is free, expired, or already ours."""
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT INTO ingest_leases (course_id, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(course_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE ingest_leases.expires_at < ? OR ingest_leases.owner = excluded.owner",
+            (course_id, self.owner, now + ttl, now),
+        )
+        return cur.rowcount > 0
+
+    def renew_leases(self, course_ids: list[int], ttl: float) -> None:
+        expires_at = time.time() + ttl
+        self._conn().executemany(
+            "UPDATE ingest_leases SET expires_at = ? WHERE course_id = ? AND owner = ?",
+            [(expires_at, course_id, self.owner) for course_id in course_ids],
+        )
+
+    def release_lease(self, course_id: int) -> None:
+        self._conn().execute(
+            "DELETE FROM ingest_leases WHERE course_id = ? AND owner = ?",
+            (course_id, self.owner),
+        )
+
+    def lease_held_elsewhere(self, course_id: int) -> bool:
+        row = self._conn().execute(
+            "SELECT owner FROM ingest_leases WHERE course_id = ? AND expires_at >= ?",
+            (course_id, time.time()),
+        ).fetchone()
+        return row is not None and row["owner"] != self.owner
+
+    # ── Job status ────────────────────────────────────────────────────────────
+
+    def save_status(self, course_id: int, status: dict[str, Any], priority: int | None = None) -> None:
+        self._save_status(course_id, status.get("status", ""), json.dumps(status), priority)
+
+    async def flush_status(self, course_id: int, status: dict[str, Any]) -> None:
+        """save_status on the writer thread, for a running job's live status."""
+        # Serialized here: the job keeps updating status while the write waits
+        await self.write(self._save_status, course_id, status.get("status", ""), json.dumps(status), None)
+
+    def _save_status(self, course_id: int, state: str, payload: str, priority: int | None) -> None:
+        conn = self._conn()
+        now = time.time()
+        if priority is None:
+            cur = conn.execute(
+                "UPDATE ingest_jobs SET status = ?, payload = ?, updated_at = ? WHERE course_id = ?",
+                (state, payload, now, course_id),
+            )
+            if cur.rowcount:
+                return
+            priority = 0
+        conn.execute(
+            "INSERT INTO ingest_jobs (course_id, status, priority, payload, cancel_requested, updated_at) "
+            "VALUES (?, ?, ?, ?, 0, ?) "
+            "ON CONFLICT(course_id) DO UPDATE SET status = excluded.status, priority = excluded.priority, "
+            "payload = excluded.payload, cancel_requested = 0, updated_at = excluded.updated_at",
+            (course_id, state, priority, payload, now),
+        )
+
+    def load_status(self, course_id: int) -> dict[str, Any] | None:
+        row = self._conn().execute(
+            "SELECT payload FROM ingest_jobs WHERE course_id = ?", (course_id,)
+        ).fetchone()
+        return json.loads(row["payload"]) if row else None
+
+    def orphaned_jobs(self) -> list[tuple[int, int]]:
+        """(course_id, priority) of unfinished jobs whose lease is missing or expired."""
+        placeholders = ", ".join("?" for _ in ACTIVE_STATES)
+        rows = self._conn().execute(
+            f"SELECT j.course_id, j.priority FROM ingest_jobs j "
+            f"LEFT JOIN ingest_leases l ON l.course_id = j.course_id AND l.expires_at >= ? "
+            f"WHERE j.status IN ({placeholders}) AND j.cancel_requested = 0 AND l.course_id IS NULL "
+            f"ORDER BY j.priority DESC, j.updated_at",
+            (time.time(), *ACTIVE_STATES),
+        ).fetchall()
+        return [(row["course_id"], row["priority"]) for row in rows]
+
+    # ── Cancellation ──────────────────────────────────────────────────────────
+
+    def request_cancel(self, course_id: int) -> bool:
+        placeholders = ", ".join("?" for _ in ACTIVE_STATES)
+        cur = self._conn().execute(
+            f"UPDATE ingest_jobs SET cancel_requested = 1 WHERE course_id = ? AND status IN ({placeholders})",
+            (course_id, *ACTIVE_STATES),
+        )
+        return cur.rowcount > 0
+
+    def cancel_requested(self, course_ids: list[int]) -> list[int]:
+        if not course_ids:
+            return []
+        placeholders = ", ".join("?" for _ in course_ids)
+        rows = self._conn().execute(
+            f"SELECT course_id FROM ingest_jobs WHERE cancel_requested = 1 AND course_id IN ({placeholders})",
+            course_ids,
+        ).fetchall()
+        return [row["course_id"] for row in rows]
+
+    # ── Per-file checkpoints ──────────────────────────────────────────────────
+
+    def clear_checkpoints(self, course_id: int) -> None:
+        self._conn().execute("DELETE FROM ingest_checkpoints WHERE course_id = ?", (course_id,))
+
+    def checkpoint(self, course_id: int, file_id: int, outcome: str, point_count: int) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO ingest_checkpoints (course_id, file_id, outcome, point_count) "
+            "VALUES (?, ?, ?, ?)",
+            (course_id, file_id, outcome, point_count),
+        )
+
+    def load_checkpoints(self, course_id: int) -> dict[int, tuple[str, int]]:
+        rows = self._conn().execute(
+            "SELECT file_id, outcome, point_count FROM ingest_checkpoints WHERE course_id = ?",
+            (course_id,),
+        ).fetchall()
+        return {row["file_id"]: (row["outcome"], row["point_count"]) for row in rows}
+
+
+job_store = JobStore(settings.ingest_db_path)
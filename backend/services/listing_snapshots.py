@@ -0,0 +1,105 @@
+"""
+Short-lived server-side snapshots of Canvas-backed listings (courses, course
+files, files via modules), stored pre-encoded for services.http_cache.
+
+- younger than LISTING_SNAPSHOT_TTL_SECONDS: served as-is, no Canvas call;
+- within the following LISTING_STALE_WHILE_REVALIDATE_SECONDS: served as-is
+  while one background refresh replaces it;
+- older, or missing: fetched on the request path. Concurrent requests for the
+  same listing share one fetch.
+
+Because the body bytes are stable for unchanged data, so is the ETag, and a
+client revalidating with If-None-Match gets a 304.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Hashable
+
+from config.settings import settings
+from services.http_cache import EncodedBody
+from services.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Distinct listings kept (per route + query parameters)
+MAX_SNAPSHOTS = 512
+
+
+@dataclass(slots=True)
+class _Snapshot:
+    body: EncodedBody
+    fetched_at: float
+
+
+class ListingSnapshots:
+    def __init__(self, ttl_seconds: int, stale_seconds: int):
+        self.ttl_seconds = max(0, ttl_seconds)
+        self.stale_seconds = max(0, stale_seconds)
+        self._snapshots: OrderedDict[Hashable, _Snapshot] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    @property
+    def cache_control(self) -> str:
+        """Response header matching the server-side freshness (listings are per-user: private)."""
+        return f"private, max-age={self.ttl_seconds}, stale-while-revalidate={self.stale_seconds}"
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[bytes]]) -> EncodedBody:
+        """The listing for key: from the snapshot when fresh enough, else via loader (JSON bytes)."""
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None:
+            age = time.monotonic() - snapshot.fetched_at
+            if age < self.ttl_seconds:
+                record_cache("listing", True)
+                self._snapshots.move_to_end(key)
+                return snapshot.body
+            if age < self.ttl_seconds + self.stale_seconds:
+                record_cache("listing", True)
+                if key not in self._inflight:
+                    task = asyncio.ensure_future(self._fetch(key, loader))
+                    task.add_done_callback(_log_refresh_error)
+                return snapshot.body
+        record_cache("listing", False)
+        return await self._fetch(key, loader)
+
+    async def _fetch(self, key: Hashable, loader: Callable[[], Awaitable[bytes]]) -> EncodedBody:
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            body = EncodedBody.build(await loader())
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't log "never retrieved"
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(body)
+            self._store(key, body)
+            return body
+        finally:
+            del self._inflight[key]
+
+    def _store(self, key: Hashable, body: EncodedBody) -> None:
+        self._snapshots[key] = _Snapshot(body, time.monotonic())
+        self._snapshots.move_to_end(key)
+        while len(self._snapshots) > MAX_SNAPSHOTS:
+            self._snapshots.popitem(last=False)
+
+
+def _log_refresh_error(task: asyncio.Future) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("listing snapshot refresh failed: %s", task.exception())
+
+
+listing_snapshots = ListingSnapshots(
+    settings.listing_snapshot_ttl_seconds,
+    settings.listing_stale_while_revalidate_seconds,
+)
@@ -0,0 +1,320 @@
+"""
+Minimal Prometheus metrics: counters and histograms rendered in the text
+exposition format at GET /metrics.
+
+Kept dependency-free and cheap on the hot path: an observation is one dict
+lookup on the label tuple, a bisect into the bucket bounds and a few integer
+increments under an uncontended lock (parsing runs in worker threads).
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+# Seconds; covers a cache hit through a slow Canvas download or OpenAI call
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 96, 100, 250, 500, 1000, 2500)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_fmt(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts..., +Inf count, sum]
+        self._series: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_fmt(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ── Metric definitions ────────────────────────────────────────────────────────
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "doomscholar_http_request_duration_seconds",
+    "API request latency by route template and status code.",
+    ("method", "route", "status"),
+)
+CANVAS_REQUEST_SECONDS = registry.histogram(
+    "doomscholar_canvas_request_duration_seconds",
+    "Canvas API call latency by endpoint and status code (status=error on transport failure).",
+    ("endpoint", "status"),
+)
+COHERE_EMBED_SECONDS = registry.histogram(
+    "doomscholar_cohere_embed_batch_duration_seconds",
+    "Latency of one Cohere embed request.",
+)
+COHERE_EMBED_BATCH_SIZE = registry.histogram(
+    "doomscholar_cohere_embed_batch_size",
+    "Texts per Cohere embed request.",
+    buckets=SIZE_BUCKETS,
+)
+QDRANT_UPSERT_SECONDS = registry.histogram(
+    "doomscholar_qdrant_upsert_duration_seconds",
+    "Latency of one Qdrant upsert request.",
+)
+QDRANT_UPSERTED_POINTS = registry.counter(
+    "doomscholar_qdrant_upserted_points_total",
+    "Points written to Qdrant.",
+)
+QDRANT_QUERY_SECONDS = registry.histogram(
+    "doomscholar_qdrant_query_duration_seconds",
+    "Latency of one Qdrant read, by kind (retrieve or search).",
+    ("kind",),
+)
+OPENAI_GENERATION_SECONDS = registry.histogram(
+    "doomscholar_openai_generation_duration_seconds",
+    "Latency of one OpenAI chat completion.",
+    ("model",),
+)
+OPENAI_TOKENS = registry.counter(
+    "doomscholar_openai_tokens_total",
+    "OpenAI token usage by kind (prompt or completion).",
+    ("model", "kind"),
+)
+PARSE_SECONDS = registry.histogram(
+    "doomscholar_parse_duration_seconds",
+    "Time to parse one file into sections, by file type.",
+    ("file_type",),
+)
+CHUNKS_PER_FILE = registry.histogram(
+    "doomscholar_chunks_per_file",
+    "Chunks produced per chunk_sections call.",
+    buckets=SIZE_BUCKETS,
+)
+QUESTION_GENERATIONS = registry.counter(
+    "doomscholar_question_generations_total",
+    "Question sets generated, by context source: index (Qdrant chunks) or file (download and parse).",
+    ("source",),
+)
+PROMPT_CONTEXT_TOKENS = registry.histogram(
+    "doomscholar_prompt_context_tokens",
+    "Estimated tokens of course material sent per question prompt.",
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000),
+)
+CACHE_REQUESTS = registry.counter(
+    "doomscholar_cache_requests_total",
+    "Cache lookups by cache name and result (hit or miss).",
+    ("cache", "result"),
+)
+
+QUESTION_POOL_READY = registry.gauge(
+    "doomscholar_question_pool_ready",
+    "Pre-generated questions not yet served, per course.",
+    ("course_id",),
+)
+QUESTION_POOL_REFILL_SECONDS = registry.histogram(
+    "doomscholar_question_pool_refill_duration_seconds",
+    "Time to generate one question for the pool.",
+)
+QUESTION_POOL_SERVED = registry.counter(
+    "doomscholar_question_pool_served_total",
+    "Pool pops by result: ready (fresh), rotated (re-served oldest) or empty.",
+    ("result",),
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request. Labels use the matched
+    route template (e.g. /api/v1/courses/{course_id}/files), never the raw
+    path, so ids do not explode label cardinality. For streaming responses
+    the time covers the whole stream.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = "500"
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope.get("method", ""),
+                route=route_template(scope),
+                status=status,
+            )
+
+
+def route_template(scope: dict) -> str:
+    """
+    The matched route as a template: path segments holding a path parameter's
+    value are put back as {name}. Works whether or not the framework flattens
+    included routers into full paths.
+    """
+    if "route" not in scope and "endpoint" not in scope:
+        return "unmatched"
+    params = scope.get("path_params") or {}
+    if not params:
+        return scope.get("path", "")
+    by_value = {str(v): k for k, v in params.items()}
+    return "/".join(
+        "{%s}" % by_value[seg] if seg in by_value else seg
+        for seg in scope.get("path", "").split("/")
+    )
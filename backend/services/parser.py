@@ -1,9 +1,24 @@
-"""File parsers for supported document types (PPTX, DOCX, TXT, PDF)."""
+"""
+File parsers for supported document types (PPTX, DOCX, TXT, PDF).
+
+python-pptx, python-docx and pypdf are imported by their parser on first use,
+so processes that never parse a file don't pay for them at start-up.
+
+parse_file_cached() goes through the content-addressed cache shared by all
+users (services.content_cache): identical bytes are parsed once.
+
+Sections are small frozen slotted records rather than dicts: a large PDF yields
+thousands of them, and the same objects are shared by the parse cache, the
+chunker and question prompts.
+"""
 
 import io
-from pptx import Presentation
-from docx import Document
-from pypdf import PdfReader
+import time
+from dataclasses import dataclass
+
+from services.content_cache import parsed_sections
+from services.metrics import PARSE_SECONDS
+from services.tracing import span
 
 # Maps Canvas content-type values to a simple type label
 SUPPORTED_MIME_TYPES: dict[str, str] = {
@@ -18,6 +33,14 @@ SUPPORTED_MIME_TYPES: dict[str, str] = {
 SUPPORTED_EXTENSIONS: set[str] = {".pptx", ".ppt", ".docx", ".doc", ".txt", ".pdf"}
 
 
+@dataclass(frozen=True, slots=True)
+class Section:
+    """A run of text from a file and where it came from ("slide 3", "page 12")."""
+
+    text: str
+    source_location: str
+
+
 def is_supported(file_obj: dict) -> bool:
     """Return True if the file is a PPTX, DOCX, TXT, or PDF."""
     content_type = file_obj.get("content-type", "")
@@ -44,26 +67,45 @@ def _resolve_type(file_obj: dict) -> str | None:
     return None
 
 
-def parse_file(buffer: io.BytesIO, file_obj: dict) -> list[dict]:
+def parse_file(buffer: io.BytesIO, file_obj: dict) -> list[Section]:
     """
-    Parse a file buffer into a list of sections.
-    Each section: {"text": str, "source_location": str}
+    Parse a file buffer into a list of Sections.
     Returns [] for unsupported types.
     """
     file_type = _resolve_type(file_obj)
+    parser = _PARSERS.get(file_type)
+    if parser is None:
+        return []
+    start = time.perf_counter()
+    try:
+        with span("parse", file_type=file_type):
+            return parser(buffer)
+    finally:
+        PARSE_SECONDS.observe(time.perf_counter() - start, file_type=file_type)
+
+
+def _parse_key(content_hash: str, file_obj: dict) -> str:
+    return f"{content_hash}:{_resolve_type(file_obj)}"
 
-    if file_type == "pptx":
-        return _parse_pptx(buffer)
-    if file_type == "docx":
-        return _parse_docx(buffer)
-    if file_type == "txt":
-        return _parse_txt(buffer)
-    if file_type == "pdf":
-        return _parse_pdf(buffer)
-    return []
 
+def cached_sections(content_hash: str, file_obj: dict) -> list[Section] | None:
+    """Sections already parsed from a file with these bytes, if still cached."""
+    return parsed_sections.get(_parse_key(content_hash, file_obj))
+
+
+def parse_file_cached(buffer: io.BytesIO, file_obj: dict, content_hash: str) -> list[Section]:
+    """parse_file, reusing (and filling) the shared cache keyed by the bytes' SHA-256."""
+    key = _parse_key(content_hash, file_obj)
+    sections = parsed_sections.get(key)
+    if sections is None:
+        sections = parse_file(buffer, file_obj)
+        parsed_sections.put(key, sections, sum(len(s.text) + 64 for s in sections))
+    return sections
+
+
+def _parse_pptx(buffer: io.BytesIO) -> list[Section]:
+    from pptx import Presentation
 
-def _parse_pptx(buffer: io.BytesIO) -> list[dict]:
     prs = Presentation(buffer)
     sections = []
     for i, slide in enumerate(prs.slides, start=1):
@@ -75,41 +117,44 @@ def _parse_pptx(buffer: io.BytesIO) -> list[dict]:
                     if line:
                         lines.append(line)
         if lines:
-            sections.append({
-                "text": "\n".join(lines),
-                "source_location": f"slide {i}",
-            })
+            sections.append(Section("\n".join(lines), f"slide {i}"))
     return sections
 
 
-def _parse_docx(buffer: io.BytesIO) -> list[dict]:
+def _parse_docx(buffer: io.BytesIO) -> list[Section]:
+    from docx import Document
+
     doc = Document(buffer)
     sections = []
     for i, para in enumerate(doc.paragraphs, start=1):
         text = para.text.strip()
         if text:
-            sections.append({
-                "text": text,
-                "source_location": f"paragraph {i}",
-            })
+            sections.append(Section(text, f"paragraph {i}"))
     return sections
 
 
-def _parse_txt(buffer: io.BytesIO) -> list[dict]:
+def _parse_txt(buffer: io.BytesIO) -> list[Section]:
     text = buffer.read().decode("utf-8", errors="replace").strip()
     if not text:
         return []
-    return [{"text": text, "source_location": "full document"}]
+    return [Section(text, "full document")]
+
 
+def _parse_pdf(buffer: io.BytesIO) -> list[Section]:
+    from pypdf import PdfReader
 
-def _parse_pdf(buffer: io.BytesIO) -> list[dict]:
     reader = PdfReader(buffer)
     sections = []
     for i, page in enumerate(reader.pages, start=1):
         text = page.extract_text()
         if text and text.strip():
-            sections.append({
-                "text": text.strip(),
-                "source_location": f"page {i}",
-            })
+            sections.append(Section(text.strip(), f"page {i}"))
     return sections
+
+
+_PARSERS = {
+    "pptx": _parse_pptx,
+    "docx": _parse_docx,
+    "txt": _parse_txt,
+    "pdf": _parse_pdf,
+}
@@ -1,52 +1,196 @@
-"""Qdrant vector store client."""
+"""
+Qdrant vector store client. The SDK is imported and the client built on first use.
+
+Ingestion hands over a file's chunks as a columnar ChunkBatch plus a float32
+vector matrix. They are only turned into Qdrant's wire form (ids, payload
+dicts, vector lists) here, one upsert batch at a time, so at most
+_UPSERT_BATCH points exist as Python objects at once.
+"""
 
 import uuid
-from qdrant_client import AsyncQdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from typing import TYPE_CHECKING, Any, Iterator
 
 from config.settings import settings
 from services.cohere_client import EMBED_DIMENSION
+from services.metrics import QDRANT_QUERY_SECONDS, QDRANT_UPSERT_SECONDS, QDRANT_UPSERTED_POINTS
+from services.tracing import span
+
+if TYPE_CHECKING:
+    import numpy as np
+    from qdrant_client import AsyncQdrantClient
+    from qdrant_client.models import Batch
+
+    from services.chunker import ChunkBatch
+
+_client: "AsyncQdrantClient | None" = None
+
 
-_client = AsyncQdrantClient(
-    url=settings.qdrant_url,
-    api_key=settings.qdrant_api_key,
-)
+def get_client() -> "AsyncQdrantClient":
+    global _client
+    if _client is None:
+        from qdrant_client import AsyncQdrantClient
+
+        if settings.qdrant_url == ":memory:":
+            # Local in-process mode (tests, load harness); nothing is persisted
+            _client = AsyncQdrantClient(location=":memory:")
+        else:
+            _client = AsyncQdrantClient(
+                url=settings.qdrant_url,
+                api_key=settings.qdrant_api_key,
+            )
+    return _client
 
 _UPSERT_BATCH = 100  # points per upsert call
 
+_course_index_ready = False
+
+# Namespace for deterministic point ids, so re-indexing a file overwrites its points
+_POINT_NAMESPACE = uuid.UUID("6f1c5a0e-3d2b-4c5e-9a47-2b8f0d6e1c3a")
+
+
+def _point_id(course_id: int, file_id: int, chunk_index: int) -> str:
+    return str(uuid.uuid5(_POINT_NAMESPACE, f"{course_id}:{file_id}:{chunk_index}"))
+
+
+def build_batches(
+    course_id: int,
+    file_id: int,
+    filename: str,
+    chunks: "ChunkBatch",
+    vectors: "np.ndarray",
+) -> Iterator["Batch"]:
+    """Qdrant Batches of at most _UPSERT_BATCH points for one file's chunks; row i of vectors is chunk i's."""
+    from qdrant_client.models import Batch
+
+    for start in range(0, len(chunks), _UPSERT_BATCH):
+        stop = min(start + _UPSERT_BATCH, len(chunks))
+        yield Batch(
+            ids=[_point_id(course_id, file_id, i) for i in range(start, stop)],
+            vectors=vectors[start:stop].tolist(),
+            payloads=[
+                {
+                    "course_id": course_id,
+                    "file_id": file_id,
+                    "filename": filename,
+                    "chunk_index": i,
+                    "chunk_text": chunks.texts[i],
+                    "source_location": chunks.locations[i],
+                }
+                for i in range(start, stop)
+            ],
+        )
+
 
 async def ensure_collection() -> None:
-    """Create the Qdrant collection if it does not already exist."""
-    exists = await _client.collection_exists(settings.qdrant_collection_name)
+    """
+    Create the Qdrant collection if it does not already exist, and (once per
+    process) the course_id payload index that course-filtered searches use.
+    """
+    global _course_index_ready
+    from qdrant_client.models import Distance, PayloadSchemaType, VectorParams
+
+    client = get_client()
+    exists = await client.collection_exists(settings.qdrant_collection_name)
     if not exists:
-        await _client.create_collection(
+        await client.create_collection(
             collection_name=settings.qdrant_collection_name,
             vectors_config=VectorParams(
                 size=EMBED_DIMENSION,
                 distance=Distance.COSINE,
             ),
         )
+    # Local mode has no payload indexes (and warns about them)
+    if not _course_index_ready and settings.qdrant_url != ":memory:":
+        await client.create_payload_index(
+            collection_name=settings.qdrant_collection_name,
+            field_name="course_id",
+            field_schema=PayloadSchemaType.INTEGER,
+        )
+    _course_index_ready = True
 
 
-async def upsert_chunks(points_data: list[dict]) -> None:
+async def upsert_chunks(
+    course_id: int,
+    file_id: int,
+    filename: str,
+    chunks: "ChunkBatch",
+    vectors: "np.ndarray",
+) -> None:
     """
-    Upsert a list of chunk dicts into Qdrant.
-    Each dict must have a 'vector' key (list[float]) plus any
-    payload fields (course_id, file_id, chunk_text, etc.).
+    Upsert one file's chunks into Qdrant, row i of vectors being chunk i's.
+    Point ids are derived from course_id/file_id/chunk_index, so re-indexing
+    a file overwrites its points.
     """
-    points = [
-        PointStruct(
-            id=str(uuid.uuid4()),
-            vector=p["vector"],
-            payload={k: v for k, v in p.items() if k != "vector"},
+    client = get_client()
+    # Upsert in batches to avoid request size limits
+    for batch in build_batches(course_id, file_id, filename, chunks, vectors):
+        with QDRANT_UPSERT_SECONDS.time(), span("qdrant:upsert", points=len(batch.ids)):
+            await client.upsert(
+                collection_name=settings.qdrant_collection_name,
+                points=batch,
+                wait=True,
+            )
+        QDRANT_UPSERTED_POINTS.inc(len(batch.ids))
+
+
+async def get_chunk(course_id: int, file_id: int, chunk_index: int) -> dict[str, Any] | None:
+    """Payload of one indexed chunk, looked up by its derived id; None if absent."""
+    with QDRANT_QUERY_SECONDS.time(kind="retrieve"), span("qdrant:retrieve"):
+        points = await get_client().retrieve(
+            collection_name=settings.qdrant_collection_name,
+            ids=[_point_id(course_id, file_id, chunk_index)],
+            with_payload=True,
         )
-        for p in points_data
-    ]
+    return (points[0].payload or {}) if points else None
 
-    # Upsert in batches to avoid request size limits
-    for i in range(0, len(points), _UPSERT_BATCH):
-        await _client.upsert(
+
+async def nearest_chunks(course_id: int, file_id: int, chunk_index: int, limit: int) -> list[dict[str, Any]]:
+    """
+    Payloads of the course's chunks nearest to the given one (itself excluded),
+    closest first. Qdrant looks the chunk's vector up by id, so it never leaves
+    the server. Raises if that chunk is not indexed.
+    """
+    from qdrant_client.models import FieldCondition, Filter, MatchValue
+
+    with QDRANT_QUERY_SECONDS.time(kind="search"), span("qdrant:search", limit=limit):
+        response = await get_client().query_points(
             collection_name=settings.qdrant_collection_name,
-            points=points[i : i + _UPSERT_BATCH],
-            wait=True,
+            query=_point_id(course_id, file_id, chunk_index),
+            query_filter=Filter(must=[FieldCondition(key="course_id", match=MatchValue(value=course_id))]),
+            limit=limit,
+            with_payload=True,
         )
+    return [point.payload or {} for point in response.points]
+
+
+async def delete_course_points(course_id: int) -> None:
+    """Delete every point indexed for a course."""
+    from qdrant_client.models import FieldCondition, Filter, FilterSelector, MatchValue
+
+    await get_client().delete(
+        collection_name=settings.qdrant_collection_name,
+        points_selector=FilterSelector(
+            filter=Filter(must=[FieldCondition(key="course_id", match=MatchValue(value=course_id))])
+        ),
+        wait=True,
+    )
+
+
+async def delete_file_points(course_id: int, file_ids: list[int]) -> None:
+    """Delete every point indexed for the given files of a course."""
+    if not file_ids:
+        return
+    from qdrant_client.models import FieldCondition, Filter, FilterSelector, MatchAny, MatchValue
+
+    await get_client().delete(
+        collection_name=settings.qdrant_collection_name,
+        points_selector=FilterSelector(
+            filter=Filter(
+                must=[
+                    FieldCondition(key="course_id", match=MatchValue(value=course_id)),
+                    FieldCondition(key="file_id", match=MatchAny(any=list(file_ids))),
+                ]
+            )
+        ),
+        wait=True,
+    )
@@ -0,0 +1,255 @@
+"""
+Bounded, persistent cache of generated question sets.
+
+Two tiers:
+- memory: an LRU bounded by QUESTION_CACHE_MAX_ENTRIES and
+  QUESTION_CACHE_MAX_BYTES (JSON size of the stored questions), with a TTL.
+  Expired entries are dropped on read and by a periodic sweeper.
+- disk: every write goes through to SQLite (QUESTION_CACHE_DB_PATH), so a
+  restarted process or a second uvicorn worker starts warm instead of paying
+  for OpenAI calls again. Writes run on the store's writer thread; requests
+  never wait for them.
+
+A set is stored whole, once; which of its questions have been served is a
+counter in SQLite that take() advances atomically, so however many workers
+hold the set in memory, each question is served once.
+
+Keys are built from the SHA-256 of the file bytes plus the model and prompt
+version (see cache_key), so an edited file gets new questions and a prompt
+change never serves questions written for the old prompt. To find the content
+hash without downloading, the cache also remembers each file's hash together
+with the Canvas (updated_at, size) it was computed for.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from config.settings import settings
+from services.metrics import record_cache
+from services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(content_hash: str, model: str, prompt_version: str) -> str:
+    return f"{content_hash}:{model}:{prompt_version}"
+
+
+def _fingerprint(meta: dict[str, Any]) -> str | None:
+    updated_at = meta.get("updated_at") or ""
+    if not updated_at:
+        return None
+    return f"{updated_at}:{int(meta.get('size') or 0)}"
+
+
+@dataclass
+class _Entry:
+    expires_at: float
+    questions: list[dict[str, Any]]
+    nbytes: int
+
+
+class QuestionCache(SQLiteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS question_queues (
+        key        TEXT PRIMARY KEY,
+        questions  TEXT NOT NULL,
+        size       INTEGER NOT NULL,
+        next_index INTEGER NOT NULL DEFAULT 0,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS question_queues_expiry ON question_queues (expires_at);
+    CREATE TABLE IF NOT EXISTS file_hashes (
+        file_id      TEXT PRIMARY KEY,
+        fingerprint  TEXT NOT NULL,
+        content_hash TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, path, max_entries: int, max_bytes: int, ttl_seconds: int, sweep_seconds: int):
+        super().__init__(path)
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.ttl_seconds = max(1, ttl_seconds)
+        self.sweep_seconds = max(1, sweep_seconds)
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._evictions = 0
+        self._sweeper: asyncio.Task | None = None
+
+    # ── Lifecycle (called from the app lifespan) ──────────────────────────────
+
+    def start(self) -> None:
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        await asyncio.to_thread(self.flush)
+
+    # ── Question sets ─────────────────────────────────────────────────────────
+
+    async def take(self, key: str, record: bool = True) -> dict[str, Any] | None:
+        """
+        Claim and return the next question stored under key not yet served by
+        any worker, if any. record=False keeps speculative lookups out of the
+        hit/miss metrics.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and time.time() > entry.expires_at:
+            self._drop(key)
+            entry = None
+        if entry is None:
+            entry = self._load(key)
+        claimed = await self.write(self._claim, key) if entry is not None else None
+        if record:
+            record_cache("question", claimed is not None)
+        # put() may have replaced the set meanwhile; the new one is left alone
+        current = self._entries.get(key) is entry
+        if claimed is None:
+            if current:
+                self._drop(key)  # drained, possibly by another worker
+            return None
+        question, last = claimed
+        if current:
+            if last:
+                self._drop(key)
+            else:
+                self._entries.move_to_end(key)
+        return question
+
+    def put(self, key: str, questions: list[dict[str, Any]]) -> None:
+        if not questions:
+            return
+        self._drop(key)
+        self._store(key, _Entry(time.time() + self.ttl_seconds, list(questions), 0))
+
+    def _store(self, key: str, entry: _Entry) -> None:
+        """Insert entry in memory, write it through to disk and evict down to the bounds."""
+        payload = json.dumps(entry.questions, separators=(",", ":"))
+        entry.nbytes = len(payload)
+        self._entries[key] = entry
+        self._bytes += entry.nbytes
+        self.write_later(self._save_set, key, payload, len(entry.questions), entry.expires_at)
+        # Evicted sets stay on disk until they expire and are reloaded on demand
+        while len(self._entries) > self.max_entries or (self._bytes > self.max_bytes and len(self._entries) > 1):
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self._evictions += 1
+
+    def _save_set(self, key: str, payload: str, size: int, expires_at: float) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO question_queues (key, questions, size, next_index, expires_at) "
+            "VALUES (?, ?, ?, 0, ?)",
+            (key, payload, size, expires_at),
+        )
+
+    def _claim(self, key: str) -> tuple[dict[str, Any], bool] | None:
+        """(question, whether it was the last) of the set's next unserved question, taken atomically."""
+        conn = self._conn()
+        rows = conn.execute(
+            "UPDATE question_queues SET next_index = next_index + 1 "
+            "WHERE key = ? AND next_index < size AND expires_at >= ? "
+            "RETURNING json_extract(questions, '$[' || (next_index - 1) || ']') AS claimed, "
+            "next_index >= size AS last",
+            (key, time.time()),
+        ).fetchall()
+        if not rows:
+            return None
+        if rows[0]["last"]:
+            conn.execute("DELETE FROM question_queues WHERE key = ? AND next_index >= size", (key,))
+        # The row's own copy, not the caller's: put() may replace the set while this runs
+        return json.loads(rows[0]["claimed"]), bool(rows[0]["last"])
+
+    def _load(self, key: str) -> _Entry | None:
+        row = self._conn().execute(
+            "SELECT questions, expires_at FROM question_queues WHERE key = ? AND next_index < size", (key,)
+        ).fetchone()
+        if row is None or time.time() > row["expires_at"]:
+            return None
+        questions = json.loads(row["questions"])
+        if not questions:
+            return None
+        entry = _Entry(row["expires_at"], questions, len(row["questions"]))
+        self._entries[key] = entry
+        self._bytes += entry.nbytes
+        return entry
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    # ── File content hashes ───────────────────────────────────────────────────
+
+    def content_hash_for(self, meta: dict[str, Any]) -> str | None:
+        """The remembered content hash, if Canvas metadata says the file is unchanged since."""
+        fingerprint = _fingerprint(meta)
+        if fingerprint is None or meta.get("id") is None:
+            return None
+        row = self._conn().execute(
+            "SELECT fingerprint, content_hash FROM file_hashes WHERE file_id = ?", (str(meta["id"]),)
+        ).fetchone()
+        if row is None or row["fingerprint"] != fingerprint:
+            return None
+        return row["content_hash"]
+
+    def remember_content_hash(self, meta: dict[str, Any], content_hash: str) -> None:
+        fingerprint = _fingerprint(meta)
+        if fingerprint is None or meta.get("id") is None:
+            return
+        self.write_later(self._save_hash, str(meta["id"]), fingerprint, content_hash)
+
+    def _save_hash(self, file_id: str, fingerprint: str, content_hash: str) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO file_hashes (file_id, fingerprint, content_hash) VALUES (?, ?, ?)",
+            (file_id, fingerprint, content_hash),
+        )
+
+    # ── Expiry ────────────────────────────────────────────────────────────────
+
+    def sweep(self) -> int:
+        """Drop expired sets from both tiers; returns how many in-memory entries were removed."""
+        now = time.time()
+        expired = [key for key, entry in self._entries.items() if now > entry.expires_at]
+        for key in expired:
+            self._drop(key)
+        self.write_later(self._delete_expired, now)
+        return len(expired)
+
+    def _delete_expired(self, now: float) -> None:
+        self._conn().execute("DELETE FROM question_queues WHERE expires_at < ?", (now,))
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_seconds)
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("question cache sweep failed")
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self._evictions,
+        }
+
+
+question_cache = QuestionCache(
+    settings.question_cache_db_path,
+    settings.question_cache_max_entries,
+    settings.question_cache_max_bytes,
+    settings.question_cache_ttl_seconds,
+    settings.question_cache_sweep_seconds,
+)
@@ -0,0 +1,146 @@
+"""
+Push feed of new questions for GET /questions/stream (SSE) and /questions/poll
+(long-poll), replacing fixed-interval client polling.
+
+A question is published when the generated pool gains one (at most one per
+QUESTION_STREAM_MIN_GAP_SECONDS; the rest stay in the pool for normal requests)
+and, if nothing was published for QUESTION_STREAM_INTERVAL_SECONDS, a static
+bank question goes out instead. Events fan out through the shared broadcaster,
+whose bounded per-subscriber buffers keep slow clients from holding anything
+up; an idle connection is one small queue and a sleeping coroutine. The last
+events are kept so long-pollers can resume from a `since` cursor.
+
+Pool questions belong to the tenant (Canvas user) whose pool produced them:
+they are published on that tenant's topic and taken out of its pool, so a
+question pushed to the stream is not served again by /questions/from-file.
+Only while the tenant has a stream open or a long-poll waiting, though; with
+nobody listening the question stays in the pool. Static questions go to
+everyone.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any
+
+from config.settings import settings
+from services.events import broadcaster
+from services.question_pool import QuestionPool
+
+QUESTIONS_TOPIC = "questions"
+# Events kept for long-poll `since` / SSE Last-Event-ID replay
+HISTORY_SIZE = 256
+
+_PUBLIC_FIELDS = ("id", "topic", "hint", "answer", "mcq")
+
+
+def tenant_topic(tenant_id: str) -> str:
+    return f"{QUESTIONS_TOPIC}:{tenant_id}"
+
+
+def matches(event: dict[str, Any], tenant_id: str, course_id: int | None) -> bool:
+    """Static questions (no tenant or course) go to everyone; pool questions to their tenant, course filter."""
+    if event.get("tenant") not in (None, tenant_id):
+        return False
+    return course_id is None or event.get("course_id") in (None, course_id)
+
+
+class QuestionFeed:
+    def __init__(self, interval_seconds: int, min_gap_seconds: int):
+        self.interval_seconds = interval_seconds
+        self.min_gap_seconds = max(0, min_gap_seconds)
+        self._history: deque[dict[str, Any]] = deque(maxlen=HISTORY_SIZE)
+        self._last_published = 0.0
+        self._last_pool_published: dict[str, float] = {}
+        self._static: list[dict[str, Any]] = []
+        self._task: asyncio.Task | None = None
+
+    # ── Lifecycle (called from the app lifespan) ──────────────────────────────
+
+    def start(self, static_questions: list[dict[str, Any]]) -> None:
+        self._static = static_questions
+        self._last_published = time.monotonic()
+        if self._task is None and self.interval_seconds > 0:
+            self._task = asyncio.create_task(self._cadence_loop())
+
+    def watch(self, pool: QuestionPool, tenant_id: str) -> None:
+        """Publish questions new in a tenant's pool to that tenant's subscribers."""
+        pool.add_listener(lambda question: self._on_pool_question(question, tenant_id, pool))
+
+    def forget(self, tenant_id: str) -> None:
+        self._last_pool_published.pop(tenant_id, None)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # ── Publishing ────────────────────────────────────────────────────────────
+
+    def publish(self, question: dict[str, Any], served_from: str, tenant_id: str | None = None) -> dict[str, Any]:
+        event = {
+            "type": "question",
+            "tenant": tenant_id,
+            "course_id": question.get("course_id"),
+            "question": {**{k: question.get(k) for k in _PUBLIC_FIELDS}, "served_from": served_from},
+        }
+        topic = QUESTIONS_TOPIC if tenant_id is None else tenant_topic(tenant_id)
+        event["id"] = broadcaster.publish(topic, event)
+        self._history.append(event)
+        self._last_published = time.monotonic()
+        return event
+
+    def _on_pool_question(self, question: dict[str, Any], tenant_id: str, pool: QuestionPool) -> None:
+        topic = tenant_topic(tenant_id)
+        if not broadcaster.subscriber_count(topic):
+            return  # nobody would see it: leave it for /questions/from-file
+        now = time.monotonic()
+        if now - self._last_pool_published.get(tenant_id, 0.0) >= self.min_gap_seconds and pool.claim(question):
+            self._last_pool_published[tenant_id] = now
+            self.publish(question, "pool", tenant_id)
+
+    async def _cadence_loop(self) -> None:
+        while True:
+            wait = self._last_published + self.interval_seconds - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            if self._static:
+                self.publish(random.choice(self._static), "static")
+            else:
+                await asyncio.sleep(self.interval_seconds)
+
+    # ── Reading ───────────────────────────────────────────────────────────────
+
+    @property
+    def cursor(self) -> int:
+        """Id of the newest event, 0 if none yet."""
+        return self._history[-1]["id"] if self._history else 0
+
+    def topics(self, tenant_id: str) -> tuple[str, str]:
+        """Broadcaster topics carrying a tenant's events: static questions and its own pool's."""
+        return QUESTIONS_TOPIC, tenant_topic(tenant_id)
+
+    def resume_cursor(self, cursor: int) -> int:
+        """
+        A client's cursor, or 0 (replay the history) if it is ahead of this
+        process's numbering: it came from another worker or a newer process.
+        """
+        return cursor if cursor <= self.cursor else 0
+
+    def since(self, cursor: int, tenant_id: str, course_id: int | None = None) -> list[dict[str, Any]]:
+        return [e for e in self._history if e["id"] > cursor and matches(e, tenant_id, course_id)]
+
+    def latest(self, tenant_id: str, course_id: int | None = None) -> dict[str, Any] | None:
+        for event in reversed(self._history):
+            if matches(event, tenant_id, course_id):
+                return event
+        return None
+
+
+question_feed = QuestionFeed(
+    settings.question_stream_interval_seconds,
+    settings.question_stream_min_gap_seconds,
+)
@@ -3,34 +3,60 @@ Generate one quiz question from a random active course and a (recent) file in th
 Uses Canvas (courses + files via modules), file download, parser, and OpenAI to produce
 the same format as the static questions (topic, hint, answer, mcq).
 
-Caching: questions are cached in memory by Canvas file_id (TTL 24h). Cache hits skip
-download + OpenAI and return in milliseconds. For multi-worker deployments use Redis
-or a shared cache keyed by file_id.
+Courses already indexed in Qdrant take their context from stored chunks
+(services.chunk_retrieval); otherwise a file is picked from the user's
+services.course_catalog. Each OpenAI call yields a batch of questions, cached in
+services.question_cache by content hash, model and PROMPT_VERSION.
 """
 
 import asyncio
+import hashlib
 import json
+import logging
 import os
 import random
-import time
-from typing import Any
+from typing import TYPE_CHECKING, Any
+from uuid import uuid4
 
 # Limit work to keep latency down: try one course first; fetch this many file metas in parallel
 MAX_COURSES_TO_TRY = 1
 MAX_FILE_METAS_PARALLEL = 8
 
-# In-memory cache: file_id -> (expiry_ts, question_payload). TTL in seconds.
-_QUESTION_CACHE: dict[int | str, tuple[float, dict[str, Any]]] = {}
-_CACHE_TTL_SECONDS = 24 * 60 * 60  # 24 hours
-
-from openai import AsyncOpenAI
+# Part of the question cache key; bump when the prompt or output format changes
+PROMPT_VERSION = "batch-1"
+# Same, for question sets built from indexed chunks (services.chunk_retrieval)
+RETRIEVAL_PROMPT_VERSION = "retrieval-1"
 
+from config.settings import settings
+from services import chunk_retrieval
 from services.canvas import canvas_service
 from services.canvas import CanvasAPIError
+from services.canvas import CanvasService
 from services.canvas_file_client import get_file_metadata
 from services.canvas_file_client import CanvasFileClientError
+from services.context_builder import build_context
+from services.context_builder import estimate_tokens
+from services.concurrency import generation_slots
+from services.course_catalog import CourseCatalog
+from services.course_catalog import course_catalog
+from services.deadline import check as check_deadline
+from services.deadline import step_timeout
+from services.metrics import OPENAI_GENERATION_SECONDS
+from services.metrics import OPENAI_TOKENS
+from services.metrics import PROMPT_CONTEXT_TOKENS
+from services.metrics import QUESTION_GENERATIONS
+from services.parser import cached_sections
 from services.parser import is_supported
-from services.parser import parse_file
+from services.parser import parse_file_cached
+from services.parser import Section
+from services.question_cache import cache_key
+from services.question_cache import question_cache
+from services.tracing import span
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
 
 
 def _get_openai_key() -> str:
@@ -38,81 +64,92 @@ def _get_openai_key() -> str:
     return os.environ.get("OPENAI_API_KEY", "").strip()
 
 
+_openai_clients: dict[str, "AsyncOpenAI"] = {}
+
+
+def get_openai_client(api_key: str) -> "AsyncOpenAI":
+    """One client (and connection pool) per key; the SDK is imported on first use."""
+    client = _openai_clients.get(api_key)
+    if client is None:
+        from openai import AsyncOpenAI
+
+        _openai_clients.clear()  # the key was rotated: drop the old client
+        client = _openai_clients[api_key] = AsyncOpenAI(api_key=api_key)
+    return client
+
+
 def _get_openai_model() -> str:
     return os.environ.get("OPENAI_QUESTION_MODEL", "gpt-4o-mini").strip() or "gpt-4o-mini"
 
 
-def _cache_get(file_id: int | str) -> dict[str, Any] | None:
-    entry = _QUESTION_CACHE.get(file_id)
-    if not entry:
+async def _pick_file(course: dict[str, Any], canvas: CanvasService) -> dict[str, Any] | None:
+    """Pick a supported file in one course (prefer recent); parallel metadata fetches keep latency down."""
+    course_id = course.get("id")
+    course_name = course.get("name", "Course")
+    if not course_id:
         return None
-    expiry_ts, payload = entry
-    if time.time() > expiry_ts:
-        del _QUESTION_CACHE[file_id]
+    module_files = await canvas.list_course_files_via_modules(course_id)
+    if not module_files:
+        # Fallback: direct course files (works for teachers; 403 for students)
+        try:
+            direct_files = await canvas.list_course_files(course_id)
+        except CanvasAPIError:
+            direct_files = []
+        supported = [f for f in direct_files if is_supported(f)]
+        if not supported:
+            return None
+        for f in supported:
+            f["_course_id"] = course_id
+            f["_course_name"] = course_name
+        supported.sort(key=_updated_at, reverse=True)
+        return supported[0]
+    # Fetch metadata in parallel for first N refs (much faster than sequential)
+    random.shuffle(module_files)
+    to_try = module_files[:MAX_FILE_METAS_PARALLEL]
+
+    async def _fetch_meta(ref: dict) -> dict[str, Any] | None:
+        file_id = ref.get("file_id")
+        if not file_id:
+            return None
+        try:
+            meta = await get_file_metadata(file_id, canvas)
+        except CanvasFileClientError:
+            return None
+        if not is_supported(meta):
+            return None
+        meta["_module_title"] = ref.get("title", "")
+        meta["_course_id"] = course_id
+        meta["_course_name"] = course_name
+        return meta
+
+    with span("file_metadata", files=len(to_try)):
+        results = await asyncio.gather(*[_fetch_meta(ref) for ref in to_try])
+    file_metas = [m for m in results if m is not None]
+    if not file_metas:
         return None
-    return payload
+    file_metas.sort(key=_updated_at, reverse=True)
+    return file_metas[0]
 
 
-def _cache_set(file_id: int | str, payload: dict[str, Any]) -> None:
-    _QUESTION_CACHE[file_id] = (time.time() + _CACHE_TTL_SECONDS, payload)
+def _updated_at(m: dict) -> str:
+    return m.get("updated_at") or m.get("created_at") or ""
 
 
-async def _pick_course_and_file() -> tuple[dict[str, Any], dict[str, Any]]:
-    """Try up to MAX_COURSES_TO_TRY courses; use parallel file metadata fetches to reduce latency."""
-    courses = await canvas_service.list_courses(enrollment_state="active")
+async def _pick_course_and_file(
+    canvas: CanvasService, catalog: CourseCatalog
+) -> tuple[dict[str, Any], dict[str, Any]]:
+    """From the catalog if warm, else try up to MAX_COURSES_TO_TRY random active courses."""
+    picked = catalog.pick()
+    if picked is not None:
+        return picked
+    courses = await canvas.list_courses(enrollment_state="active")
     if not courses:
         raise ValueError("No active courses found for the configured Canvas user.")
     random.shuffle(courses)
-    to_consider = courses[:MAX_COURSES_TO_TRY]
-    for course in to_consider:
-        course_id = course.get("id")
-        course_name = course.get("name", "Course")
-        if not course_id:
-            continue
-        module_files = await canvas_service.list_course_files_via_modules(course_id)
-        if not module_files:
-            # Fallback: direct course files (works for teachers; 403 for students)
-            try:
-                direct_files = await canvas_service.list_course_files(course_id)
-            except CanvasAPIError:
-                direct_files = []
-            if direct_files:
-                supported = [f for f in direct_files if is_supported(f)]
-                if supported:
-                    for f in supported:
-                        f["_course_id"] = course_id
-                        f["_course_name"] = course_name
-                    def _updated_at(m: dict) -> str:
-                        return m.get("updated_at") or m.get("created_at") or ""
-                    supported.sort(key=_updated_at, reverse=True)
-                    return course, supported[0]
-            continue
-        # Fetch metadata in parallel for first N refs (much faster than sequential)
-        random.shuffle(module_files)
-        to_try = module_files[:MAX_FILE_METAS_PARALLEL]
-
-        async def _fetch_meta(ref: dict) -> dict[str, Any] | None:
-            file_id = ref.get("file_id")
-            if not file_id:
-                return None
-            try:
-                meta = await get_file_metadata(file_id)
-            except CanvasFileClientError:
-                return None
-            if not is_supported(meta):
-                return None
-            meta["_module_title"] = ref.get("title", "")
-            meta["_course_id"] = course_id
-            meta["_course_name"] = course_name
-            return meta
-
-        results = await asyncio.gather(*[_fetch_meta(ref) for ref in to_try])
-        file_metas = [m for m in results if m is not None]
-        if file_metas:
-            def _updated_at(m: dict) -> str:
-                return m.get("updated_at") or m.get("created_at") or ""
-            file_metas.sort(key=_updated_at, reverse=True)
-            return course, file_metas[0]
+    for course in courses[:MAX_COURSES_TO_TRY]:
+        file_meta = await _pick_file(course, canvas)
+        if file_meta is not None:
+            return course, file_meta
 
     raise ValueError(
         "No usable files found in any active course. "
@@ -120,61 +157,223 @@ async def _pick_course_and_file() -> tuple[dict[str, Any], dict[str, Any]]:
     )
 
 
-async def generate_question_from_file() -> dict[str, Any]:
+def _pick_indexed_course(catalog: CourseCatalog) -> dict[str, Any] | None:
+    """A random course of the user's catalog that has chunks in Qdrant, or None."""
+    if not settings.question_retrieval_enabled:
+        return None
+    indexed = chunk_retrieval.indexed_course_ids()
+    courses = [c for c in catalog.courses() if c["id"] in indexed]
+    return random.choice(courses) if courses else None
+
+
+def _require_openai_key() -> str:
+    api_key = _get_openai_key()
+    if not api_key:
+        raise ValueError(
+            "OPENAI_API_KEY is not set. Set it in the environment to generate questions from course files."
+        )
+    return api_key
+
+
+async def generate_question_from_file(
+    canvas: CanvasService = canvas_service,
+    catalog: CourseCatalog = course_catalog,
+    priority: int = 1,
+) -> dict[str, Any]:
     """
     Pick a random active course, pick a supported file (prefer recent), extract text,
     call OpenAI to generate one question in our standard format. Returns a dict
     with id, topic, hint, answer, mcq (question, options, correct_index).
     """
-    api_key = _get_openai_key()
-    if not api_key:
+    api_key = _require_openai_key()
+    # An indexed course needs no Canvas calls, even while the catalog's files are still loading
+    course = _pick_indexed_course(catalog)
+    if course is not None:
+        question = await _generate_from_index(api_key, course, canvas, catalog, priority)
+        if question is not None:
+            return question
+    _, file_meta = await _pick_course_and_file(canvas, catalog)
+    return await _generate_for_file(api_key, file_meta, canvas, priority)
+
+
+async def generate_question_for_course(
+    course: dict[str, Any],
+    canvas: CanvasService = canvas_service,
+    catalog: CourseCatalog = course_catalog,
+    priority: int = 1,
+) -> dict[str, Any]:
+    """Same as generate_question_from_file, for a given course dict (id, name)."""
+    api_key = _require_openai_key()
+    question = await _generate_from_index(api_key, course, canvas, catalog, priority)
+    if question is not None:
+        return question
+    file_meta = catalog.pick_file(course.get("id")) or await _pick_file(course, canvas)
+    if file_meta is None:
         raise ValueError(
-            "OPENAI_API_KEY is not set. Set it in the environment to generate questions from course files."
+            f"No usable files found in course {course.get('id')}. "
+            "Add a PPTX/DOCX/TXT/PDF file to a course module, or use a teacher token."
         )
-    course, file_meta = await _pick_course_and_file()
-    file_id = file_meta.get("id")
-    if file_id is not None:
-        cached = _cache_get(file_id)
+    return await _generate_for_file(api_key, file_meta, canvas, priority)
+
+
+async def take_cached_question(
+    course_id: int | None = None, catalog: CourseCatalog = course_catalog
+) -> dict[str, Any] | None:
+    """
+    An already-generated question from any cataloged file (of course_id, or of a
+    random course), without network calls. Used as a fast fallback when generating
+    would take too long.
+    """
+    model = _get_openai_model()
+    course_ids = [course_id] if course_id is not None else catalog.course_ids()
+    random.shuffle(course_ids)
+    for cid in course_ids:
+        files = catalog.files(cid)
+        random.shuffle(files)
+        for meta in files:
+            content_hash = question_cache.content_hash_for(meta)
+            if content_hash is None:
+                continue
+            for version in (PROMPT_VERSION, RETRIEVAL_PROMPT_VERSION):
+                key = cache_key(content_hash, model, version)
+                question = await question_cache.take(key, record=False)
+                if question is not None:
+                    return question
+    return None
+
+
+async def _generate_from_index(
+    api_key: str, course: dict[str, Any], canvas: CanvasService, catalog: CourseCatalog, priority: int
+) -> dict[str, Any] | None:
+    """
+    A question whose context comes from the course's chunks in Qdrant, or None
+    when retrieval is off, the course is not in the user's catalog (Canvas has
+    not told us they may see it) or not indexed, or Qdrant fails.
+    """
+    course_id = course.get("id")
+    if not settings.question_retrieval_enabled or course_id is None or not catalog.has_course(course_id):
+        return None
+    files = chunk_retrieval.indexed_files(course_id)
+    if not files:
+        return None
+    model = _get_openai_model()
+    entry, chunk_index = chunk_retrieval.pick_seed(course_id, files)
+    key = cache_key(entry.content_hash, model, RETRIEVAL_PROMPT_VERSION)
+    cached = await question_cache.take(key)
+    if cached is not None:
+        return cached
+    check_deadline("retrieve")
+    try:
+        with span("retrieve"):
+            sections = await chunk_retrieval.neighborhood(
+                course_id,
+                entry.file_id,
+                chunk_index,
+                settings.question_retrieval_neighbors,
+                settings.question_context_token_budget,
+            )
+    except Exception as e:
+        logger.warning("chunk retrieval for course %s failed, using a file instead: %s", course_id, e)
+        return None
+    if not sections:
+        return None
+    file_meta = {"id": entry.file_id, "_course_id": course_id, "_course_name": course.get("name", "Course")}
+    async with generation_slots.slot(canvas.tenant_id, priority):
+        questions = await _generate_question_set(api_key, model, file_meta, sections)
+    QUESTION_GENERATIONS.inc(source="index")
+    question_cache.put(key, questions[1:])
+    return questions[0]
+
+
+async def _generate_for_file(
+    api_key: str, file_meta: dict[str, Any], canvas: CanvasService, priority: int
+) -> dict[str, Any]:
+    model = _get_openai_model()
+    known_hash = question_cache.content_hash_for(file_meta)
+    sections = None
+    if known_hash is not None:
+        cached = await question_cache.take(cache_key(known_hash, model, PROMPT_VERSION))
         if cached is not None:
             return cached
+        # Parsed earlier (by any user): no download needed
+        sections = cached_sections(known_hash, file_meta)
+    if sections is not None:
+        content_hash = known_hash
+    else:
+        buffer = await canvas.download_file(file_meta)
+        content_hash = hashlib.sha256(buffer.getbuffer()).hexdigest()
+        question_cache.remember_content_hash(file_meta, content_hash)
+        if content_hash != known_hash:
+            # Same bytes may already have questions (re-uploaded or copied file)
+            cached = await question_cache.take(cache_key(content_hash, model, PROMPT_VERSION))
+            if cached is not None:
+                return cached
+        check_deadline("parse")
+        sections = await asyncio.to_thread(parse_file_cached, buffer, file_meta, content_hash)
+    async with generation_slots.slot(canvas.tenant_id, priority):
+        questions = await _generate_question_set(api_key, model, file_meta, sections)
+    QUESTION_GENERATIONS.inc(source="file")
+    question_cache.put(cache_key(content_hash, model, PROMPT_VERSION), questions[1:])
+    return questions[0]
+
+
+async def _generate_question_set(
+    api_key: str, model: str, file_meta: dict[str, Any], sections: list[Section]
+) -> list[dict[str, Any]]:
+    """Ask OpenAI for a batch of distinct questions from the file's parsed sections."""
     course_id = file_meta["_course_id"]
     course_name = file_meta["_course_name"]
-    buffer = await canvas_service.download_file(file_meta)
-    sections = parse_file(buffer, file_meta)
     if not sections:
         raise ValueError("File could not be parsed or produced no text.")
-    combined_text = "\n\n".join(
-        f"[{s.get('source_location', '')}]\n{s.get('text', '')}" for s in sections
-    )
-    # Cap size for API
-    if len(combined_text) > 12000:
-        combined_text = combined_text[:12000] + "\n\n[... truncated for length ...]"
-    client = AsyncOpenAI(api_key=api_key)
+    with span("context"):
+        combined_text, used_sections = await asyncio.to_thread(
+            build_context, sections, settings.question_context_token_budget
+        )
+    if not combined_text:
+        raise ValueError("File could not be parsed or produced no text.")
+    PROMPT_CONTEXT_TOKENS.observe(estimate_tokens(combined_text))
+    logger.debug("question prompt for file %s uses sections %s", file_meta.get("id"), used_sections)
+    batch_size = max(1, settings.question_batch_size)
+    client = get_openai_client(api_key)
     prompt = f"""You are a graduate-level exam question writer. Below is excerpted course material from the course "{course_name}".
 
-Generate exactly ONE multiple-choice question that can be answered from this material. Output valid JSON only, no markdown or explanation, in this exact shape:
+Generate exactly {batch_size} distinct multiple-choice questions that can be answered from this material. Each question should test a different concept or detail. Output valid JSON only, no markdown or explanation, in this exact shape:
 {{
-  "topic": "short topic name (e.g. Convolutional Neural Networks)",
-  "hint": "one short hint for the student (1 sentence)",
-  "answer": "a clear 1-3 sentence explanation of the correct answer",
-  "mcq": {{
-    "question": "the multiple choice question text",
-    "options": ["option A", "option B", "option C", "option D"],
-    "correct_index": 0
-  }}
+  "questions": [
+    {{
+      "topic": "short topic name (e.g. Convolutional Neural Networks)",
+      "hint": "one short hint for the student (1 sentence)",
+      "answer": "a clear 1-3 sentence explanation of the correct answer",
+      "mcq": {{
+        "question": "the multiple choice question text",
+        "options": ["option A", "option B", "option C", "option D"],
+        "correct_index": 0
+      }}
+    }}
+  ]
 }}
-correct_index must be 0, 1, 2, or 3 (the index of the correct option in options). Give exactly 4 options.
+correct_index must be 0, 1, 2, or 3 (the index of the correct option in options). Give exactly 4 options per question.
 
 Course material:
 ---
 {combined_text}
 ---"""
 
-    response = await client.chat.completions.create(
-        model=_get_openai_model(),
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.5,
-    )
+    with OPENAI_GENERATION_SECONDS.time(model=model), span("openai", model=model):
+        check_deadline("openai")
+        timeout = step_timeout()
+        if timeout is not None:
+            # Under a deadline a retry could not finish in time anyway
+            client = client.with_options(max_retries=0)
+        response = await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.5,
+            **({"timeout": timeout} if timeout is not None else {}),
+        )
+    if response.usage is not None:
+        OPENAI_TOKENS.inc(response.usage.prompt_tokens, model=model, kind="prompt")
+        OPENAI_TOKENS.inc(response.usage.completion_tokens, model=model, kind="completion")
     raw = response.choices[0].message.content
     if not raw:
         raise ValueError("OpenAI returned empty content.")
@@ -184,27 +383,64 @@ Course material:
     if raw.endswith("```"):
         raw = raw.rsplit("```", 1)[0].strip()
     data = json.loads(raw)
-    topic = data.get("topic", "Course material")
-    hint = data.get("hint", "")
-    answer = data.get("answer", "")
+    # Tolerate a bare list or a single question object
+    if isinstance(data, dict):
+        items = data.get("questions", [data])
+    else:
+        items = data
+    gen_prefix = f"gen-{course_id}-{file_meta.get('id', '')}-{uuid4().hex[:12]}"
+    questions: list[dict[str, Any]] = []
+    seen: set[str] = set()
+    for item in items if isinstance(items, list) else []:
+        question = _validate_question(item)
+        if question is None:
+            continue
+        key = question["mcq"]["question"].strip().lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        question["id"] = f"{gen_prefix}-{len(questions)}"
+        question["course_id"] = course_id
+        question["file_id"] = file_meta.get("id")
+        question["context_sections"] = used_sections
+        questions.append(question)
+    if not questions:
+        raise ValueError("OpenAI returned no valid questions.")
+    return questions
+
+
+def _validate_question(data: Any) -> dict[str, Any] | None:
+    """Normalize one generated question; None if it has no text or fewer than 2 options."""
+    if not isinstance(data, dict):
+        return None
     mcq = data.get("mcq") or {}
-    q = mcq.get("question", "")
-    options = list(mcq.get("options") or [])[:4]
-    correct_index = int(mcq.get("correct_index", 0))
-    if correct_index < 0 or correct_index >= len(options):
-        correct_index = 0
-    gen_id = f"gen-{course_id}-{file_meta.get('id', '')}-{int(time.time())}"
-    result = {
-        "id": gen_id,
-        "topic": topic,
-        "hint": hint,
-        "answer": answer,
+    if not isinstance(mcq, dict):
+        return None
+    q = str(mcq.get("question") or "").strip()
+    raw_options = mcq.get("options") or []
+    if not isinstance(raw_options, list):
+        return None
+    try:
+        correct_index = int(mcq.get("correct_index", 0))
+    except (TypeError, ValueError):
+        return None
+    if correct_index < 0 or correct_index >= len(raw_options) or not str(raw_options[correct_index]).strip():
+        return None
+    # Drop blank options, keeping correct_index pointing at the same option
+    kept = [i for i, o in enumerate(raw_options) if str(o).strip()][:4]
+    if correct_index not in kept:
+        return None
+    options = [str(raw_options[i]) for i in kept]
+    correct_index = kept.index(correct_index)
+    if not q or len(options) < 2 or len(set(options)) != len(options):
+        return None
+    return {
+        "topic": data.get("topic") or "Course material",
+        "hint": data.get("hint") or "",
+        "answer": data.get("answer") or "",
         "mcq": {
             "question": q,
             "options": options,
             "correct_index": correct_index,
         },
     }
-    if file_id is not None:
-        _cache_set(file_id, result)
-    return result
@@ -0,0 +1,342 @@
+"""
+Per-course pool of pre-generated questions for GET /questions/from-file.
+
+Generating a question on the request path costs several Canvas calls, a
+download, a parse and an OpenAI call. Instead, background workers keep each
+active course stocked: once a course drops below QUESTION_POOL_LOW_WATERMARK
+ready questions it is refilled up to QUESTION_POOL_HIGH_WATERMARK, and the
+endpoint just pops one (O(1)).
+
+Served questions move to a per-course "served" ring. When a course has no
+fresh questions left, the oldest served one is re-served, so nobody sees a
+repeat until everything in the pool has been shown once.
+
+Each tenant (services.tenancy) has its own pool over its own courses, refilled
+with its own Canvas token; question_pool below is the configured user's.
+Refills generate at background priority, so they yield OpenAI slots to
+requests waiting on a generation.
+"""
+
+import asyncio
+import itertools
+import logging
+import random
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from config.settings import settings
+from services.canvas import CanvasService, canvas_service
+from services.course_catalog import CourseCatalog, course_catalog
+from services.metrics import QUESTION_POOL_READY, QUESTION_POOL_REFILL_SECONDS, QUESTION_POOL_SERVED
+from services.question_from_file import generate_question_for_course
+
+logger = logging.getLogger(__name__)
+
+# Stop a refill after this many generations in a row add nothing new
+_MAX_CONSECUTIVE_MISSES = 3
+
+
+def _dedupe_key(question: dict[str, Any]) -> str:
+    mcq = question.get("mcq") or {}
+    return (mcq.get("question") or question.get("id") or "").strip().lower()
+
+
+def _first_allowed(
+    questions: deque, skip: set[str] | frozenset[str], allowed: Callable[[dict], bool] | None
+) -> int | None:
+    """Index of the first question not skipped (0 in the common, nothing-skipped case)."""
+    if not skip and allowed is None:
+        return 0 if questions else None
+    for i, question in enumerate(questions):
+        if question.get("id") not in skip and (allowed is None or allowed(question)):
+            return i
+    return None
+
+
+@dataclass
+class _CoursePool:
+    course: dict[str, Any]
+    ready: deque = field(default_factory=deque)
+    served: deque = field(default_factory=deque)
+    keys: set[str] = field(default_factory=set)
+    refill_pending: bool = False
+    refills: int = 0
+    failures: int = 0
+    last_error: str | None = None
+    last_refill_seconds: float | None = None
+
+    @property
+    def course_id(self) -> int:
+        return self.course["id"]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "course_id": self.course_id,
+            "course_name": self.course.get("name", ""),
+            "ready": len(self.ready),
+            "served": len(self.served),
+            "refilling": self.refill_pending,
+            "questions_generated": self.refills,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_refill_seconds": self.last_refill_seconds,
+        }
+
+
+class QuestionPool:
+    def __init__(
+        self,
+        canvas: CanvasService,
+        catalog: CourseCatalog,
+        low_watermark: int,
+        high_watermark: int,
+        workers: int,
+        course_refresh_seconds: int,
+    ):
+        self.canvas = canvas
+        self.catalog = catalog
+        self.high = max(1, high_watermark)
+        self.low = min(max(0, low_watermark), self.high)
+        self.workers = max(1, workers)
+        self.course_refresh_seconds = max(30, course_refresh_seconds)
+        self._pools: dict[int, _CoursePool] = {}
+        self._refill_queue: asyncio.Queue[int] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        # Pool-wide serial numbers, so per-client "seen" state can be a small bitset;
+        # the epoch tells persisted client state that the numbering restarted
+        self._seq = itertools.count()
+        self.epoch = uuid.uuid4().hex[:12]
+        self._listeners: list[Callable[[dict[str, Any]], None]] = []
+
+    # ── Lifecycle (called from the app lifespan) ──────────────────────────────
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._refresh_courses_loop()))
+        self._tasks.extend(asyncio.create_task(self._worker()) for _ in range(self.workers))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def add_course(self, course: dict[str, Any]) -> None:
+        """Start pooling questions for a course (id, name); refreshes the name if already known."""
+        course_id = course.get("id")
+        if not course_id:
+            return
+        pool = self._pools.get(course_id)
+        if pool is None:
+            pool = self._pools[course_id] = _CoursePool(course={"id": course_id, "name": course.get("name", "Course")})
+            self._schedule_refill(pool)
+        else:
+            pool.course["name"] = course.get("name", pool.course["name"])
+
+    def pop(self, course_id: int | None = None) -> dict[str, Any] | None:
+        """
+        A ready question (from course_id, or a random stocked course), else the
+        least recently served one, else None. Never waits on generation.
+        """
+        return self._pop_one(self._candidates(course_id), frozenset(), None)
+
+    def pop_many(
+        self,
+        n: int,
+        course_id: int | None = None,
+        exclude: frozenset[str] | set[str] = frozenset(),
+        allowed: Callable[[dict], bool] | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Up to n distinct questions, skipping ids in exclude and questions for which
+        allowed() is false (e.g. already seen by the client).
+        """
+        candidates = self._candidates(course_id)
+        skip = set(exclude)
+        questions: list[dict[str, Any]] = []
+        for _ in range(max(0, n)):
+            question = self._pop_one(candidates, skip, allowed)
+            if question is None:
+                break
+            skip.add(question["id"])
+            questions.append(question)
+        return questions
+
+    def _candidates(self, course_id: int | None) -> list[_CoursePool]:
+        if course_id is None:
+            return list(self._pools.values())
+        pool = self._pools.get(course_id)
+        return [pool] if pool is not None else []
+
+    def _pop_one(
+        self,
+        candidates: list[_CoursePool],
+        skip: set[str] | frozenset[str],
+        allowed: Callable[[dict], bool] | None,
+    ) -> dict[str, Any] | None:
+        stocked = [p for p in candidates if p.ready]
+        random.shuffle(stocked)
+        for pool in stocked:
+            index = _first_allowed(pool.ready, skip, allowed)
+            if index is None:
+                continue
+            question = pool.ready[index]
+            del pool.ready[index]
+            pool.served.append(question)
+            self._after_pop(pool)
+            QUESTION_POOL_SERVED.inc(result="ready")
+            return question
+        rotatable = [p for p in candidates if p.served]
+        random.shuffle(rotatable)
+        for pool in rotatable:
+            index = _first_allowed(pool.served, skip, allowed)
+            if index is None:
+                continue
+            question = pool.served[index]
+            del pool.served[index]
+            pool.served.append(question)
+            self._after_pop(pool)
+            QUESTION_POOL_SERVED.inc(result="rotated")
+            return question
+        for pool in candidates:
+            self._schedule_refill(pool)
+        QUESTION_POOL_SERVED.inc(result="empty")
+        return None
+
+    def offer(self, question: dict[str, Any]) -> bool:
+        """Add a question generated elsewhere (e.g. after a request timed out) to its course's pool."""
+        pool = self._pools.get(question.get("course_id"))
+        if pool is None or len(pool.ready) >= self.high:
+            return False
+        key = _dedupe_key(question)
+        if key in pool.keys:
+            return False
+        pool.keys.add(key)
+        question["pool_seq"] = next(self._seq)
+        pool.ready.append(question)
+        QUESTION_POOL_READY.set(len(pool.ready), course_id=pool.course_id)
+        self._notify(question)
+        return True
+
+    def claim(self, question: dict[str, Any]) -> bool:
+        """
+        Remove a ready question for delivery elsewhere (the push stream), so it
+        is neither served nor rotated back in here; False if it is gone already.
+        """
+        pool = self._pools.get(question.get("course_id"))
+        if pool is None:
+            return False
+        for i, ready in enumerate(pool.ready):
+            if ready is question:
+                del pool.ready[i]
+                pool.keys.discard(_dedupe_key(question))
+                self._after_pop(pool)
+                return True
+        return False
+
+    def add_listener(self, listener: Callable[[dict[str, Any]], None]) -> None:
+        """Call listener(question) whenever a new question becomes ready."""
+        self._listeners.append(listener)
+
+    def _notify(self, question: dict[str, Any]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(question)
+            except Exception:
+                logger.exception("question pool listener failed")
+
+    def course(self, course_id: int) -> dict[str, Any] | None:
+        pool = self._pools.get(course_id)
+        return dict(pool.course) if pool is not None else None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "low_watermark": self.low,
+            "high_watermark": self.high,
+            "workers": self.workers,
+            "refills_queued": self._refill_queue.qsize(),
+            "courses": [p.stats() for p in self._pools.values()],
+        }
+
+    # ── Refill ────────────────────────────────────────────────────────────────
+
+    def _after_pop(self, pool: _CoursePool) -> None:
+        # The served ring only keeps as many as the pool holds when full
+        while len(pool.served) > self.high:
+            pool.keys.discard(_dedupe_key(pool.served.popleft()))
+        QUESTION_POOL_READY.set(len(pool.ready), course_id=pool.course_id)
+        if len(pool.ready) < self.low:
+            self._schedule_refill(pool)
+
+    def _schedule_refill(self, pool: _CoursePool) -> None:
+        if not pool.refill_pending:
+            pool.refill_pending = True
+            self._refill_queue.put_nowait(pool.course_id)
+
+    async def _worker(self) -> None:
+        while True:
+            course_id = await self._refill_queue.get()
+            pool = self._pools.get(course_id)
+            if pool is None:
+                continue
+            try:
+                await self._refill(pool)
+            finally:
+                pool.refill_pending = False
+
+    async def _refill(self, pool: _CoursePool) -> None:
+        misses = 0
+        while len(pool.ready) < self.high and misses < _MAX_CONSECUTIVE_MISSES:
+            start = time.perf_counter()
+            try:
+                question = await generate_question_for_course(pool.course, self.canvas, self.catalog, priority=0)
+            except Exception as e:
+                pool.failures += 1
+                pool.last_error = str(e) or type(e).__name__
+                logger.warning("question pool refill for course %s failed: %s", pool.course_id, pool.last_error)
+                return
+            elapsed = time.perf_counter() - start
+            QUESTION_POOL_REFILL_SECONDS.observe(elapsed)
+            pool.last_refill_seconds = round(elapsed, 3)
+            key = _dedupe_key(question)
+            if key in pool.keys:
+                misses += 1
+                continue
+            misses = 0
+            pool.keys.add(key)
+            question["pool_seq"] = next(self._seq)
+            pool.ready.append(question)
+            pool.refills += 1
+            pool.last_error = None
+            QUESTION_POOL_READY.set(len(pool.ready), course_id=pool.course_id)
+            self._notify(question)
+
+    async def _refresh_courses_loop(self) -> None:
+        while True:
+            try:
+                courses = await self.canvas.list_courses(enrollment_state="active")
+                active = {c["id"] for c in courses if c.get("id")}
+                for course in courses:
+                    self.add_course(course)
+                for course_id in list(self._pools):
+                    if course_id not in active:
+                        del self._pools[course_id]
+            except Exception as e:
+                logger.warning("question pool could not list active courses: %s", e)
+            await asyncio.sleep(self.course_refresh_seconds)
+
+
+question_pool = QuestionPool(
+    canvas_service,
+    course_catalog,
+    settings.question_pool_low_watermark,
+    settings.question_pool_high_watermark,
+    settings.question_pool_workers,
+    settings.question_pool_course_refresh_seconds,
+)
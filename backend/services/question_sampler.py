@@ -0,0 +1,210 @@
+"""
+Per-client question sampling without repeats.
+
+Clients identify themselves with the X-Device-ID header. For each one we keep:
+
+- a shuffle bag over the static bank, stored as a seed and a cursor: the
+  cycle's order is random.Random(seed).shuffle of the bank, rebuilt once per
+  cycle (or after a reload) and kept in memory, so every question comes up
+  once before any repeats. A new seed starts each cycle.
+- a bitset of generated-pool questions already served to the client, indexed
+  by the pool's serial numbers (a sliding window of SEEN_WINDOW bits).
+
+States live in an LRU bounded by QUESTION_SAMPLER_MAX_CLIENTS. With
+QUESTION_SAMPLER_PERSIST=1 they are also written through to SQLite, so a
+device keeps its place across restarts and uvicorn workers.
+"""
+
+import json
+import random
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+from config.settings import settings
+from services.question_pool import QuestionPool
+from services.sqlite_store import SQLiteStore
+
+DEVICE_ID_HEADER = "X-Device-ID"
+# Longer device ids are truncated so a client cannot bloat the store
+MAX_DEVICE_ID_LENGTH = 128
+# Generated questions tracked per client; older ones count as seen
+SEEN_WINDOW = 4096
+
+
+@dataclass(slots=True)
+class ShuffleBag:
+    n: int
+    seed: int | None = None
+    cursor: int = 0
+    # The cycle's permutation, rebuilt from seed on first use; never persisted
+    _order: list[int] | None = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if self.seed is None:
+            self._reshuffle()
+
+    def _reshuffle(self) -> None:
+        self.seed, self.cursor, self._order = random.getrandbits(64), 0, None
+
+    def _permutation(self) -> list[int]:
+        if self._order is None:
+            indices = list(range(self.n))
+            random.Random(self.seed).shuffle(indices)
+            self._order = indices
+        return self._order
+
+    def order(self) -> list[int]:
+        """This cycle's permutation of range(n)."""
+        return list(self._permutation())
+
+    def next(self) -> int:
+        if self.cursor >= self.n:
+            self._reshuffle()
+        index = self._permutation()[self.cursor]
+        self.cursor += 1
+        return index
+
+
+@dataclass(slots=True)
+class SeenSet:
+    epoch: str
+    base: int = 0
+    bits: int = 0
+
+    def __contains__(self, seq: int) -> bool:
+        if seq < self.base:
+            return True
+        return bool(self.bits >> (seq - self.base) & 1)
+
+    def add(self, seq: int) -> None:
+        if seq < self.base:
+            return
+        offset = seq - self.base
+        if offset >= SEEN_WINDOW:
+            shift = offset - SEEN_WINDOW // 2
+            self.bits >>= shift
+            self.base += shift
+            offset -= shift
+        self.bits |= 1 << offset
+
+
+@dataclass(slots=True)
+class ClientState:
+    static: ShuffleBag | None = None
+    pool: SeenSet | None = None
+
+    def dumps(self) -> str:
+        data: dict[str, Any] = {}
+        if self.static is not None:
+            data["s"] = [self.static.n, self.static.seed, self.static.cursor]
+        if self.pool is not None:
+            data["p"] = [self.pool.epoch, self.pool.base, format(self.pool.bits, "x")]
+        return json.dumps(data, separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, raw: str) -> "ClientState":
+        data = json.loads(raw)
+        state = cls()
+        # Older 4-integer bags (affine permutations) just start a new cycle
+        if "s" in data:
+            state.static = ShuffleBag(*data["s"]) if len(data["s"]) == 3 else ShuffleBag(data["s"][0])
+        if "p" in data:
+            epoch, base, bits = data["p"]
+            state.pool = SeenSet(epoch, base, int(bits, 16))
+        return state
+
+
+class _ClientStateStore(SQLiteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS client_state (
+        client_id  TEXT PRIMARY KEY,
+        state      TEXT NOT NULL
+    );
+    """
+
+    def load(self, client_id: str) -> ClientState | None:
+        row = self._conn().execute(
+            "SELECT state FROM client_state WHERE client_id = ?", (client_id,)
+        ).fetchone()
+        return ClientState.loads(row["state"]) if row is not None else None
+
+    def save(self, client_id: str, state: ClientState) -> None:
+        """Written on the writer thread; the caller does not wait."""
+        self.write_later(self._save_state, client_id, state.dumps())
+
+    def _save_state(self, client_id: str, state: str) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO client_state (client_id, state) VALUES (?, ?)",
+            (client_id, state),
+        )
+
+
+def client_key(device_id: str | None) -> str | None:
+    """Normalized X-Device-ID value, or None when the client sent none."""
+    if not device_id or not device_id.strip():
+        return None
+    return device_id.strip()[:MAX_DEVICE_ID_LENGTH]
+
+
+class QuestionSampler:
+    def __init__(self, max_clients: int, store: _ClientStateStore | None = None):
+        self.max_clients = max(1, max_clients)
+        self._clients: OrderedDict[str, ClientState] = OrderedDict()
+        self._store = store
+
+    def next_static_index(self, client_id: str, n: int) -> int:
+        """Index into a bank of n questions that this client has not seen this cycle."""
+        state = self._state(client_id)
+        if state.static is None or state.static.n != n:
+            state.static = ShuffleBag(n)
+        index = state.static.next()
+        self._save(client_id, state)
+        return index
+
+    def next_generated(
+        self,
+        client_id: str,
+        pool: QuestionPool,
+        n: int = 1,
+        course_id: int | None = None,
+        exclude: set[str] | frozenset[str] = frozenset(),
+    ) -> list[dict[str, Any]]:
+        """Up to n questions from pool (the client's tenant's) this client has not been served yet."""
+        state = self._state(client_id)
+        if state.pool is None or state.pool.epoch != pool.epoch:
+            state.pool = SeenSet(pool.epoch)
+        seen = state.pool
+        questions = pool.pop_many(
+            n, course_id, exclude, allowed=lambda q: q.get("pool_seq") is None or q["pool_seq"] not in seen
+        )
+        for question in questions:
+            if question.get("pool_seq") is not None:
+                seen.add(question["pool_seq"])
+        if questions:
+            self._save(client_id, state)
+        return questions
+
+    def _state(self, client_id: str) -> ClientState:
+        state = self._clients.get(client_id)
+        if state is not None:
+            self._clients.move_to_end(client_id)
+            return state
+        state = (self._store.load(client_id) if self._store is not None else None) or ClientState()
+        self._clients[client_id] = state
+        while len(self._clients) > self.max_clients:
+            self._clients.popitem(last=False)
+        return state
+
+    def _save(self, client_id: str, state: ClientState) -> None:
+        if self._store is not None:
+            self._store.save(client_id, state)
+
+    def stats(self) -> dict[str, Any]:
+        return {"clients": len(self._clients), "max_clients": self.max_clients, "persisted": self._store is not None}
+
+
+question_sampler = QuestionSampler(
+    settings.question_sampler_max_clients,
+    _ClientStateStore(settings.question_sampler_db_path) if settings.question_sampler_persist else None,
+)
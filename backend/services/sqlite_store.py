@@ -0,0 +1,79 @@
+"""Small helpers for the local SQLite files under DATA_DIR."""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# Busy timeouts (seconds). The writer thread may wait out another worker's
+# write; any other thread, i.e. the event loop, gives up quickly instead.
+WRITER_TIMEOUT = 10.0
+LOOP_TIMEOUT = 0.5
+
+
+def connect(path: Path, timeout: float = WRITER_TIMEOUT) -> sqlite3.Connection:
+    """
+    Open a SQLite connection with settings that suit several uvicorn workers
+    sharing one file: WAL journaling and a busy timeout instead of immediate
+    "database is locked" errors.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SQLiteStore:
+    """
+    Base for stores backed by one SQLite file. Subclasses set SCHEMA (one or
+    more CREATE statements); the connection is opened lazily, once per thread.
+
+    Writes on hot paths go through write() or write_later(), which run them on
+    the store's single writer thread: in submission order and off the event
+    loop, so a busy database never stalls requests.
+    """
+
+    SCHEMA = ""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"sqlite-{path.stem}", initializer=self._mark_writer
+        )
+
+    def _mark_writer(self) -> None:
+        self._local.writer = True
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            timeout = WRITER_TIMEOUT if getattr(self._local, "writer", False) else LOOP_TIMEOUT
+            conn = connect(self.path, timeout)
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    async def write(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """fn(*args) on the writer thread, after every write submitted before it."""
+        return await asyncio.wrap_future(self._writer.submit(fn, *args))
+
+    def write_later(self, fn: Callable[..., Any], *args: Any) -> None:
+        """Same, without waiting; a failure is logged."""
+        self._writer.submit(fn, *args).add_done_callback(_log_write_error)
+
+    def flush(self) -> None:
+        """Block until writes submitted so far are done (shutdown, tests)."""
+        self._writer.submit(lambda: None).result()
+
+
+def _log_write_error(future: Future) -> None:
+    if future.exception() is not None:
+        logger.warning("SQLite write failed: %s", future.exception())
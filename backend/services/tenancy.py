@@ -0,0 +1,253 @@
+"""
+Tenants: one per Canvas user served by this backend.
+
+A request may carry its user's own Canvas token, in X-Canvas-Token or as
+Authorization: Bearer <token>. Requests without one act as the configured
+CANVAS_ACCESS_TOKEN user (the default tenant), so a single-user deployment
+behaves as before. A tenant's id is a hash of its token; the token itself is
+only held in memory, never logged or persisted.
+
+Each tenant has its own CanvasService (pooled connections, at most
+TENANT_MAX_CANVAS_CONNECTIONS concurrent Canvas calls), course catalog and
+question pool, and the Canvas-backed listing snapshots are keyed by tenant.
+Content-addressed caches (question sets, parsed files, embeddings) are shared
+by everyone. Tenants are kept in an LRU bounded by TENANT_MAX_ACTIVE; the
+least recently seen, and any idle for TENANT_IDLE_SECONDS, are dropped: their
+background refreshes stop and their connections close. Tenants with queued or
+running ingestions are kept until those finish, and the default tenant is
+never dropped.
+
+A token seen for the first time is checked with one Canvas call before its
+tenant is registered or starts any background work; a token Canvas rejects is
+remembered for _REJECTED_TTL_SECONDS and answered 401 without calling Canvas.
+
+TenantMiddleware only picks the token out of the request; Canvas-backed routes
+resolve the tenant with `await current_tenant()`, so other routes never do.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any
+
+from config.settings import settings
+from services.canvas import CanvasAPIError, CanvasService, canvas_service
+from services.course_catalog import CourseCatalog, course_catalog
+from services.ingest_scheduler import scheduler as ingest_scheduler
+from services.question_feed import question_feed
+from services.question_pool import QuestionPool, question_pool
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = "X-Canvas-Token"
+DEFAULT_TENANT_ID = "default"
+
+_TOKEN_HEADER_RAW = TOKEN_HEADER.lower().encode("latin-1")
+
+# Tokens Canvas rejected are answered without asking it again for this long
+_REJECTED_TTL_SECONDS = 300
+_MAX_REJECTED = 10_000
+
+
+class TenantTokenError(Exception):
+    """The request's Canvas token was rejected, or could not be checked."""
+
+    def __init__(self, status_code: int, detail: str):
+        self.status_code = status_code
+        self.detail = detail
+        super().__init__(detail)
+
+
+class Tenant:
+    __slots__ = ("id", "canvas", "catalog", "pool", "last_seen", "_started")
+
+    def __init__(self, tenant_id: str, canvas: CanvasService, catalog: CourseCatalog, pool: QuestionPool):
+        self.id = tenant_id
+        self.canvas = canvas
+        self.catalog = catalog
+        self.pool = pool
+        self.last_seen = time.monotonic()
+        self._started = False
+
+    def start(self) -> None:
+        """Start the catalog refresh and pool refills (needs a running event loop)."""
+        if self._started:
+            return
+        self._started = True
+        question_feed.watch(self.pool, self.id)
+        self.catalog.start()
+        if settings.question_pool_enabled:
+            self.pool.start()
+
+    async def stop(self) -> None:
+        await self.pool.stop()
+        await self.catalog.stop()
+        await self.canvas.aclose()
+        question_feed.forget(self.id)
+        self._started = False
+
+
+def tenant_id_for(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+def _new_tenant(canvas: CanvasService) -> Tenant:
+    catalog = CourseCatalog(
+        canvas,
+        settings.course_catalog_refresh_seconds,
+        settings.course_catalog_recency_half_life_days,
+    )
+    pool = QuestionPool(
+        canvas,
+        catalog,
+        settings.question_pool_low_watermark,
+        settings.question_pool_high_watermark,
+        settings.question_pool_workers,
+        settings.question_pool_course_refresh_seconds,
+    )
+    return Tenant(canvas.tenant_id, canvas, catalog, pool)
+
+
+class TenantRegistry:
+    def __init__(self, default: Tenant, max_tenants: int, idle_seconds: int):
+        self.default = default
+        self.max_tenants = max(1, max_tenants)
+        self.idle_seconds = max(1, idle_seconds)
+        self._tenants: OrderedDict[str, Tenant] = OrderedDict()
+        self._pending: dict[str, asyncio.Future] = {}  # tenant id -> token check in flight
+        self._rejected: OrderedDict[str, float] = OrderedDict()  # tenant id -> rejected until
+        self._evictions = 0
+        self._running = False
+
+    # ── Lifecycle (called from the app lifespan) ──────────────────────────────
+
+    def start(self) -> None:
+        self._running = True
+        self.default.start()
+
+    async def stop(self) -> None:
+        self._running = False
+        tenants = [self.default, *self._tenants.values()]
+        self._tenants.clear()
+        await asyncio.gather(*(t.stop() for t in tenants), return_exceptions=True)
+
+    # ── Lookup ────────────────────────────────────────────────────────────────
+
+    async def get(self, token: str | None) -> Tenant:
+        """
+        The tenant for a Canvas token, or the default one. A new token is checked
+        with Canvas first; raises TenantTokenError if it is rejected.
+        """
+        if not token or token == self.default.canvas.access_token:
+            return self.default
+        tenant_id = tenant_id_for(token)
+        tenant = self._tenants.get(tenant_id)
+        if tenant is None:
+            tenant = await self._register(tenant_id, token)
+        else:
+            self._tenants.move_to_end(tenant_id)
+        now = time.monotonic()
+        tenant.last_seen = now
+        self._evict(now)
+        return tenant
+
+    async def _register(self, tenant_id: str, token: str) -> Tenant:
+        rejected_until = self._rejected.get(tenant_id)
+        if rejected_until is not None:
+            if time.monotonic() < rejected_until:
+                raise TenantTokenError(401, "Canvas access token invalid or expired")
+            del self._rejected[tenant_id]
+        pending = self._pending.get(tenant_id)
+        if pending is None:
+            # Concurrent first requests with one token share a single check
+            pending = self._pending[tenant_id] = asyncio.ensure_future(self._check(tenant_id, token))
+            pending.add_done_callback(lambda _: self._pending.pop(tenant_id, None))
+        return await asyncio.shield(pending)
+
+    async def _check(self, tenant_id: str, token: str) -> Tenant:
+        canvas = CanvasService(access_token=token, tenant_id=tenant_id)
+        try:
+            await canvas.get_self()
+        except Exception as e:
+            await canvas.aclose()
+            if isinstance(e, CanvasAPIError) and e.status_code == 401:
+                self._rejected[tenant_id] = time.monotonic() + _REJECTED_TTL_SECONDS
+                while len(self._rejected) > _MAX_REJECTED:
+                    self._rejected.popitem(last=False)
+                raise TenantTokenError(401, e.body or "Canvas access token invalid or expired") from e
+            raise TenantTokenError(502, f"Could not check the Canvas token: {e}") from e
+        tenant = self._tenants.get(tenant_id)
+        if tenant is None:
+            tenant = self._tenants[tenant_id] = _new_tenant(canvas)
+            if self._running:
+                tenant.start()
+        else:
+            await canvas.aclose()
+        return tenant
+
+    def _evict(self, now: float) -> None:
+        # Least recently seen first; never the tenant just looked up
+        for tenant in list(self._tenants.values())[:-1]:
+            if len(self._tenants) <= self.max_tenants and now - tenant.last_seen < self.idle_seconds:
+                break
+            if ingest_scheduler.has_active_jobs(tenant.id):
+                continue  # its jobs download with its Canvas client; dropped once they are done
+            del self._tenants[tenant.id]
+            self._evictions += 1
+            task = asyncio.ensure_future(tenant.stop())
+            task.add_done_callback(_log_stop_error)
+
+    def stats(self) -> dict[str, Any]:
+        return {"tenants": len(self._tenants), "max_tenants": self.max_tenants, "evictions": self._evictions}
+
+
+def _log_stop_error(task: asyncio.Future) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("stopping evicted tenant failed: %s", task.exception())
+
+
+tenants = TenantRegistry(
+    Tenant(DEFAULT_TENANT_ID, canvas_service, course_catalog, question_pool),
+    settings.tenant_max_active,
+    settings.tenant_idle_seconds,
+)
+
+_request_token: ContextVar[str | None] = ContextVar("canvas_token", default=None)
+
+
+async def current_tenant() -> Tenant:
+    """
+    The tenant of the request being handled (the default tenant outside one or
+    without a token). Raises TenantTokenError for a token Canvas rejects.
+    """
+    return await tenants.get(_request_token.get())
+
+
+def _token_from_headers(headers: list[tuple[bytes, bytes]]) -> str | None:
+    bearer = None
+    for name, value in headers:
+        if name == _TOKEN_HEADER_RAW:
+            return value.decode("latin-1").strip() or None
+        if name == b"authorization" and value[:7].lower() == b"bearer ":
+            bearer = value[7:].decode("latin-1").strip() or None
+    return bearer
+
+
+class TenantMiddleware:
+    """Pure ASGI middleware: notes the request's Canvas token for current_tenant()."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_token.set(_token_from_headers(scope.get("headers", [])))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_token.reset(token)
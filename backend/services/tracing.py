@@ -0,0 +1,286 @@
+"""
+Lightweight in-process span tracing with Server-Timing headers.
+
+A sampled request (TRACE_SAMPLE_RATE) or ingestion run gets a trace; code on
+its path wraps steps in `with span("openai"):`. The current trace and parent
+span live in one ContextVar, so spans opened in tasks started by
+asyncio.gather / create_task and in asyncio.to_thread workers land in the same
+trace under the right parent. Unsampled work pays a single ContextVar lookup
+per span.
+
+Responses of traced requests carry a Server-Timing header with the summed
+duration (and call count) per span name. Finished traces can be exported as
+JSON lines to TRACE_EXPORT_PATH and/or POSTed in OTLP/HTTP JSON form to
+TRACE_OTLP_URL, from a background thread.
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+from config.settings import settings
+from services.metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+# Spans kept per trace; a whole-course ingestion would otherwise grow without bound
+MAX_SPANS = 2000
+# Distinct span names reported in one Server-Timing header
+MAX_TIMING_ENTRIES = 16
+# Finished traces waiting for the exporter; beyond this they are dropped
+EXPORT_QUEUE_SIZE = 256
+
+_TOKEN_UNSAFE = re.compile(r"[^A-Za-z0-9_.\-]")
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    span_id: int
+    parent_id: int | None
+    start: float
+    end: float | None = None
+    attrs: dict[str, Any] = field(default_factory=dict)
+
+
+class Trace:
+    def __init__(self, name: str, **attrs: Any):
+        self.trace_id = random.getrandbits(128)
+        self.wall_start_ns = time.time_ns()
+        self.perf_start = time.perf_counter()
+        self.dropped = 0
+        self.spans: list[Span] = []
+        self.root = self.open(name, None, attrs)
+
+    def open(self, name: str, parent_id: int | None, attrs: dict[str, Any]) -> Span:
+        s = Span(name, random.getrandbits(64), parent_id, time.perf_counter(), attrs=attrs)
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append(s)  # list.append is atomic; to_thread workers add spans too
+        else:
+            self.dropped += 1
+        return s
+
+    def server_timing(self) -> str:
+        """Summed duration and count per span name (finished spans), plus the total so far."""
+        totals: dict[str, list[float]] = {}
+        for s in self.spans[1:]:
+            if s.end is not None:
+                entry = totals.setdefault(s.name, [0.0, 0])
+                entry[0] += s.end - s.start
+                entry[1] += 1
+        ranked = sorted(totals.items(), key=lambda kv: -kv[1][0])[:MAX_TIMING_ENTRIES]
+        parts = [
+            f'{_TOKEN_UNSAFE.sub("_", name)};dur={seconds * 1000:.1f}' + (f';desc="x{count}"' if count > 1 else "")
+            for name, (seconds, count) in ranked
+        ]
+        parts.append(f"total;dur={(time.perf_counter() - self.root.start) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dicts(self) -> list[dict[str, Any]]:
+        trace_id = f"{self.trace_id:032x}"
+        out = []
+        for s in self.spans:
+            end = s.end if s.end is not None else time.perf_counter()
+            out.append({
+                "trace_id": trace_id,
+                "span_id": f"{s.span_id:016x}",
+                "parent_id": f"{s.parent_id:016x}" if s.parent_id is not None else None,
+                "name": s.name,
+                "start_ns": self.wall_start_ns + int((s.start - self.perf_start) * 1e9),
+                "duration_ms": round((end - s.start) * 1000, 3),
+                "attrs": s.attrs,
+            })
+        return out
+
+
+_current: ContextVar[tuple[Trace, int] | None] = ContextVar("trace", default=None)
+
+
+def sampled() -> bool:
+    rate = settings.trace_sample_rate
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+class _SpanScope:
+    __slots__ = ("trace", "parent_id", "name", "attrs", "span", "token")
+
+    def __init__(self, trace: Trace, parent_id: int, name: str, attrs: dict[str, Any]):
+        self.trace, self.parent_id, self.name, self.attrs = trace, parent_id, name, attrs
+
+    def __enter__(self) -> Span:
+        self.span = self.trace.open(self.name, self.parent_id, self.attrs)
+        self.token = _current.set((self.trace, self.span.span_id))
+        return self.span
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        self.span.end = time.perf_counter()
+        if exc_type is not None:
+            self.span.attrs["error"] = exc_type.__name__
+        _current.reset(self.token)
+
+
+_NO_SPAN = nullcontext()
+
+
+def span(name: str, **attrs: Any) -> AbstractContextManager[Span | None]:
+    """Time a `with` block as a child of the current span; a shared no-op outside a trace."""
+    current = _current.get()
+    if current is None:
+        return _NO_SPAN
+    return _SpanScope(current[0], current[1], name, attrs)
+
+
+@contextmanager
+def trace_scope(name: str, **attrs: Any) -> Iterator[Trace | None]:
+    """Start a sampled trace for background work (e.g. an ingestion run) and export it at the end."""
+    if not sampled():
+        yield None
+        return
+    trace = Trace(name, **attrs)
+    token = _current.set((trace, trace.root.span_id))
+    try:
+        yield trace
+    except BaseException as e:
+        trace.root.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        trace.root.end = time.perf_counter()
+        _current.reset(token)
+        exporter.submit(trace)
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware: traces sampled HTTP requests and adds their
+    Server-Timing header. For streaming responses the header reflects the time
+    until the response started.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not sampled():
+            await self.app(scope, receive, send)
+            return
+        trace = Trace("request", method=scope.get("method", ""))
+        token = _current.set((trace, trace.root.span_id))
+
+        async def send_wrapper(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                trace.root.attrs["status"] = message["status"]
+                headers = [*message.get("headers", []), (b"server-timing", trace.server_timing().encode("latin-1"))]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            trace.root.end = time.perf_counter()
+            trace.root.attrs["route"] = route_template(scope)
+            _current.reset(token)
+            exporter.submit(trace)
+
+
+class _Exporter:
+    """Writes finished traces from a daemon thread so the event loop never blocks on I/O."""
+
+    def __init__(self, path: str, otlp_url: str):
+        self.path = path
+        self.otlp_url = otlp_url
+        self._queue: queue.Queue[Trace] = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path or self.otlp_url)
+
+    def submit(self, trace: Trace) -> None:
+        if not self.enabled:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            logger.debug("trace export queue full; dropping trace")
+
+    def _run(self) -> None:
+        client = None
+        if self.otlp_url:
+            import httpx
+
+            client = httpx.Client(timeout=5.0)
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 64:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self.path:
+                    self._write_jsonl(batch)
+                if client is not None:
+                    client.post(self.otlp_url, json=_otlp_payload(batch))
+            except Exception as e:
+                logger.warning("trace export failed: %s", e)
+
+    def _write_jsonl(self, batch: list[Trace]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for trace in batch:
+                for record in trace.to_dicts():
+                    f.write(json.dumps(record, default=str, separators=(",", ":")) + "\n")
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_payload(batch: list[Trace]) -> dict[str, Any]:
+    """OTLP/HTTP JSON (ExportTraceServiceRequest) for a batch of traces."""
+    spans = []
+    for trace in batch:
+        for record in trace.to_dicts():
+            start = record["start_ns"]
+            spans.append({
+                "traceId": record["trace_id"],
+                "spanId": record["span_id"],
+                **({"parentSpanId": record["parent_id"]} if record["parent_id"] else {}),
+                "name": record["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(start),
+                "endTimeUnixNano": str(start + int(record["duration_ms"] * 1e6)),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in record["attrs"].items()],
+            })
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "doomscholar-backend"}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]
+    }
+
+
+exporter = _Exporter(settings.trace_export_path, settings.trace_otlp_url)
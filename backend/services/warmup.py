@@ -0,0 +1,38 @@
+"""
+Optional start-up warm-up of the lazily loaded SDKs (WARM_UP_SDKS=1).
+
+openai, cohere, qdrant_client, numpy and the document parsers are imported on
+first use so a cold start only pays for what it serves. When the first request
+should not pay for them either, the lifespan runs warm_up() in a worker thread
+after the app is already accepting requests.
+"""
+
+import importlib
+import logging
+import time
+
+from services import cohere_client, qdrant_client
+from services.question_from_file import _get_openai_key, get_openai_client
+
+logger = logging.getLogger(__name__)
+
+# Imported lazily by services; scripts/import_time.py checks `import app` stays clear of them
+HEAVY_MODULES = ("openai", "cohere", "qdrant_client", "numpy", "pptx", "docx", "pypdf")
+
+
+def warm_up() -> None:
+    start = time.perf_counter()
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning("warm-up: cannot import %s: %s", name, e)
+    for build in (cohere_client.get_client, qdrant_client.get_client):
+        try:
+            build()
+        except Exception as e:
+            logger.warning("warm-up: %s failed: %s", build.__module__, e)
+    api_key = _get_openai_key()
+    if api_key:
+        get_openai_client(api_key)
+    logger.info("warm-up: SDKs loaded in %.2fs", time.perf_counter() - start)
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from services.concurrency import FairLimiter
+
+
+async def _grant_order(limiter: FairLimiter, requests: list[tuple[str, int]]) -> list[str]:
+    """Keys in the order queued (key, priority) requests get a slot, one release at a time."""
+    order: list[str] = []
+
+    async def want(key: str, priority: int) -> None:
+        await limiter.acquire(key, priority)
+        order.append(key)
+
+    tasks = [asyncio.create_task(want(key, priority)) for key, priority in requests]
+    await asyncio.sleep(0)
+    assert order == [] and limiter.snapshot()["waiting"] == len(requests)
+    for _ in requests:
+        limiter.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+@pytest.mark.asyncio
+async def test_free_slots_are_granted_immediately():
+    limiter = FairLimiter("t", 2)
+    await limiter.acquire("a")
+    await limiter.acquire("a")
+    assert limiter.snapshot() == {"capacity": 2, "in_use": 2, "waiting": 0}
+
+
+@pytest.mark.asyncio
+async def test_waiting_keys_take_turns():
+    limiter = FairLimiter("t", 1)
+    await limiter.acquire("holder")
+    order = await _grant_order(limiter, [("a", 0), ("a", 0), ("a", 0), ("b", 0), ("c", 0), ("b", 0)])
+    assert order == ["a", "b", "c", "a", "b", "a"]
+
+
+@pytest.mark.asyncio
+async def test_higher_priority_goes_first():
+    limiter = FairLimiter("t", 1)
+    await limiter.acquire("holder")
+    order = await _grant_order(limiter, [("pool", 0), ("pool", 0), ("request", 1), ("other", 1)])
+    assert order == ["request", "other", "pool", "pool"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue():
+    limiter = FairLimiter("t", 1)
+    await limiter.acquire("holder")
+    waiter = asyncio.create_task(limiter.acquire("a"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter.snapshot()["waiting"] == 0
+    limiter.release()
+    assert limiter.in_use == 0
+
+
+@pytest.mark.asyncio
+async def test_slot_granted_to_a_cancelled_waiter_is_handed_on():
+    limiter = FairLimiter("t", 1)
+    await limiter.acquire("holder")
+    first = asyncio.create_task(limiter.acquire("a"))
+    second = asyncio.create_task(limiter.acquire("b"))
+    await asyncio.sleep(0)
+    limiter.release()  # grants "a" ...
+    first.cancel()  # ... which is cancelled before it runs
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    await asyncio.wait_for(second, 1)
+    assert limiter.snapshot() == {"capacity": 1, "in_use": 1, "waiting": 0}
@@ -0,0 +1,58 @@
+import httpx
+import pytest
+
+from app import app
+from services.http_cache import EncodedBody, choose_encoding, etag_matches
+
+
+async def _get(path: str, **headers) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path, headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_current_etag_gets_an_empty_304():
+    first = await _get("/questions/all", **{"Accept-Encoding": "identity"})
+    assert first.status_code == 200 and first.headers["ETag"]
+    again = await _get("/questions/all", **{"Accept-Encoding": "identity", "If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+
+@pytest.mark.asyncio
+async def test_stale_etag_gets_the_body():
+    response = await _get("/questions/all", **{"If-None-Match": '"not-the-current-one"'})
+    assert response.status_code == 200 and response.json()
+
+
+@pytest.mark.asyncio
+async def test_compressed_variant_has_its_own_etag_that_still_validates():
+    plain = await _get("/questions/all", **{"Accept-Encoding": "identity"})
+    gz = await _get("/questions/all", **{"Accept-Encoding": "gzip"})
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert gz.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+    assert gz.json() == plain.json()
+    revalidated = await _get("/questions/all", **{"Accept-Encoding": "gzip", "If-None-Match": plain.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_single_question_carries_the_etag_of_its_body():
+    response = await _get("/questions", **{"X-Device-ID": "etag-test-device", "Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == EncodedBody.build(response.content).etag
+    assert "served_from" not in response.json()
+
+
+def test_etag_comparison_is_weak():
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", "abc-gzip"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches(None, '"abc"') and not etag_matches('"abd"', '"abc"')
+
+
+def test_encoding_choice_honours_q_values():
+    assert choose_encoding("gzip, br", ["br", "gzip"]) == "br"
+    assert choose_encoding("br;q=0, gzip", ["br", "gzip"]) == "gzip"
+    assert choose_encoding("identity", ["br", "gzip"]) is None
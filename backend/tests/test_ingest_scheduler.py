@@ -0,0 +1,187 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+
+import services.ingest_scheduler as ingest_scheduler
+import services.ingestion as ingestion
+from services.canvas import CanvasAPIError
+from services.cohere_client import EMBED_DIMENSION
+from services.ingest_manifest import IngestManifest
+from services.ingest_scheduler import IngestScheduler
+from services.job_store import JobStore
+
+COURSE = 7
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch) -> JobStore:
+    """A fresh job store (and manifest) in place of the process-wide ones."""
+    store = JobStore(tmp_path / "ingest.db")
+    monkeypatch.setattr(ingest_scheduler, "job_store", store)
+    monkeypatch.setattr(ingestion, "job_store", store)
+    monkeypatch.setattr(ingestion, "manifest", IngestManifest(tmp_path / "ingest.db"))
+    return store
+
+
+@pytest.fixture
+def runs(monkeypatch) -> list[dict]:
+    """Calls to ingest_course made by the scheduler; each run waits for its "release" event."""
+    calls: list[dict] = []
+
+    async def fake_ingest_course(course_id, priority=0, resume=False, canvas=None):
+        call = {"course_id": course_id, "resume": resume, "release": asyncio.Event()}
+        calls.append(call)
+        await call["release"].wait()
+
+    monkeypatch.setattr(ingest_scheduler, "ingest_course", fake_ingest_course)
+    return calls
+
+
+def _orphan(store: JobStore, status: dict) -> None:
+    """A job left behind by another worker whose lease has expired."""
+    other = JobStore(store.path)
+    assert other.acquire_lease(COURSE, -1)
+    other.save_status(COURSE, status, priority=2)
+
+
+async def _until(predicate, timeout: float = 2.0) -> None:
+    async def poll():
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.mark.asyncio
+async def test_orphaned_job_is_taken_over_and_resumed(store, runs):
+    _orphan(store, {"status": "running", "attempts": 1})
+    assert store.orphaned_jobs() == [(COURSE, 2)]
+    scheduler = IngestScheduler(2, lease_ttl=30)
+    scheduler.start()
+    try:
+        await _until(lambda: runs)
+        assert runs[0]["course_id"] == COURSE and runs[0]["resume"]
+        assert store.orphaned_jobs() == []
+        assert not JobStore(store.path).acquire_lease(COURSE, 30)  # ours now
+        assert store.load_status(COURSE)["attempts"] == 2
+    finally:
+        await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_job_that_keeps_dying_is_failed_instead_of_resumed(store, runs):
+    _orphan(store, {"status": "running", "attempts": 3})
+    scheduler = IngestScheduler(2, lease_ttl=30, max_attempts=3)
+    scheduler.start()
+    try:
+        await _until(lambda: store.load_status(COURSE)["status"] == "failed")
+        assert "3 attempts" in store.load_status(COURSE)["error"]
+        assert runs == [] and store.orphaned_jobs() == []
+    finally:
+        await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_interrupted_job_resumes_on_next_start(store, runs):
+    first = IngestScheduler(2, lease_ttl=30)
+    first.start()
+    await first.submit(COURSE)
+    await _until(lambda: runs)
+    await first.stop()
+    assert store.load_status(COURSE)["status"] == "interrupted"
+    assert store.orphaned_jobs() == [(COURSE, 0)]
+
+    second = IngestScheduler(2, lease_ttl=30)
+    second.start()
+    try:
+        await _until(lambda: len(runs) == 2)
+        assert runs[1]["resume"]
+        # A clean shutdown does not use up an attempt
+        assert store.load_status(COURSE)["attempts"] == 1
+    finally:
+        await second.stop()
+
+
+class _TenantCanvas:
+    def __init__(self, tenant_id: str):
+        self.tenant_id = tenant_id
+
+
+@pytest.mark.asyncio
+async def test_job_belongs_to_the_tenant_that_submitted_it(store, runs):
+    scheduler = IngestScheduler(2, lease_ttl=30)
+    scheduler.start()
+    try:
+        assert scheduler.owned_by(COURSE, "bob")  # nothing to hide yet
+        await scheduler.submit(COURSE, canvas=_TenantCanvas("alice"))
+        await _until(lambda: runs)
+        assert scheduler.owned_by(COURSE, "alice") and not scheduler.owned_by(COURSE, "bob")
+        assert await scheduler.cancel(COURSE)
+        await _until(lambda: store.load_status(COURSE)["status"] == "cancelled")
+        assert scheduler.owned_by(COURSE, "alice") and not scheduler.owned_by(COURSE, "bob")
+    finally:
+        await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_resumed_job_keeps_its_tenant(store, runs):
+    _orphan(store, {"status": "running", "attempts": 1, "tenant": "alice"})
+    scheduler = IngestScheduler(2, lease_ttl=30)
+    scheduler.start()
+    try:
+        await _until(lambda: runs)
+        assert scheduler.owned_by(COURSE, "alice") and not scheduler.owned_by(COURSE, "default")
+        assert store.load_status(COURSE)["tenant"] == "alice"
+    finally:
+        await scheduler.stop()
+
+
+class _FakeCanvas:
+    tenant_id = "test"
+
+    def __init__(self, file_ids: list[int]):
+        self.file_ids = file_ids
+        self.downloaded: list[int] = []
+
+    async def list_course_files_via_modules(self, course_id):
+        return [{"file_id": file_id, "title": f"f{file_id}"} for file_id in self.file_ids]
+
+    async def list_course_files(self, course_id):
+        raise CanvasAPIError(403, "students may not list files")
+
+    async def download_file(self, meta):
+        self.downloaded.append(meta["id"])
+        return io.BytesIO(f"notes for file {meta['id']} ".encode() * 20)
+
+
+@pytest.mark.asyncio
+async def test_resume_skips_checkpointed_files(store, monkeypatch):
+    async def file_metadata(file_id, canvas):
+        return {"id": file_id, "display_name": f"f{file_id}.txt", "size": 500, "updated_at": "2026-01-01"}
+
+    async def embed(texts):
+        return np.zeros((len(texts), EMBED_DIMENSION), dtype=np.float32)
+
+    async def noop(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(ingestion, "get_file_metadata", file_metadata)
+    monkeypatch.setattr(ingestion, "embed_texts", embed)
+    for name in ("ensure_collection", "upsert_chunks", "delete_file_points", "delete_course_points"):
+        monkeypatch.setattr(ingestion.qdrant_client, name, noop)
+    for file_id in (1, 2, 3):
+        store.checkpoint(COURSE, file_id, "added", 4)
+    store.save_status(COURSE, {"status": "running", "files_removed": 1}, priority=0)
+
+    canvas = _FakeCanvas([1, 2, 3, 4, 5])
+    await ingestion.ingest_course(COURSE, resume=True, canvas=canvas)
+
+    assert sorted(canvas.downloaded) == [4, 5]
+    status = store.load_status(COURSE)
+    assert status["status"] == "complete"
+    assert status["resumed_files"] == 3
+    assert status["files_added"] == 5 and status["files_total"] == 5
+    assert status["chunks_indexed"] == 3 * 4 + 2
+    assert status["files_removed"] == 1
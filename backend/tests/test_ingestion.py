@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from services.ingestion import _ByteBudget
+
+
+async def _pending(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    await asyncio.sleep(0)
+    return task
+
+
+@pytest.mark.asyncio
+async def test_budget_blocks_until_bytes_are_released():
+    budget = _ByteBudget(100)
+    assert await budget.acquire(60) == 60
+    waiter = await _pending(budget.acquire(50))
+    assert not waiter.done()
+    budget.release(60)
+    assert await asyncio.wait_for(waiter, 1) == 50
+
+
+@pytest.mark.asyncio
+async def test_budget_is_granted_in_order():
+    budget = _ByteBudget(100)
+    await budget.acquire(90)
+    large = await _pending(budget.acquire(80))
+    small = await _pending(budget.acquire(5))
+    # 10 bytes are free, but the small file may not overtake the large one
+    assert not large.done() and not small.done()
+    budget.release(90)
+    await asyncio.wait_for(asyncio.gather(large, small), 1)
+    assert budget._available == 15
+
+
+@pytest.mark.asyncio
+async def test_file_larger_than_budget_takes_all_of_it():
+    budget = _ByteBudget(100)
+    assert await budget.acquire(10_000) == 100
+    waiter = await _pending(budget.acquire(1))
+    assert not waiter.done()
+    budget.release(100)
+    await asyncio.wait_for(waiter, 1)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_unblocks_those_behind_it():
+    budget = _ByteBudget(100)
+    await budget.acquire(50)
+    large = await _pending(budget.acquire(80))
+    small = await _pending(budget.acquire(30))
+    large.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await large
+    assert await asyncio.wait_for(small, 1) == 30
+    assert budget._available == 20
+
+
+@pytest.mark.asyncio
+async def test_bytes_granted_to_a_cancelled_waiter_are_returned():
+    budget = _ByteBudget(100)
+    await budget.acquire(100)
+    waiter = await _pending(budget.acquire(40))
+    budget.release(100)  # grants the waiter ...
+    waiter.cancel()  # ... which is cancelled before it runs
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert budget._available == 100
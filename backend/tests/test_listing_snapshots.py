@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from services.listing_snapshots import ListingSnapshots
+
+
+class _Loader:
+    """Canvas stand-in: counts fetches; each one waits for `gate` and returns the next version."""
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def __call__(self) -> bytes:
+        self.calls += 1
+        version = self.calls
+        await self.gate.wait()
+        return b'[{"version": %d}]' % version
+
+
+def _age(snapshots: ListingSnapshots, key, seconds: float) -> None:
+    snapshots._snapshots[key].fetched_at -= seconds
+
+
+@pytest.mark.asyncio
+async def test_miss_is_fetched_once_for_concurrent_requests():
+    snapshots, load = ListingSnapshots(30, 60), _Loader()
+    load.gate.clear()
+    waiting = [asyncio.ensure_future(snapshots.get("k", load)) for _ in range(5)]
+    await asyncio.sleep(0)
+    load.gate.set()
+    bodies = await asyncio.gather(*waiting)
+    assert load.calls == 1
+    assert {b.etag for b in bodies} == {bodies[0].etag}
+
+
+@pytest.mark.asyncio
+async def test_fresh_snapshot_is_served_without_a_fetch():
+    snapshots, load = ListingSnapshots(30, 60), _Loader()
+    first = await snapshots.get("k", load)
+    _age(snapshots, "k", 29)
+    assert await snapshots.get("k", load) is first
+    assert load.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_snapshot_is_served_while_one_refresh_runs():
+    snapshots, load = ListingSnapshots(30, 60), _Loader()
+    first = await snapshots.get("k", load)
+    _age(snapshots, "k", 45)
+    load.gate.clear()
+    assert await snapshots.get("k", load) is first
+    assert await snapshots.get("k", load) is first
+    await asyncio.sleep(0)
+    assert load.calls == 2  # one background refresh for both
+    load.gate.set()
+    await asyncio.sleep(0.01)
+    refreshed = await snapshots.get("k", load)
+    assert refreshed.identity == b'[{"version": 2}]' and load.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_snapshot_is_fetched_on_the_request_path():
+    snapshots, load = ListingSnapshots(30, 60), _Loader()
+    await snapshots.get("k", load)
+    _age(snapshots, "k", 91)
+    body = await snapshots.get("k", load)
+    assert body.identity == b'[{"version": 2}]' and load.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_fetch_reaches_every_waiter_and_is_not_cached():
+    snapshots = ListingSnapshots(30, 60)
+    calls = 0
+
+    async def failing() -> bytes:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("canvas down")
+
+    results = await asyncio.gather(*(snapshots.get("k", failing) for _ in range(3)), return_exceptions=True)
+    assert calls == 1 and all(isinstance(r, RuntimeError) for r in results)
+    load = _Loader()
+    assert (await snapshots.get("k", load)).identity == b'[{"version": 1}]'
@@ -0,0 +1,46 @@
+import httpx
+import pytest
+
+from app import app
+from services.metrics import Registry
+
+
+def test_counter_and_gauge_lines_with_escaped_labels():
+    registry = Registry()
+    counter = registry.counter("requests_total", "Requests.", ("path",))
+    counter.inc(path='/a"b\\c\nd')
+    counter.inc(2, path='/a"b\\c\nd')
+    gauge = registry.gauge("ready", "Ready questions.")
+    gauge.set(2.5)
+    assert registry.render() == (
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{path="/a\\"b\\\\c\\nd"} 3\n'
+        "# HELP ready Ready questions.\n"
+        "# TYPE ready gauge\n"
+        "ready 2.5\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, route="/q")
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{route="/q",le="0.1"} 2',
+        'latency_seconds_bucket{route="/q",le="1"} 3',
+        'latency_seconds_bucket{route="/q",le="+Inf"} 4',
+        'latency_seconds_sum{route="/q"} 3.65',
+        'latency_seconds_count{route="/q"} 4',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_requests_are_labelled_by_route_template():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        await client.get("/questions/all")
+        response = await client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'route="/questions/all",status="200",le="+Inf"}' in response.text
+    assert "# TYPE doomscholar_http_request_duration_seconds histogram" in response.text
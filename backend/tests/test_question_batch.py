@@ -0,0 +1,70 @@
+import httpx
+import pytest
+
+from app import app
+from config.settings import settings
+from services.question_pool import QuestionPool
+from services.tenancy import tenants
+
+COURSE = 41
+
+
+def _question(i: int) -> dict:
+    return {
+        "id": f"gen-{COURSE}-{i}",
+        "course_id": COURSE,
+        "topic": "Topic",
+        "hint": "Hint",
+        "answer": "Answer",
+        "mcq": {"question": f"Question {i}?", "options": ["a", "b", "c", "d"], "correct_index": 0},
+    }
+
+
+@pytest.fixture
+def pool(monkeypatch) -> QuestionPool:
+    """A fresh pool for the default tenant, with the course listed in its catalog."""
+    tenant = tenants.default
+    pool = QuestionPool(tenant.canvas, tenant.catalog, 0, 50, 1, 60)
+    monkeypatch.setattr(tenant, "pool", pool)
+    monkeypatch.setattr(tenant.catalog, "course", lambda course_id: {"id": course_id, "name": "Course"})
+    monkeypatch.setattr(settings, "question_pool_enabled", True)
+    return pool
+
+
+async def _batch(**params) -> list[dict]:
+    headers = {"X-Device-ID": params.pop("device")} if "device" in params else {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/questions/batch", params=params, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.asyncio
+async def test_short_pool_is_topped_up_from_the_static_bank(pool):
+    pool.add_course({"id": COURSE, "name": "Course"})
+    for i in range(3):
+        assert pool.offer(_question(i))
+    questions = await _batch(n=8, course_id=COURSE)
+    assert len(questions) == 8
+    assert len({q["id"] for q in questions}) == 8
+    assert [q["served_from"] for q in questions].count("pool") == 3
+
+
+@pytest.mark.asyncio
+async def test_excluded_ids_are_not_returned(pool):
+    pool.add_course({"id": COURSE, "name": "Course"})
+    for i in range(4):
+        pool.offer(_question(i))
+    questions = await _batch(n=6, course_id=COURSE, exclude=f"gen-{COURSE}-0,gen-{COURSE}-1")
+    ids = [q["id"] for q in questions]
+    assert len(ids) == 6 and len(set(ids)) == 6
+    assert not {f"gen-{COURSE}-0", f"gen-{COURSE}-1"} & set(ids)
+
+
+@pytest.mark.asyncio
+async def test_device_batches_do_not_repeat_within_a_cycle(pool):
+    first = await _batch(n=10, source="static", device="batch-test-device")
+    second = await _batch(n=10, source="static", device="batch-test-device")
+    ids = [q["id"] for q in first + second]
+    assert len(ids) == 20 and len(set(ids)) == 20
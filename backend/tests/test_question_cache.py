@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import pytest
+
+from services.question_cache import QuestionCache
+
+
+def _cache(path) -> QuestionCache:
+    return QuestionCache(path, max_entries=10, max_bytes=1_000_000, ttl_seconds=60, sweep_seconds=60)
+
+
+def _questions(*ids) -> list[dict]:
+    return [{"id": i} for i in ids]
+
+
+@pytest.mark.asyncio
+async def test_two_workers_never_serve_a_question_twice(tmp_path):
+    first, second = _cache(tmp_path / "q.db"), _cache(tmp_path / "q.db")
+    first.put("k", _questions(*range(6)))
+    first.flush()
+    taken = await asyncio.gather(*(cache.take("k") for _ in range(4) for cache in (first, second)))
+    served = [q["id"] for q in taken if q is not None]
+    assert sorted(served) == list(range(6))
+    assert taken.count(None) == 2
+    assert await first.take("k") is None and first.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_expired_set_is_not_served(tmp_path):
+    cache = _cache(tmp_path / "q.db")
+    cache.put("k", _questions(1, 2))
+    # Expired in SQLite while still fresh in memory: the claim decides
+    await cache.write(lambda: cache._conn().execute("UPDATE question_queues SET expires_at = 0"))
+    assert await cache.take("k") is None and cache.stats()["entries"] == 0
+    cache.sweep()
+    cache.flush()
+    assert cache._conn().execute("SELECT COUNT(*) FROM question_queues").fetchone()[0] == 0
+
+
+@pytest.mark.asyncio
+async def test_take_during_put_serves_from_the_replacing_set(tmp_path):
+    cache = _cache(tmp_path / "q.db")
+    cache.put("k", _questions("old"))
+    taking = asyncio.ensure_future(cache.take("k"))
+    await asyncio.sleep(0)  # claim submitted; the old set is queued for writing before it
+    cache.put("k", _questions("new-1", "new-2"))
+    assert (await taking)["id"] == "old"
+    assert (await cache.take("k"))["id"] == "new-1"
+    assert (await cache.take("k"))["id"] == "new-2"
+    assert await cache.take("k") is None
+
+
+@pytest.mark.asyncio
+async def test_put_resets_a_partly_served_set(tmp_path):
+    cache = _cache(tmp_path / "q.db")
+    cache.put("k", _questions(1, 2, 3))
+    assert (await cache.take("k"))["id"] == 1
+    cache.put("k", _questions(4, 5))
+    assert [(await cache.take("k"))["id"] for _ in range(2)] == [4, 5]
+    assert await cache.take("k") is None
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+import api.routes.question_stream as question_stream
+from services.events import broadcaster
+from services.question_feed import QuestionFeed, tenant_topic
+from services.question_pool import QuestionPool
+from services.tenancy import DEFAULT_TENANT_ID, tenants
+
+
+def _question(qid: str, course_id: int | None = None) -> dict:
+    return {"id": qid, "course_id": course_id, "topic": "T", "hint": "H", "answer": "A", "mcq": None}
+
+
+@pytest.fixture
+def feed(monkeypatch) -> QuestionFeed:
+    feed = QuestionFeed(interval_seconds=0, min_gap_seconds=0)
+    monkeypatch.setattr(question_stream, "question_feed", feed)
+    return feed
+
+
+async def _poll(since=None, timeout=0.0, course_id=None) -> dict:
+    return await question_stream.poll_questions(since=since, timeout=timeout, course_id=course_id)
+
+
+@pytest.mark.asyncio
+async def test_poll_returns_what_was_published_after_the_cursor(feed):
+    assert await _poll() == {"cursor": 0, "questions": []}
+    feed.publish(_question("a"), "static")
+    first = await _poll()
+    assert [q["id"] for q in first["questions"]] == ["a"]
+    assert await _poll(since=first["cursor"]) == {"cursor": first["cursor"], "questions": []}
+    feed.publish(_question("b"), "static")
+    feed.publish(_question("c"), "static")
+    later = await _poll(since=first["cursor"])
+    assert [q["id"] for q in later["questions"]] == ["b", "c"]
+    assert later["cursor"] == feed.cursor > first["cursor"]
+
+
+@pytest.mark.asyncio
+async def test_cursor_from_another_process_replays_the_history(feed):
+    feed.publish(_question("a"), "static")
+    feed.publish(_question("b"), "static")
+    result = await _poll(since=feed.cursor + 1_000_000)
+    assert [q["id"] for q in result["questions"]] == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_long_poll_wakes_on_publish(feed):
+    feed.publish(_question("a"), "static")
+    cursor = feed.cursor
+    waiting = asyncio.ensure_future(_poll(since=cursor, timeout=5.0))
+    await asyncio.sleep(0.05)
+    assert not waiting.done()
+    feed.publish(_question("b"), "static")
+    result = await asyncio.wait_for(waiting, 1.0)
+    assert [q["id"] for q in result["questions"]] == ["b"] and result["cursor"] > cursor
+
+
+@pytest.mark.asyncio
+async def test_other_tenants_pool_questions_are_filtered_out(feed):
+    feed.publish(_question("theirs", course_id=5), "pool", "someone-else")
+    feed.publish(_question("ours", course_id=5), "pool", DEFAULT_TENANT_ID)
+    result = await _poll(since=0)
+    assert [q["id"] for q in result["questions"]] == ["ours"]
+    assert (await _poll(since=0, course_id=6))["questions"] == []
+
+
+@pytest.mark.asyncio
+async def test_stream_replays_from_last_event_id_then_follows(feed):
+    feed.publish(_question("a"), "static")
+    cursor = feed.cursor
+    feed.publish(_question("b"), "static")
+    stream = question_stream._event_stream(DEFAULT_TENANT_ID, None, cursor)
+    assert '"id":"b"' in await stream.__anext__()
+    following = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0)
+    feed.publish(_question("c"), "static")
+    assert '"id":"c"' in await asyncio.wait_for(following, 1.0)
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pool_questions_are_only_claimed_while_someone_listens(feed):
+    tenant = tenants.default
+    pool = QuestionPool(tenant.canvas, tenant.catalog, 0, 10, 1, 60)
+    feed.watch(pool, DEFAULT_TENANT_ID)
+    pool.add_course({"id": 5, "name": "Course"})
+    pool.offer(_question("unheard", course_id=5))
+    assert feed.cursor == 0 and pool.stats()["courses"][0]["ready"] == 1
+    with broadcaster.subscribe(tenant_topic(DEFAULT_TENANT_ID)) as sub:
+        pool.offer(_question("heard", course_id=5))
+        event = await sub.get(timeout=1.0)
+    assert event["question"]["id"] == "heard"
+    assert pool.stats()["courses"][0]["ready"] == 1  # taken out of the pool
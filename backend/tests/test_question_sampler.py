@@ -0,0 +1,52 @@
+import random
+from collections import Counter
+
+from services.question_sampler import ClientState, QuestionSampler, ShuffleBag
+
+
+def test_each_cycle_covers_the_bank_once():
+    bag = ShuffleBag(30)
+    for _ in range(5):
+        assert sorted(bag.next() for _ in range(30)) == list(range(30))
+
+
+def test_cycles_are_not_strided():
+    # An affine walk has a constant step between consecutive items; a shuffle does not
+    random.seed(1)
+    bag = ShuffleBag(30)
+    cycle = [bag.next() for _ in range(30)]
+    steps = {(b - a) % 30 for a, b in zip(cycle, cycle[1:])}
+    assert len(steps) > 5
+
+
+def test_orderings_vary_between_cycles_and_bags():
+    random.seed(2)
+    orders = {tuple(ShuffleBag(10).order()) for _ in range(200)}
+    assert len(orders) > 190
+
+
+def test_first_draws_are_roughly_uniform():
+    random.seed(3)
+    counts = Counter(ShuffleBag(5).next() for _ in range(5000))
+    assert set(counts) == set(range(5))
+    assert min(counts.values()) > 800
+
+
+def test_state_round_trip_keeps_place_in_cycle():
+    bag = ShuffleBag(12)
+    first = [bag.next() for _ in range(4)]
+    restored = ClientState.loads(ClientState(static=bag).dumps()).static
+    rest = [restored.next() for _ in range(8)]
+    assert sorted(first + rest) == list(range(12))
+
+
+def test_legacy_affine_state_starts_a_new_cycle():
+    state = ClientState.loads('{"s":[12,5,3,4]}')
+    assert state.static.n == 12 and state.static.cursor == 0
+    assert sorted(state.static.next() for _ in range(12)) == list(range(12))
+
+
+def test_sampler_serves_each_client_without_repeats():
+    sampler = QuestionSampler(max_clients=10)
+    for client in ("a", "b"):
+        assert sorted(sampler.next_static_index(client, 8) for _ in range(8)) == list(range(8))
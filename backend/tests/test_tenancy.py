@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+import services.tenancy as tenancy
+from services.canvas import CanvasAPIError
+from services.tenancy import TenantRegistry, TenantTokenError, tenant_id_for, tenants
+
+
+class _FakeCanvas:
+    """CanvasService stand-in: GET /users/self succeeds unless the token is in `rejected`."""
+
+    rejected: set[str] = set()
+    checks: list[str] = []
+    closed: list[str] = []
+
+    def __init__(self, access_token: str, tenant_id: str):
+        self.access_token = access_token
+        self.tenant_id = tenant_id
+
+    async def get_self(self) -> dict:
+        self.checks.append(self.access_token)
+        await asyncio.sleep(0.01)
+        if self.access_token in self.rejected:
+            raise CanvasAPIError(401, "Invalid access token.")
+        return {"id": 1}
+
+    async def aclose(self) -> None:
+        self.closed.append(self.access_token)
+
+
+@pytest.fixture
+def registry(monkeypatch) -> TenantRegistry:
+    monkeypatch.setattr(tenancy, "CanvasService", _FakeCanvas)
+    monkeypatch.setattr(_FakeCanvas, "rejected", {"bad"})
+    monkeypatch.setattr(_FakeCanvas, "checks", [])
+    monkeypatch.setattr(_FakeCanvas, "closed", [])
+    return TenantRegistry(tenants.default, max_tenants=2, idle_seconds=3600)
+
+
+@pytest.mark.asyncio
+async def test_new_token_is_checked_once_then_registered(registry):
+    first, second = await asyncio.gather(registry.get("alice"), registry.get("alice"))
+    assert first is second and first.id == tenant_id_for("alice")
+    assert await registry.get("alice") is first
+    assert _FakeCanvas.checks == ["alice"]
+
+
+@pytest.mark.asyncio
+async def test_no_token_and_the_configured_token_use_the_default_tenant(registry):
+    assert await registry.get(None) is tenants.default
+    assert await registry.get(tenants.default.canvas.access_token) is tenants.default
+    assert _FakeCanvas.checks == []
+
+
+@pytest.mark.asyncio
+async def test_rejected_token_is_remembered(registry):
+    for _ in range(3):
+        with pytest.raises(TenantTokenError) as e:
+            await registry.get("bad")
+        assert e.value.status_code == 401
+    assert _FakeCanvas.checks == ["bad"] and _FakeCanvas.closed == ["bad"]
+    assert registry.stats()["tenants"] == 0
+
+
+@pytest.mark.asyncio
+async def test_least_recently_seen_tenant_is_evicted(registry):
+    alice = await registry.get("alice")
+    await registry.get("bob")
+    await registry.get("alice")
+    await registry.get("carol")
+    await asyncio.sleep(0)  # let the evicted tenant's stop() run
+    assert registry.stats() == {"tenants": 2, "max_tenants": 2, "evictions": 1}
+    assert _FakeCanvas.closed == ["bob"]
+    assert await registry.get("alice") is alice
+
+
+@pytest.mark.asyncio
+async def test_idle_tenant_is_evicted_unless_it_has_jobs(registry, monkeypatch):
+    alice = await registry.get("alice")
+    busy = await registry.get("bob")
+    alice.last_seen -= 7200
+    busy.last_seen -= 7200
+    monkeypatch.setattr(tenancy.ingest_scheduler, "has_active_jobs", lambda tenant_id: tenant_id == busy.id)
+    await registry.get("carol")
+    await asyncio.sleep(0)
+    assert _FakeCanvas.closed == ["alice"]
+    assert await registry.get("bob") is busy
@@ -0,0 +1,82 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from config.settings import settings
+from services.tracing import TracingMiddleware, span, trace_scope
+
+
+@pytest.fixture
+def sample_all(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "trace_sample_rate", 1.0)
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work() -> dict:
+        async def step() -> None:
+            with span("canvas"):
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(step(), step())
+        with span("openai model"):
+            pass
+        return {}
+
+    app.add_middleware(TracingMiddleware)
+    return app
+
+
+async def _get(app: FastAPI, path: str) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(path)
+
+
+@pytest.mark.asyncio
+async def test_sampled_request_gets_server_timing(sample_all):
+    response = await _get(_app(), "/work")
+    entries = {part.split(";")[0]: part for part in response.headers["Server-Timing"].split(", ")}
+    assert set(entries) == {"canvas", "openai_model", "total"}
+    assert 'desc="x2"' in entries["canvas"]
+    assert float(entries["canvas"].split("dur=")[1].split(";")[0]) >= 20.0
+
+
+@pytest.mark.asyncio
+async def test_unsampled_request_has_no_server_timing(monkeypatch):
+    monkeypatch.setattr(settings, "trace_sample_rate", 0.0)
+    response = await _get(_app(), "/work")
+    assert response.status_code == 200 and "Server-Timing" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_spans_in_gathered_tasks_and_threads_keep_their_parent(sample_all):
+    def in_thread() -> None:
+        with span("parse"):
+            pass
+
+    async def child(name: str) -> None:
+        with span(name):
+            await asyncio.to_thread(in_thread)
+
+    with trace_scope("ingest") as trace:
+        with span("files") as files:
+            await asyncio.gather(child("a"), child("b"))
+    by_name: dict[str, list] = {}
+    for s in trace.spans:
+        by_name.setdefault(s.name, []).append(s)
+    assert files.parent_id == trace.root.span_id
+    assert by_name["a"][0].parent_id == by_name["b"][0].parent_id == files.span_id
+    parents = {s.parent_id for s in by_name["parse"]}
+    assert parents == {by_name["a"][0].span_id, by_name["b"][0].span_id}
+    assert all(s.end is not None for s in trace.spans)
+
+
+@pytest.mark.asyncio
+async def test_spans_outside_a_trace_are_no_ops(monkeypatch):
+    monkeypatch.setattr(settings, "trace_sample_rate", 0.0)
+    with trace_scope("ingest") as trace, span("files") as s:
+        assert trace is None and s is None